@@ -0,0 +1,55 @@
+import argparse
+import time
+import pandas as pd
+from benchmarks.synthetic import make_mappings, make_reviews
+from cleaning.text_processing import (ARABIC_LETTER_PATTERN, ARABIC_NON_LETTERS_PATTERN,
+                                    ArabicTokenNormalizer, arabic_cleaning, count_tokens,
+                                    get_ara_stopwords, get_punctuations, preprocess,
+                                    separate_text_by_language)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="arabic preprocessing per review against "
+                                                "the memoized token normalizer")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--max-size", type=int, default=100_000)
+    args = parser.parse_args()
+    reviews = separate_text_by_language(make_reviews(args.rows, make_mappings()))
+    texts = reviews.loc[reviews["language"] == "ara", "content"].tolist()
+    punctuations = get_punctuations()
+    arab_stop_words = get_ara_stopwords()
+
+    start = time.perf_counter()
+    expected = [preprocess(text, punctuations, arab_stop_words) for text in texts]
+    before = (time.perf_counter() - start) / len(texts) * 1e6
+    print(f"{'preprocess:':<20} {before:.2f} us/review")
+    for warm in [False, True]:
+        normalizer = ArabicTokenNormalizer(punctuations, arab_stop_words,
+                                        max_size=args.max_size)
+        if warm:
+            normalizer.warm(token for token, _ in count_tokens(texts).most_common())
+        start = time.perf_counter()
+        cleaned = [normalizer.preprocess(text) for text in texts]
+        after = (time.perf_counter() - start) / len(texts) * 1e6
+        assert cleaned == expected
+        stats = normalizer.cache_stats()
+        label = "token cache (warm):" if warm else "token cache:"
+        print(f"{label:<20} {after:.2f} us/review, "
+                f"{100 * stats['hit_rate']:.1f}% hit rate, {stats['size']} tokens, "
+                f"x{before / after:.1f}")
+
+    # cleaning of the reviews routed by their script, the column
+    # passes over the preprocessed texts against the token cache
+    normalizer = ArabicTokenNormalizer(punctuations, arab_stop_words, max_size=args.max_size)
+    start = time.perf_counter()
+    content = pd.Series([normalizer.preprocess(text) for text in texts])
+    content = content.str.replace(ARABIC_NON_LETTERS_PATTERN, '', regex=True).str.strip()
+    expected = content[content.str.contains(ARABIC_LETTER_PATTERN)].tolist()
+    before = (time.perf_counter() - start) / len(texts) * 1e6
+    print(f"{'routed, columns:':<20} {before:.2f} us/review")
+    normalizer = ArabicTokenNormalizer(punctuations, arab_stop_words, max_size=args.max_size)
+    start = time.perf_counter()
+    data = pd.DataFrame({"content": [normalizer.preprocess_letters(text) for text in texts]})
+    cleaned = arabic_cleaning(data, script_routed=True)["content"].tolist()
+    after = (time.perf_counter() - start) / len(texts) * 1e6
+    assert cleaned == expected
+    print(f"{'routed, tokens:':<20} {after:.2f} us/review, x{before / after:.1f}")
@@ -0,0 +1,38 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+from benchmarks.bench_pipeline import peak_rss_mb
+from benchmarks.synthetic import make_mappings, make_reviews
+from main import load_resources, run_pipeline
+from cleaning.storage import read_reviews
+
+def run_mode(input_path: str, mapping_data: dict, compact: bool, queue):
+    # runs in its own process so the peak rss is the one of this mode
+    rating_data = read_reviews(input_path)
+    before = peak_rss_mb()
+    run_pipeline(rating_data, mapping_data, load_resources(), compact=compact)
+    queue.put({"input_peak_rss_mb": before, "peak_rss_mb": peak_rss_mb()})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="peak rss of the pipeline with "
+                                                "and without the compact mode")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    mapping_data = make_mappings(seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "reviews.csv")
+        make_reviews(args.rows, mapping_data, args.seed).to_csv(input_path, index=False)
+        results = {}
+        for compact in [False, True]:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_mode,
+                                            args=(input_path, mapping_data, compact, queue))
+            process.start()
+            results["compact" if compact else "default"] = queue.get()
+            process.join()
+    default, compact = results["default"]["peak_rss_mb"], results["compact"]["peak_rss_mb"]
+    print(json.dumps({"rows": args.rows, **results,
+                    "reduction": 1 - compact / default}, indent=2))
@@ -0,0 +1,134 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import pandas as pd
+from queue import Empty
+from benchmarks.synthetic import make_mappings, make_reviews
+from main import load_resources, run_pipeline
+from cleaning.profiling import StageProfiler
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+class PeakRssProfiler(StageProfiler):
+    # also records the peak rss of the process after each stage
+    def after_stage(self, stage, state):
+        super().after_stage(stage, state)
+        self.metrics[stage.name]["peak_rss_mb"] = peak_rss_mb()
+
+def time_stages(rating_data: pd.core.frame.DataFrame,
+                mapping_data: dict,
+                resources: dict) -> list:
+    """
+    runs the stages of main.PIPELINE_STAGES and times them
+
+    Args:
+        rating_data (pd.core.frame.DataFrame): raw reviews
+        mapping_data (dict): tags mapping json
+        resources (dict): output of load_resources
+
+    Returns:
+        list: metrics of each stage
+    """
+    profiler = PeakRssProfiler()
+    run_pipeline(rating_data, mapping_data, resources, hooks=[profiler])
+    results = []
+    for name, metrics in profiler.report().items():
+        seconds = metrics["wall_seconds"]
+        results.append({"stage": name, "seconds": seconds,
+                        "rows_per_second": metrics["rows_in"] / seconds if seconds else None,
+                        **metrics})
+    total = sum(result["seconds"] for result in results)
+    results.append({"stage": "total", "rows": len(rating_data), "seconds": total,
+                    "rows_per_second": len(rating_data) / total,
+                    "peak_rss_mb": peak_rss_mb()})
+    return results
+
+def run_size(n_rows: int, seed: int, translated_share: float, queue):
+    # runs in its own process so the peak rss is the one of this size
+    mapping_data = make_mappings(seed=seed)
+    rating_data = make_reviews(n_rows, mapping_data, seed, translated_share)
+    resources = load_resources()
+    queue.put(time_stages(rating_data, mapping_data, resources))
+
+def wait_results(process: multiprocessing.Process, queue, poll_seconds: float = 1.0) -> list:
+    """
+    waits for the metrics of a size, a child that crashed (killed
+    for its memory, segfault ...) never puts them in the queue
+
+    Args:
+        process (multiprocessing.Process): process of the size
+        queue: queue the process puts its metrics in
+        poll_seconds (float, optional): time between the checks of the
+                                        process. Defaults to 1.0.
+
+    Returns:
+        list: metrics of each stage, None if the process exited without them
+    """
+    while True:
+        try:
+            return queue.get(timeout=poll_seconds)
+        except Empty:
+            if not process.is_alive():
+                break
+    # the metrics may have been put just before the process exited
+    try:
+        return queue.get(timeout=poll_seconds)
+    except Empty:
+        return None
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="times every stage of the pipeline "
+                                                "on synthetic reviews")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--translated-share", type=float, default=0.2)
+    parser.add_argument("--output", default=None,
+                        help="json lines file the results are appended to")
+    args = parser.parse_args()
+    run_info = {"commit": git_commit(),
+                "timestamp": pd.Timestamp.now(tz="UTC").isoformat(),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "seed": args.seed,
+                "translated_share": args.translated_share}
+    records = []
+    failed = []
+    for n_rows in args.sizes:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_size,
+                                        args=(n_rows, args.seed, args.translated_share, queue))
+        process.start()
+        results = wait_results(process, queue)
+        process.join()
+        if results is None:
+            failed.append(n_rows)
+            records.append({**run_info, "size": n_rows, "stage": "failed",
+                            "exitcode": process.exitcode})
+            print(f"{n_rows:>9} failed, exit code {process.exitcode}")
+            continue
+        for result in results:
+            records.append({**run_info, "size": n_rows, **result})
+            print(f"{n_rows:>9} {result['stage']:<28} {result['seconds']:>9.3f} s "
+                    f"{result['rows_per_second'] or 0:>12.0f} rows/s "
+                    f"{result['peak_rss_mb']:>8.0f} MB")
+    if args.output:
+        with open(args.output, "a") as output_file:
+            for record in records:
+                output_file.write(json.dumps(record) + "\n")
+    if failed:
+        sys.exit(f"failed sizes: {', '.join(map(str, failed))}")
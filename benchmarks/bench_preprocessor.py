@@ -0,0 +1,34 @@
+import argparse
+import time
+import numpy as np
+from cleaning.preprocessor import Preprocessor
+
+reviews = [
+    ("I'm sure you'll love it, we've been there twice!!! 5 stars 😀", "eng"),
+    ("It wasn't crowded but the parking isn't big, you'd better come early.", "eng"),
+    ("More(Translated by Google) Very nice place (Original) مكان جميل جدا", "ara"),
+    ("المكان رائع والخدمة ممتازة، أنصح بزيارته مع العائلة", "ara"),
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="latency of the online preprocessor")
+    parser.add_argument("--n-reviews", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+    preprocessor = Preprocessor()
+    latencies = np.empty(args.n_reviews)
+    for i in range(args.n_reviews):
+        text, language = reviews[i % len(reviews)]
+        start = time.perf_counter()
+        preprocessor.clean(text, language)
+        latencies[i] = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    print(f"clean:       p50 {p50:.1f} us  p99 {p99:.1f} us")
+    texts = [reviews[i % len(reviews)][0] for i in range(args.batch_size)]
+    languages = [reviews[i % len(reviews)][1] for i in range(args.batch_size)]
+    n_batches = max(args.n_reviews // args.batch_size, 1)
+    start = time.perf_counter()
+    for _ in range(n_batches):
+        preprocessor.clean_batch(texts, languages)
+    per_review = (time.perf_counter() - start) / (n_batches * args.batch_size) * 1e6
+    print(f"clean_batch: {per_review:.1f} us/review (batches of {args.batch_size})")
@@ -0,0 +1,30 @@
+import argparse
+import tempfile
+import time
+from benchmarks.synthetic import make_mappings, make_reviews
+from main import load_resources
+from cleaning.text_processing import _clean_english_batch, parallel_apply, to_stop_word_index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="parallel english cleaning with the texts "
+                                                "pickled to the workers or read from a "
+                                                "memory mapped review store")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--partition-size", type=int, default=10000)
+    parser.add_argument("--store-dir", default=tempfile.gettempdir(),
+                        help="/dev/shm keeps the stores in shared memory")
+    args = parser.parse_args()
+    texts = make_reviews(args.rows, make_mappings())["content"]
+    resources = load_resources()
+    worker_resources = {"eng_stop_words": to_stop_word_index(resources["eng_stop_words"]),
+                        "contractions_re": resources["contraction_expander"]}
+    outputs = {}
+    for store_dir in [None, args.store_dir]:
+        start = time.perf_counter()
+        outputs[store_dir] = parallel_apply(texts, _clean_english_batch, worker_resources,
+                                            args.workers, args.partition_size, store_dir)
+        seconds = time.perf_counter() - start
+        print(f"{'pickled texts' if store_dir is None else 'review store':<14} "
+                f"{seconds:8.2f} s {len(texts) / seconds:12.0f} texts/s")
+    assert outputs[None].equals(outputs[args.store_dir])
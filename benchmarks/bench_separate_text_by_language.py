@@ -0,0 +1,43 @@
+import argparse
+import time
+import pandas as pd
+from cleaning.text_processing import separate_text_by_language
+
+# Review templates, roughly a third of them are translated by Google
+contents = [
+    "More(Translated by Google) Very nice place for the family (Original) مكان جميل جدا للعائلة",
+    "moretranslated by google clean and quiet park original حديقة نظيفة وهادئة",
+    "The staff were friendly and the food was great",
+    "مكان رائع والخدمة ممتازة",
+    "It wasn't crowded, I'll come back again",
+    "الأسعار مرتفعة قليلا",
+]
+
+def make_reviews(n_rows: int) -> pd.core.frame.DataFrame:
+    """
+    builds a synthetic reviews dataframe
+
+    Args:
+        n_rows (int): number of reviews
+
+    Returns:
+        pd.core.frame.DataFrame: dataframe with the columns used by the stage
+    """
+    return pd.DataFrame({"id": range(n_rows),
+                        "content": [contents[i % len(contents)] for i in range(n_rows)],
+                        "language": ["eng"] * n_rows,
+                        "normalized_rating": [80.0] * n_rows})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="times separate_text_by_language")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    print(f"{'rows':>10} {'seconds':>10} {'us/row':>10}")
+    for n_rows in args.sizes:
+        df = make_reviews(n_rows)
+        start = time.perf_counter()
+        separate_text_by_language(df)
+        elapsed = time.perf_counter() - start
+        # A constant us/row across sizes means the stage scales linearly
+        print(f"{n_rows:>10} {elapsed:>10.3f} {elapsed / n_rows * 1e6:>10.2f}")
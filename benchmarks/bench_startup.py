@@ -0,0 +1,44 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+def import_time_us(module: str) -> int:
+    """
+    imports a module in a fresh interpreter with -X importtime
+
+    Args:
+        module (str): module to import
+
+    Returns:
+        int: cumulative import time of the module in microseconds
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True).stderr
+    for line in output.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1])
+    raise ValueError(f"{module} not found in the -X importtime output")
+
+def resources_time_s() -> float:
+    # time of load_resources in a fresh interpreter, main already imported
+    code = ("import time, main; start = time.perf_counter(); main.load_resources(); "
+            "print(time.perf_counter() - start)")
+    output = subprocess.run([sys.executable, "-c", code],
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="import and resources loading times")
+    parser.add_argument("--modules", nargs="+",
+                        default=["cleaning.data_cleaning", "cleaning.text_processing",
+                                "cleaning.preprocessor", "main"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for module in args.modules:
+        times = [import_time_us(module) for _ in range(args.repeat)]
+        print(f"import {module:<28} {statistics.median(times) / 1000:8.1f} ms")
+    times = [resources_time_s() for _ in range(args.repeat)]
+    print(f"{'load_resources()':<35} {statistics.median(times) * 1000:8.1f} ms")
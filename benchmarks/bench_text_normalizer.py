@@ -0,0 +1,68 @@
+import argparse
+import re
+import string
+import time
+from cleaning.text_processing import get_normalizer, get_punctuations
+
+reviews = [
+    "More than I expected!!! The staff were sooo friendly 😀😀 [edited] <br> we'll come back in 2024",
+    "Good place for kids, clean toilets and a big parking.\nPrices are a bit high",
+    "مكان رائع جدا، الخدمة ممتازة والأسعار مناسبة 👍 أنصح بزيارته",
+    "الحديقة جميلة لكن المواقف قليلة ؟ وإدارة المكان تحتاج إلى تطوير",
+]
+
+# Reference implementation the normalizer replaces, it compiles the
+# patterns and builds the translation table on every call
+def legacy_clean_text(text: str) -> str:
+    regrex_pattern = re.compile(pattern = "["
+        u"\U0001F600-\U0001F64F"
+        u"\U0001F300-\U0001F5FF"
+        u"\U0001F680-\U0001F6FF"
+        u"\U0001F1E0-\U0001F1FF"
+        u"\U00002700-\U000027BF"
+        u"\U00002702-\U000027B0"
+        u"\U000024C2-\U0001F251"
+        "]+", flags = re.UNICODE)
+    text = regrex_pattern.sub(r'', text)
+    text = text.lower()
+    text = re.sub(r'\[.*?\]', '', text)
+    text = re.sub(r'<.*?>+', '', text)
+    text = re.sub('[%s]' % re.escape(string.punctuation), '', text)
+    text = re.sub('\n', '', text)
+    text = re.sub(r'\w*\d\w*', '', text)
+    return re.compile(r'(\w)\1{2,}').sub(r'\1', text)
+
+def legacy_normalize_arabic(text: str, punctuations: str) -> str:
+    translator = str.maketrans('', '', punctuations)
+    text = text.translate(translator)
+    text = re.sub("[إأآا]", "ا", text)
+    text = re.sub("ى", "ي", text)
+    text = re.sub("ؤ", "ء", text)
+    text = re.sub("ئ", "ء", text)
+    text = re.sub("ة", "ه", text)
+    text = re.sub("گ", "ك", text)
+    return text
+
+def time_per_review(func, texts) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        func(text)
+    return (time.perf_counter() - start) / len(texts) * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per review cost of the text normalization")
+    parser.add_argument("--n-reviews", type=int, default=100_000)
+    args = parser.parse_args()
+    texts = [reviews[i % len(reviews)] for i in range(args.n_reviews)]
+    punctuations = get_punctuations()
+    normalizer = get_normalizer(punctuations)
+    for text in reviews:
+        assert normalizer.clean_text(text) == legacy_clean_text(text)
+        assert normalizer.normalize_arabic(text) == legacy_normalize_arabic(text, punctuations)
+    print(f"{'step':>18} {'before us':>10} {'after us':>10}")
+    before = time_per_review(legacy_clean_text, texts)
+    after = time_per_review(normalizer.clean_text, texts)
+    print(f"{'clean_text':>18} {before:>10.2f} {after:>10.2f}")
+    before = time_per_review(lambda text: legacy_normalize_arabic(text, punctuations), texts)
+    after = time_per_review(normalizer.normalize_arabic, texts)
+    print(f"{'normalize_arabic':>18} {before:>10.2f} {after:>10.2f}")
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from benchmarks.bench_preprocessor import reviews
+
+async def run_connection(host: str,
+                        port: int,
+                        n_requests: int,
+                        concurrency: int,
+                        offset: int,
+                        latencies: list,
+                        errors: list):
+    # keeps up to concurrency requests in flight on one connection
+    reader, writer = await asyncio.open_connection(host, port)
+    sent_at = {}
+    n_sent = 0
+
+    def send():
+        nonlocal n_sent
+        text, language = reviews[(offset + n_sent) % len(reviews)]
+        request_id = f"{offset}-{n_sent}"
+        sent_at[request_id] = time.perf_counter()
+        writer.write(json.dumps({"id": request_id, "text": text,
+                                "language": language}).encode("utf-8") + b"\n")
+        n_sent += 1
+
+    for _ in range(min(concurrency, n_requests)):
+        send()
+    await writer.drain()
+    for _ in range(n_requests):
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - sent_at.pop(response["id"]))
+        if "error" in response:
+            errors.append(response["error"])
+        if n_sent < n_requests:
+            send()
+            await writer.drain()
+    writer.close()
+
+async def run_load(host: str,
+                    port: int,
+                    n_requests: int,
+                    n_connections: int,
+                    concurrency: int):
+    latencies, errors = [], []
+    per_connection = n_requests // n_connections
+    start = time.perf_counter()
+    await asyncio.gather(*[run_connection(host, port, per_connection, concurrency,
+                                        i * per_connection, latencies, errors)
+                            for i in range(n_connections)])
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+    print(f"{len(latencies)} requests in {elapsed:.2f} s, "
+            f"{len(latencies) / elapsed:.0f} requests/s, {len(errors)} errors")
+    print(f"latency p50 {p50:.2f} ms  p95 {p95:.2f} ms  p99 {p99:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load generator of the preprocessing server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--n-requests", type=int, default=50_000)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="requests in flight per connection")
+    args = parser.parse_args()
+    asyncio.run(run_load(args.host, args.port, args.n_requests,
+                        args.connections, args.concurrency))
@@ -0,0 +1,153 @@
+import argparse
+import json
+import numpy as np
+import pandas as pd
+
+# Building blocks of the synthetic reviews, the english sentences have
+# contractions, emojis, digits, brackets and html tags like the real ones
+english_sentences = [
+    "I'm sure you'll love it, we've been there twice!!!",
+    "It wasn't crowded but the parking isn't big 😀",
+    "The staff were sooo friendly and the food was great",
+    "We can't wait to go back, the kids didn't want to leave",
+    "Best place in town [must visit] <b>5 stars</b>",
+    "They're open until 11pm, you'd better come early\nworth it",
+    "ok",
+]
+arabic_sentences = [
+    "مكان رائع والخدمة ممتازة",
+    "الأسعار مرتفعة قليلا لكن المكان نظيف",
+    "أنصح بزيارته مع العائلة 😍",
+    "حديقة جميلة وهادئة في الرياض",
+    "الموظفين متعاونين جدا!!",
+    "١٢٣",
+]
+translation_markers = [
+    ("More(Translated by Google) ", " (Original) "),
+    ("moretranslated by google ", " original "),
+]
+cities = ["Riyadh", "Jeddah", "Dammam", "Dhahran", "Al Baha", "Ushaiqer", "Abha", "Tabuk"]
+location_types = ["Park", "Hotel", "Museum", "Restaurant", "Beach", "Mall"]
+# Titles found in location_name_to_city and titles naming a city
+titles = ["Souq Al Zel", "King Salman Park", "Rawdah Park", "Boudl Gaber Hotel",
+        "Holiday Inn Resort Half Moon Bay", "Riyadh Front", "Jeddah Corniche",
+        "Dammam Waterfront", "Hidden Gem Cafe", "City Mall"]
+
+def make_mappings(n_tags: int = 500, seed: int = 0) -> dict:
+    """
+    builds a tags mapping like mappings.json_(DS_A-L2).json,
+    each tag id is mapped to a location type and a city
+
+    Args:
+        n_tags (int, optional): number of tags. Defaults to 500.
+        seed (int, optional): seed of the generator. Defaults to 0.
+
+    Returns:
+        dict: the mapping json
+    """
+    rng = np.random.default_rng(seed)
+    types = rng.choice(location_types, n_tags)
+    tag_cities = rng.choice(cities, n_tags)
+    return {"tags_mapping": {f"tag{i}": [str(location_type), str(city)]
+                            for i, (location_type, city) in enumerate(zip(types, tag_cities))}}
+
+def make_reviews(n_rows: int,
+                mapping_data: dict,
+                seed: int = 0,
+                translated_share: float = 0.2,
+                arabic_share: float = 0.4,
+                multi_city_share: float = 0.3,
+                missing_ratings_share: float = 0.05) -> pd.core.frame.DataFrame:
+    """
+    builds raw reviews shaped like dataset.csv_(DS_A-L2).csv, the tags
+    and the ratings are python literals of lists and dicts
+
+    Args:
+        n_rows (int): number of reviews
+        mapping_data (dict): tags mapping of make_mappings
+        seed (int, optional): seed of the generator. Defaults to 0.
+        translated_share (float, optional): share of the reviews translated
+                                            by Google. Defaults to 0.2.
+        arabic_share (float, optional): share of the other reviews
+                                        in arabic. Defaults to 0.4.
+        multi_city_share (float, optional): share of the reviews whose tags
+                                            are in several cities. Defaults to 0.3.
+        missing_ratings_share (float, optional): share of the reviews without
+                                                ratings. Defaults to 0.05.
+
+    Returns:
+        pd.core.frame.DataFrame: the raw reviews
+    """
+    rng = np.random.default_rng(seed)
+    tags_mapping = mapping_data["tags_mapping"]
+    tags_by_city = {}
+    for tag, (_, city) in tags_mapping.items():
+        tags_by_city.setdefault(city, []).append(tag)
+    tag_cities = sorted(tags_by_city)
+
+    kinds = rng.random(n_rows)
+    is_translated = kinds < translated_share
+    is_arabic = ~is_translated & (rng.random(n_rows) < arabic_share)
+    english = rng.integers(0, len(english_sentences), (n_rows, 2))
+    arabic = rng.integers(0, len(arabic_sentences), (n_rows, 2))
+    markers = rng.integers(0, len(translation_markers), n_rows)
+    contents = []
+    for i in range(n_rows):
+        english_text = " ".join(english_sentences[j] for j in english[i])
+        arabic_text = " ".join(arabic_sentences[j] for j in arabic[i])
+        if is_translated[i]:
+            prefix, separator = translation_markers[markers[i]]
+            contents.append(prefix + english_text + separator + arabic_text)
+        elif is_arabic[i]:
+            contents.append(arabic_text)
+        else:
+            contents.append(english_text)
+
+    # Tags of one city, or of several cities for the ambiguous reviews
+    n_tags = rng.integers(1, 5, n_rows)
+    multi_city = rng.random(n_rows) < multi_city_share
+    main_cities = rng.integers(0, len(tag_cities), n_rows)
+    sentiments = np.array(["positive", "negative", "neutral"])
+    tags = []
+    for i in range(n_rows):
+        review_tags = []
+        for k in range(n_tags[i]):
+            city = tag_cities[(main_cities[i] + k) % len(tag_cities)] if multi_city[i] \
+                    else tag_cities[main_cities[i]]
+            city_tags = tags_by_city[city]
+            review_tags.append({"value": city_tags[rng.integers(len(city_tags))],
+                                "sentiment": str(sentiments[rng.integers(3)])})
+        tags.append(repr(review_tags))
+
+    normalized = rng.choice([20, 39, 40, 41, 50, 59, 60, 61, 80, 100], n_rows)
+    ratings = [repr({"normalized": int(value), "raw": int(value) // 20})
+                for value in normalized]
+    missing = rng.random(n_rows) < missing_ratings_share
+    ratings = pd.Series(ratings, dtype=object).mask(missing)
+
+    seconds = rng.integers(0, 3 * 365 * 24 * 3600, n_rows)
+    dates = (pd.Timestamp("2021-01-01", tz="Asia/Riyadh")
+            + pd.to_timedelta(seconds, unit="s")).strftime("%Y-%m-%dT%H:%M:%S%z")
+    # strftime gives +0300, the dataset has +03:00
+    dates = dates.str[:-2] + ":" + dates.str[-2:]
+    return pd.DataFrame({"id": np.arange(n_rows),
+                        "content": contents,
+                        "date": dates,
+                        "language": np.where(is_arabic, "ara", "eng"),
+                        "title": rng.choice(titles, n_rows),
+                        "tags": tags,
+                        "ratings": ratings})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="writes a synthetic reviews dataset")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--translated-share", type=float, default=0.2)
+    parser.add_argument("--output", default="synthetic_reviews.csv")
+    parser.add_argument("--mappings-output", default="synthetic_mappings.json")
+    args = parser.parse_args()
+    mapping_data = make_mappings(seed=args.seed)
+    reviews = make_reviews(args.rows, mapping_data, args.seed, args.translated_share)
+    reviews.to_csv(args.output, index=False)
+    with open(args.mappings_output, "w") as mappings_file:
+        json.dump(mapping_data, mappings_file)
@@ -0,0 +1,265 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Part of the configuration fingerprint, it has to be bumped when
+# a change of the cleaning code changes the cleaned texts or labels
+CACHE_VERSION = 3
+
+# Groups of the output rows of a review, a whole-file run outputs all
+# the arabic rows, then the english ones, then the english halves of
+# the translated reviews. Reviews without any output keep a marker row
+ARABIC_GROUP = 0
+ENGLISH_GROUP = 1
+TRANSLATED_GROUP = 2
+NO_OUTPUT_GROUP = -1
+
+KEY_COLUMNS = ["id", "content_hash"]
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """
+    hashes the configuration of the cleaning stages (stop words,
+    contractions, punctuations, mappings, label encoding ...)
+
+    Args:
+        config (Dict[str, Any]): json serializable configuration, sets
+                                are serialized as sorted lists
+
+    Returns:
+        str: hex digest of the configuration
+    """
+    payload = json.dumps({"version": CACHE_VERSION, "config": config},
+                        sort_keys=True, ensure_ascii=False, default=sorted)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+def review_hashes(rating_df: pd.core.frame.DataFrame,
+                columns: Sequence[str] = ("content", "language", "ratings")) -> np.ndarray:
+    """
+    hashes the raw columns a cleaned review depends on, the text, its
+    language which routes it to the arabic or english cleaning and the
+    ratings from which the label is computed
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): raw reviews
+        columns (Sequence[str], optional): hashed columns.
+                                            Defaults to ("content", "language", "ratings").
+
+    Returns:
+        np.ndarray: uint64 hash of each review
+    """
+    return pd.util.hash_pandas_object(rating_df[list(columns)].astype(str),
+                                        index=False).to_numpy()
+
+def review_groups(language: pd.core.series.Series,
+                translated: pd.core.series.Series) -> np.ndarray:
+    """
+    Args:
+        language (pd.core.series.Series): language of the output rows
+        translated (pd.core.series.Series): whether the rows are the english
+                                            halves of translated reviews
+
+    Returns:
+        np.ndarray: int8 group of each output row
+    """
+    return np.where(language == "ara", ARABIC_GROUP,
+                    np.where(translated.astype(bool),
+                            TRANSLATED_GROUP, ENGLISH_GROUP)).astype(np.int8)
+
+def processed_to_entries(processed_df: pd.core.frame.DataFrame,
+                        keys_df: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+    """
+    converts the output of the pipeline into cache entries, one per
+    output row plus a marker for the reviews that were filtered out
+
+    Args:
+        processed_df (pd.core.frame.DataFrame): processed reviews with the id,
+                                    content_hash, language, translated,
+                                    content and class columns
+        keys_df (pd.core.frame.DataFrame): id and content_hash of all the
+                                            processed reviews
+
+    Returns:
+        pd.core.frame.DataFrame: the cache entries
+    """
+    entries = pd.DataFrame({"id": processed_df["id"].to_numpy(),
+                            "content_hash": processed_df["content_hash"].to_numpy(),
+                            "group": review_groups(processed_df["language"],
+                                                    processed_df["translated"]),
+                            "text": processed_df["content"].to_numpy(),
+                            "label": processed_df["class"].to_numpy()})
+    processed_keys = pd.MultiIndex.from_frame(entries[KEY_COLUMNS])
+    filtered_out = keys_df[~pd.MultiIndex.from_frame(keys_df[KEY_COLUMNS]).isin(processed_keys)]
+    markers = pd.DataFrame({"id": filtered_out["id"].to_numpy(),
+                            "content_hash": filtered_out["content_hash"].to_numpy(),
+                            "group": np.full(len(filtered_out), NO_OUTPUT_GROUP, dtype=np.int8),
+                            "text": [None] * len(filtered_out),
+                            "label": np.full(len(filtered_out), -1, dtype=entries["label"].dtype)})
+    return pd.concat([entries, markers], ignore_index=True)
+
+def entries_to_processed(keys_df: pd.core.frame.DataFrame,
+                        entries: pd.core.frame.DataFrame,
+                        dropped: pd.core.frame.DataFrame = None) -> pd.core.frame.DataFrame:
+    """
+    rebuilds the output of the pipeline for the given reviews from
+    their cache entries, in the order of a whole-file run
+
+    Args:
+        keys_df (pd.core.frame.DataFrame): id and content_hash of the reviews
+                                            in their input order
+        entries (pd.core.frame.DataFrame): cache entries of the reviews
+        dropped (pd.core.frame.DataFrame, optional): review_position (in
+                                    keys_df) and group of the output rows to
+                                    drop, the rows that depend on the other
+                                    reviews like the duplicates. Defaults to None.
+
+    Returns:
+        pd.core.frame.DataFrame: processed reviews with the language,
+                                translated, content and class columns
+    """
+    order = keys_df[KEY_COLUMNS].reset_index(drop=True)
+    order["review_position"] = np.arange(len(order))
+    rows = order.merge(entries[entries["group"] != NO_OUTPUT_GROUP], on=KEY_COLUMNS)
+    if dropped is not None and len(dropped):
+        rows = rows.merge(dropped[["review_position", "group"]].assign(is_dropped=True),
+                        on=["review_position", "group"], how="left")
+        rows = rows[rows["is_dropped"].isna()]
+    rows = rows.sort_values(["group", "review_position"], kind="stable")
+    groups = rows["group"].to_numpy()
+    return pd.DataFrame({"content": rows["text"].to_numpy(),
+                        "class": rows["label"].to_numpy(),
+                        "language": np.where(groups == ARABIC_GROUP, "ara", "eng"),
+                        "translated": groups == TRANSLATED_GROUP})
+
+class StageCache:
+    """
+    On-disk cache of the cleaned reviews. The entries are stored in
+    parquet segments under a directory named after the fingerprint of
+    the configuration, so changing a stop word list or a mapping starts
+    a new cache. The oldest segments are evicted when the cache gets
+    bigger than max_bytes
+
+    Args:
+        cache_dir (str): root directory of the cache
+        config (Dict[str, Any]): configuration of the cleaning stages
+        max_bytes (int, optional): size limit of the cache.
+                                    Defaults to 2 GiB.
+    """
+    def __init__(self,
+                cache_dir: str,
+                config: Dict[str, Any],
+                max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.fingerprint = config_fingerprint(config)
+        self.config_dir = os.path.join(cache_dir, self.fingerprint)
+        self.max_bytes = max_bytes
+        self._entries = None
+
+    def segment_paths(self) -> List[str]:
+        # segments of all the configurations
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [os.path.join(root, name)
+                for root, _, names in os.walk(self.cache_dir)
+                for name in names if name.endswith(".parquet")]
+
+    def size(self) -> int:
+        return sum(os.path.getsize(path) for path in self.segment_paths())
+
+    def load(self) -> pd.core.frame.DataFrame:
+        """
+        loads the entries of the current configuration, they are read
+        once and the segments are marked as recently used
+
+        Returns:
+            pd.core.frame.DataFrame: the cache entries
+        """
+        if self._entries is None:
+            paths = []
+            if os.path.isdir(self.config_dir):
+                paths = sorted(os.path.join(self.config_dir, name)
+                                for name in os.listdir(self.config_dir)
+                                if name.endswith(".parquet"))
+            if paths:
+                entries = pd.concat([pd.read_parquet(path) for path in paths],
+                                    ignore_index=True)
+                self._entries = entries.drop_duplicates(KEY_COLUMNS + ["group"], keep="last")
+                for path in paths:
+                    os.utime(path)
+            else:
+                self._entries = pd.DataFrame({"id": pd.Series(dtype=object),
+                                            "content_hash": pd.Series(dtype=np.uint64),
+                                            "group": pd.Series(dtype=np.int8),
+                                            "text": pd.Series(dtype=object),
+                                            "label": pd.Series(dtype=np.int8)})
+        return self._entries
+
+    def lookup(self, keys_df: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+        """
+        returns the cached entries of the given reviews
+
+        Args:
+            keys_df (pd.core.frame.DataFrame): id and content_hash of the reviews
+
+        Returns:
+            pd.core.frame.DataFrame: entries of the reviews found in the cache
+        """
+        entries = self.load()
+        cached_keys = pd.MultiIndex.from_frame(entries[KEY_COLUMNS])
+        found = cached_keys.isin(pd.MultiIndex.from_frame(keys_df[KEY_COLUMNS]))
+        return entries[found]
+
+    def store(self, entries: pd.core.frame.DataFrame):
+        """
+        writes new entries in a new segment then evicts the oldest
+        segments if the cache is too big
+
+        Args:
+            entries (pd.core.frame.DataFrame): entries to be cached
+        """
+        if not len(entries):
+            return
+        os.makedirs(self.config_dir, exist_ok=True)
+        path = os.path.join(self.config_dir, f"segment-{uuid.uuid4().hex}.parquet")
+        entries.to_parquet(path, index=False)
+        if self._entries is not None:
+            self._entries = pd.concat([self._entries, entries], ignore_index=True)
+        self.evict()
+
+    def evict(self):
+        # removes the least recently used segments until
+        # the cache fits in max_bytes
+        paths = sorted(self.segment_paths(), key=os.path.getmtime)
+        total_size = sum(os.path.getsize(path) for path in paths)
+        for path in paths:
+            if total_size <= self.max_bytes:
+                break
+            total_size -= os.path.getsize(path)
+            os.remove(path)
+            logger.info("evicted cache segment %s", path)
+
+    def clear(self):
+        # invalidates every cached entry of every configuration
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+        self._entries = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="manages the cleaned reviews cache")
+    parser.add_argument("command", choices=["info", "clear"])
+    parser.add_argument("--cache-dir", default=".cleaning_cache")
+    args = parser.parse_args()
+    cache = StageCache(args.cache_dir, {})
+    if args.command == "clear":
+        cache.clear()
+        print(f"cleared {args.cache_dir}")
+    else:
+        print(f"{len(cache.segment_paths())} segments, {cache.size()} bytes")
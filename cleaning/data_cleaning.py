@@ -1,27 +1,71 @@
 import pandas as pd
-import datetime
+import numpy as np
 import ast
-from typing import List, Dict
+import json
+import logging
+from typing import Any, List, Dict, Tuple
 from collections import Counter
 
+logger = logging.getLogger(__name__)
+
 def fix_datetime_column(rating_df: pd.core.frame.DataFrame,
-                        data_col_name: str) -> pd.core.frame.DataFrame:
+                        data_col_name: str,
+                        date_format: str = "%Y-%m-%dT%H:%M:%S%z") -> pd.core.frame.DataFrame:
     """
-    converts the date column from string to datetime
+    converts the date column from string to a timezone aware
+    datetime column, the dates are parsed all at once and
+    converted to UTC since the reviews have different offsets
 
     Args:
         rating_df (pd.core.frame.DataFrame): rating_df on which we will apply
                                     the transformations
         data_col_name (str): name of the date column
+        date_format (str, optional): format of the dates.
+                                    Defaults to "%Y-%m-%dT%H:%M:%S%z".
 
     Returns:
         pd.core.frame.DataFrame: resulting dataframe
     """
-    rating_df[data_col_name] = rating_df[data_col_name].apply(lambda x: datetime.strptime(x, "%Y-%m-%dT%H:%M:%S%z"))
+    if pd.api.types.is_datetime64_any_dtype(rating_df[data_col_name]):
+        # dates read from a columnar file are already parsed
+        rating_df[data_col_name] = pd.to_datetime(rating_df[data_col_name], utc=True)
+        return rating_df
+    rating_df[data_col_name] = pd.to_datetime(rating_df[data_col_name],
+                                            format=date_format,
+                                            utc=True)
     return rating_df
 
+def parse_literal(text: Any) -> Tuple[Any, str]:
+    """
+    parses a python literal (list, dict, ...) written as a string.
+    The literal is first parsed as json, the single quotes of the python
+    literals are swapped with double quotes when it can't change the value
+    (no double quote and no escape in the text), ast.literal_eval is only
+    used for the literals rejected by the json parser. Values read already
+    parsed from a columnar file are returned as is
+
+    Args:
+        text (Any): the literal
+
+    Returns:
+        Tuple[Any, str]: the parsed value and the parser used,
+                        "native", "json" or "literal_eval"
+    """
+    if isinstance(text, (list, dict)) or text is None:
+        return text, "native"
+    if isinstance(text, str):
+        json_text = text
+        if '"' not in text and '\\' not in text:
+            json_text = text.replace("'", '"')
+        try:
+            return json.loads(json_text), "json"
+        except ValueError:
+            pass
+    return ast.literal_eval(text), "literal_eval"
+
 def fix_type_column(rating_df: pd.core.frame.DataFrame,
-                        data_col_name: str) -> pd.core.frame.DataFrame:
+                        data_col_name: str,
+                        parse_stats: Dict[str, int] = None) -> pd.core.frame.DataFrame:
     """
     Convert columns to their appropriate datatype
 
@@ -29,11 +73,23 @@ def fix_type_column(rating_df: pd.core.frame.DataFrame,
         rating_df (pd.core.frame.DataFrame): rating_df on which we will apply
                                     the transformations
         data_col_name (str): name of the column to convert
+        parse_stats (Dict[str, int], optional): if given it is updated with
+                                    the number of rows already parsed ("native")
+                                    and parsed by the "json" and the
+                                    "literal_eval" parsers. Defaults to None.
 
     Returns:
         pd.core.frame.DataFrame: dataframe with fixed datatype
     """
-    rating_df[data_col_name] = rating_df[data_col_name].apply(lambda x: ast.literal_eval(x))
+    parsed = [parse_literal(x) for x in rating_df[data_col_name]]
+    rating_df[data_col_name] = pd.Series([value for value, _ in parsed],
+                                        index=rating_df.index, dtype=object)
+    counts = Counter(parser for _, parser in parsed)
+    logger.info("%s: %d rows already parsed, %d rows parsed as json, %d rows with literal_eval",
+                data_col_name, counts["native"], counts["json"], counts["literal_eval"])
+    if parse_stats is not None:
+        for parser in ["native", "json", "literal_eval"]:
+            parse_stats[parser] = parse_stats.get(parser, 0) + counts[parser]
     return rating_df
 
 def remove_empty_rows(rating_df: pd.core.frame.DataFrame,
@@ -148,6 +204,101 @@ def get_location_type(rating_df: pd.core.frame.DataFrame,
     rating_df["type"] = rating_df[col_name].apply(lambda x: [li[0] for li in x])
     return rating_df
 
+def explode_ratings_and_tags(rating_df: pd.core.frame.DataFrame,
+                            mapping_json: dict,
+                            ratings_col: str = "ratings",
+                            tags_col: str = "tags",
+                            parse_literals: bool = False) -> Tuple[pd.core.frame.DataFrame,
+                                                            pd.core.frame.DataFrame]:
+    """
+    walks the parsed ratings and tags once and replaces split_ratings,
+    get_tag_and_sentiment, map_tags, get_city and get_location_type.
+    The ratings become numeric columns of the reviews dataframe and
+    the tags are returned in a long format dataframe with one row per
+    tag instead of lists inside the cells
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): dataframe with parsed ratings and tags
+        mapping_json (dict): a mapping dict/json containing the ids with their
+                            associated values
+        ratings_col (str, optional): name of the ratings column.
+                                    Defaults to "ratings".
+        tags_col (str, optional): name of the tags column.
+                                    Defaults to "tags".
+        parse_literals (bool, optional): the ratings and tags are still literals,
+                                    they are parsed review by review so the parsed
+                                    dicts are never all in memory. Defaults to False.
+
+    Returns:
+        Tuple[pd.core.frame.DataFrame, pd.core.frame.DataFrame]: the reviews without
+            the ratings and tags columns but with the normalized_rating and raw_rating
+            columns, and the tags with the columns review (index of the review), value,
+            sentiment, type and city
+    """
+    mappers = mapping_json['tags_mapping']
+    normalized_ratings, raw_ratings = [], []
+    reviews, values, sentiments, types, cities = [], [], [], [], []
+    for review, ratings, tags in zip(rating_df.index,
+                                    rating_df[ratings_col],
+                                    rating_df[tags_col]):
+        if parse_literals:
+            ratings, tags = parse_literal(ratings)[0], parse_literal(tags)[0]
+        normalized_ratings.append(ratings['normalized'])
+        raw_ratings.append(ratings['raw'])
+        for element in tags:
+            # the mapped tags are lists with the location
+            # type first and the city second
+            location = mappers[element['value']]
+            reviews.append(review)
+            values.append(element['value'])
+            sentiments.append(element['sentiment'])
+            types.append(location[0])
+            cities.append(location[1])
+    reviews_df = rating_df.drop([ratings_col, tags_col], axis=1)
+    reviews_df["normalized_rating"] = pd.to_numeric(pd.Series(normalized_ratings,
+                                                            index=rating_df.index))
+    reviews_df["raw_rating"] = pd.to_numeric(pd.Series(raw_ratings,
+                                                        index=rating_df.index))
+    # The tag values, types and cities repeat a lot so
+    # they are stored as categoricals
+    tags_df = pd.DataFrame({"review": pd.Series(reviews, dtype=rating_df.index.dtype),
+                            "value": pd.Categorical(values),
+                            "sentiment": pd.Categorical(sentiments),
+                            "type": pd.Categorical(types),
+                            "city": pd.Categorical(cities)})
+    return reviews_df, tags_df
+
+def get_city_from_tags(rating_df: pd.core.frame.DataFrame,
+                        tags_df: pd.core.frame.DataFrame,
+                        col_name: str = "city") -> pd.core.frame.DataFrame:
+    """
+    get the city of each review from the long format tags, it gives
+    the same column as get_city followed by reformat_city_column:
+    the city when all the tags have the same city and the list of
+    the cities otherwise. Reviews without tags get a null city
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): dataframe of the reviews
+        tags_df (pd.core.frame.DataFrame): tags returned by explode_ratings_and_tags
+        col_name (str, optional): name of the cities column. Defaults to "city".
+
+    Returns:
+        pd.core.frame.DataFrame: dataframe with the cities column
+    """
+    grouped_cities = tags_df.groupby("review", sort=False)["city"]
+    n_cities = grouped_cities.nunique()
+    cities = grouped_cities.first().astype(object).reindex(rating_df.index).tolist()
+    # Only the reviews with different cities keep a list
+    mixed_reviews = n_cities.index[n_cities > 1]
+    if len(mixed_reviews):
+        mixed_tags = tags_df[tags_df["review"].isin(mixed_reviews)]
+        mixed_cities = mixed_tags.groupby("review", sort=False)["city"].agg(list)
+        positions = rating_df.index.get_indexer(mixed_cities.index)
+        for position, city_list in zip(positions, mixed_cities):
+            cities[position] = city_list
+    rating_df[col_name] = pd.Series(cities, index=rating_df.index, dtype=object)
+    return rating_df
+
 def reformat_city(name_list: List[str]):
     """
     reformating the city name lists
@@ -195,12 +346,8 @@ def get_incorrect_cities(rating_df: pd.core.frame.DataFrame) -> List[int]:
     Returns:
         List[int]: list of the incorrect indices
     """
-    all_cities = rating_df['city'].values
-    problem_cities_indices = []
-    for i in range(len(all_cities)):
-        if type(all_cities[i])==list:
-            problem_cities_indices.append(i)
-    return problem_cities_indices
+    return [i for i, city in enumerate(rating_df['city'].values)
+            if type(city) == list]
 
 def is_substring_in_list(substrings: List[str],
                         target_string: str):
@@ -237,9 +384,108 @@ def get_most_common_element(lst: List[str]):
     else:
         return None
 
+class CityResolver:
+    """
+    Resolves the city of the reviews tagged with several cities.
+    The title to city mapping is indexed once and the cities found in
+    each distinct title are computed once, the rules are applied by
+    priority: a city of the list found in the title, then the most
+    common city of the list (for lists of more than 2 cities), then
+    the city mapped to the title
+
+    Args:
+        location_name_to_city (Dict[str, str]): mapping of the location
+                                                names to their cities
+    """
+    rules = ["title_substring", "majority", "title_mapping", "unresolved"]
+
+    def __init__(self, location_name_to_city: Dict[str, str]):
+        self.title_to_city = dict(location_name_to_city)
+
+    def _cities_in_titles(self,
+                        titles: List[str],
+                        cities: List[str]) -> Dict[str, frozenset]:
+        # Titles and cities repeat a lot, each distinct title
+        # is searched once for all the distinct cities
+        cities = [city for city in set(cities) if isinstance(city, str) and city]
+        return {title: frozenset(city for city in cities if city in title)
+                for title in set(titles) if isinstance(title, str)}
+
+    def resolve_city(self, city_list: List[str], title: str,
+                    cities_in_title: frozenset) -> Tuple[Any, str]:
+        """
+        resolves the city of one review
+
+        Args:
+            city_list (List[str]): cities of the review
+            title (str): title of the review
+            cities_in_title (frozenset): cities found in the title
+
+        Returns:
+            Tuple[Any, str]: the city (the list if unresolved) and the rule used
+        """
+        for city in city_list:
+            if city in cities_in_title:
+                return city, "title_substring"
+            if city == "" and isinstance(title, str):
+                # an empty city is a substring of every title but it is
+                # falsy so is_substring_in_list stops without a match
+                break
+        if len(city_list) > 2:
+            most_common = get_most_common_element(city_list)
+            if most_common:
+                return most_common, "majority"
+        if isinstance(title, str) and title in self.title_to_city:
+            return self.title_to_city[title], "title_mapping"
+        return city_list, "unresolved"
+
+    def resolve(self,
+                rating_df: pd.core.frame.DataFrame,
+                problem_cities_indices: List[int] = None,
+                resolution_stats: Dict[str, int] = None) -> pd.core.frame.DataFrame:
+        """
+        resolves the cities of all the given rows in one pass
+
+        Args:
+            rating_df (pd.core.frame.DataFrame): dataframe to be adjusted
+            problem_cities_indices (List[int], optional): positions of the bad
+                                    cities. Defaults to get_incorrect_cities(rating_df).
+            resolution_stats (Dict[str, int], optional): if given it is updated
+                                    with the number of rows resolved by each rule.
+                                    Defaults to None.
+
+        Returns:
+            pd.core.frame.DataFrame: correctly labeled cities
+        """
+        if problem_cities_indices is None:
+            problem_cities_indices = get_incorrect_cities(rating_df)
+        # the resolved cities are written to a copy of the column, writing
+        # through .values fails with the pandas copy on write
+        cities = rating_df['city'].to_numpy(copy=True)
+        titles = rating_df['title'].values
+        city_lists = [cities[index] for index in problem_cities_indices]
+        problem_titles = [titles[index] for index in problem_cities_indices]
+        cities_in_titles = self._cities_in_titles(problem_titles,
+                                                [city for city_list in city_lists
+                                                for city in city_list])
+        counts = dict.fromkeys(self.rules, 0)
+        for index, city_list, title in zip(problem_cities_indices, city_lists, problem_titles):
+            city, rule = self.resolve_city(city_list, title,
+                                            cities_in_titles.get(title, frozenset()))
+            cities[index] = city
+            counts[rule] += 1
+        rating_df['city'] = pd.Series(cities, index=rating_df.index, dtype=object)
+        logger.info("cities resolved by %s",
+                    ", ".join(f"{rule}: {count}" for rule, count in counts.items()))
+        if resolution_stats is not None:
+            for rule, count in counts.items():
+                resolution_stats[rule] = resolution_stats.get(rule, 0) + count
+        return rating_df
+
 def fix_incorrect_cities(rating_df: pd.core.frame.DataFrame,
                         problem_cities_indices: List[int],
-                        location_name_to_city: Dict[str, str]):
+                        location_name_to_city: Dict[str, str],
+                        resolution_stats: Dict[str, int] = None):
     """
     Attribute to each location its appropriate city
 
@@ -247,22 +493,15 @@ def fix_incorrect_cities(rating_df: pd.core.frame.DataFrame,
         rating_df (pd.core.frame.DataFrame): dataframe to be adjusted
         problem_cities_indices (List[int]): indices of bad cities
         location_name_to_city (Dict[str]): mapping dictionary
+        resolution_stats (Dict[str, int], optional): if given it is updated
+                                    with the number of rows resolved by each rule.
+                                    Defaults to None.
 
     Returns:
         pd.core.frame.DataFrame: correctly labeled cities
     """
-    for index in problem_cities_indices:
-        if is_substring_in_list(rating_df['city'].values[index],
-                                rating_df['title'].values[index]):
-            rating_df['city'].values[index] = is_substring_in_list(rating_df['city'].values[index],
-                                rating_df['title'].values[index])
-        elif len(rating_df['city'].values[index])>2 and get_most_common_element(rating_df['city'].values[index]):
-            rating_df['city'].values[index] = get_most_common_element(rating_df['city'].values[index])
-        elif rating_df['title'].values[index] in list(location_name_to_city.keys()):
-            rating_df['city'].values[index] = location_name_to_city[rating_df['title'].values[index]]
-        else:
-            continue
-    return rating_df
+    city_resolver = CityResolver(location_name_to_city)
+    return city_resolver.resolve(rating_df, problem_cities_indices, resolution_stats)
 
 def reformat_sentiment_col(rating_df: pd.core.frame.DataFrame,
                             col_name: str = "sentiment") -> pd.core.frame.DataFrame:
@@ -301,6 +540,87 @@ def filter_columns(rating_df: pd.core.frame.DataFrame,
     filtered_dataset = rating_df[column_list]
     return filtered_dataset
 
+def downcast_integers(values: pd.core.series.Series) -> pd.core.series.Series:
+    """
+    stores integer values in the smallest integer dtype, floats are
+    only downcast when they are all integers without nulls so the
+    values never change
+
+    Args:
+        values (pd.core.series.Series): numeric column
+
+    Returns:
+        pd.core.series.Series: the downcast column
+    """
+    if pd.api.types.is_float_dtype(values):
+        if values.isna().any() or not (values == np.floor(values)).all():
+            return values
+        values = values.astype(np.int64)
+    if not pd.api.types.is_integer_dtype(values):
+        return values
+    return pd.to_numeric(values, downcast="integer")
+
+def compact_reviews(rating_df: pd.core.frame.DataFrame,
+                    drop_columns: List[str] = ["raw_rating"],
+                    category_columns: Dict[str, List[str]] = {"language": ["ara", "eng"]},
+                    integer_columns: List[str] = ["id", "normalized_rating"]) -> pd.core.frame.DataFrame:
+    """
+    reduces the memory of the reviews dataframe: drops the columns
+    that aren't used anymore, stores the low cardinality columns as
+    categoricals and the integer columns in the smallest integer dtype
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): reviews returned by explode_ratings_and_tags
+        drop_columns (List[str], optional): dead columns. Defaults to ["raw_rating"].
+        category_columns (Dict[str, List[str]], optional): categorical columns with the
+                                    values assigned later that have to be categories.
+                                    Defaults to {"language": ["ara", "eng"]}.
+        integer_columns (List[str], optional): columns to downcast.
+                                    Defaults to ["id", "normalized_rating"].
+
+    Returns:
+        pd.core.frame.DataFrame: the compact reviews
+    """
+    rating_df = rating_df.drop([name for name in drop_columns if name in rating_df.columns],
+                                axis=1)
+    for name, extra_categories in category_columns.items():
+        if name not in rating_df.columns:
+            continue
+        values = rating_df[name].astype("category")
+        missing_categories = [category for category in extra_categories
+                            if category not in values.cat.categories]
+        rating_df[name] = values.cat.add_categories(missing_categories)
+    for name in integer_columns:
+        if name in rating_df.columns:
+            rating_df[name] = downcast_integers(rating_df[name])
+    return rating_df
+
+def compact_tags(tags_df: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+    # the other columns of the tags are already categoricals
+    tags_df["review"] = downcast_integers(tags_df["review"])
+    return tags_df
+
+def compact_cities(rating_df: pd.core.frame.DataFrame,
+                    col_name: str = "city",
+                    separator: str = "|") -> pd.core.frame.DataFrame:
+    """
+    stores the cities as a categorical column, the cities that
+    fix_incorrect_cities couldn't resolve are still lists and are
+    kept as their cities joined by the separator
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): reviews with the resolved cities
+        col_name (str, optional): name of the cities column. Defaults to "city".
+        separator (str, optional): separator of the unresolved cities. Defaults to "|".
+
+    Returns:
+        pd.core.frame.DataFrame: reviews with the categorical cities
+    """
+    cities = [separator.join(city) if isinstance(city, list) else city
+            for city in rating_df[col_name]]
+    rating_df[col_name] = pd.Categorical(cities)
+    return rating_df
+
 def compute_sentiment(rating: int) -> str:
     """
     Based on the rased it returns if the sentiment
@@ -340,6 +660,44 @@ def compute_sentiment_col(rating_df: pd.core.frame.DataFrame,
     rating_df[col_name] = rating_df["normalized_rating"].apply(lambda x: compute_sentiment(x))
     return rating_df
 
+def compute_label_col(rating_df: pd.core.frame.DataFrame,
+                    label_enc: Dict[str, int],
+                    col_name: str = "class",
+                    negative_threshold: float = 40,
+                    positive_threshold: float = 60,
+                    sentiment_col_name: str = None) -> pd.core.frame.DataFrame:
+    """
+    buckets the normalized ratings directly into the encoded classes,
+    it gives the same classes as compute_sentiment_col followed by
+    sentiment_encoder: above positive_threshold the review is positive,
+    below negative_threshold it is negative and otherwise neutral
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): dataframe of the ratings
+        label_enc (Dict[str, int]): encoding of the positive, neutral
+                                    and negative sentiments
+        col_name (str, optional): name of the class column. Defaults to "class".
+        negative_threshold (float, optional): ratings below it are negative.
+                                                Defaults to 40.
+        positive_threshold (float, optional): ratings above it are positive.
+                                                Defaults to 60.
+        sentiment_col_name (str, optional): if given a categorical column with
+                                            the sentiment names is also added.
+                                            Defaults to None.
+
+    Returns:
+        pd.core.frame.DataFrame: df with the int8 class column
+    """
+    ratings = np.asarray(rating_df["normalized_rating"], dtype=np.float64)
+    labels = np.full(len(ratings), label_enc["neutral"], dtype=np.int8)
+    labels[ratings > positive_threshold] = label_enc["positive"]
+    labels[ratings < negative_threshold] = label_enc["negative"]
+    rating_df[col_name] = labels
+    if sentiment_col_name is not None:
+        label_dec = {label: sentiment for sentiment, label in label_enc.items()}
+        rating_df[sentiment_col_name] = pd.Categorical(rating_df[col_name].map(label_dec))
+    return rating_df
+
 def sentiment_encoder(df: pd.core.frame.DataFrame, 
                     label_enc: dict):
     df["class"] = df["sentiment"].apply(lambda x: label_enc[x])
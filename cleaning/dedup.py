@@ -0,0 +1,269 @@
+import logging
+import re
+import time
+import numpy as np
+import pandas as pd
+from cleaning.pipeline import PipelineHook
+from typing import Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEDUP_MODES = ["exact", "minhash"]
+
+# Punctuations, symbols and runs of spaces are collapsed to one space before
+# hashing so the re-scraped copies with different spacing are the same text
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+# Prime of the minhash permutations, larger than all the 32 bits shingle hashes
+MINHASH_PRIME = np.uint64((1 << 61) - 1)
+
+def normalize_content(texts: pd.core.series.Series) -> pd.core.series.Series:
+    """
+    lower cases the texts and replaces the punctuations
+    and the runs of spaces by one space
+
+    Args:
+        texts (pd.core.series.Series): the texts
+
+    Returns:
+        pd.core.series.Series: normalized texts
+    """
+    return (texts.fillna("").astype(str).str.lower()
+            .str.replace(NON_WORD_PATTERN, " ", regex=True).str.strip())
+
+def content_fingerprints(texts: pd.core.series.Series) -> np.ndarray:
+    """
+    hashes the normalized texts in one vectorized pass
+
+    Args:
+        texts (pd.core.series.Series): the texts
+
+    Returns:
+        np.ndarray: uint64 fingerprint of each text
+    """
+    return pd.util.hash_pandas_object(normalize_content(texts), index=False).to_numpy()
+
+def exact_duplicates(texts: pd.core.series.Series) -> np.ndarray:
+    """
+    flags the texts whose normalized content appeared before, the texts
+    left empty by the normalization (only punctuations, emojis or spaces)
+    have nothing in common and are never flagged
+
+    Args:
+        texts (pd.core.series.Series): the texts
+
+    Returns:
+        np.ndarray: True for the duplicates, the first occurrence is kept
+    """
+    normalized = normalize_content(texts)
+    fingerprints = pd.util.hash_pandas_object(normalized, index=False)
+    return (fingerprints.duplicated() & (normalized != "")).to_numpy()
+
+def get_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    picks the number of bands and of rows per band of the lsh index whose
+    similarity threshold (1 / bands) ** (1 / rows) is the closest to the
+    given one
+
+    Args:
+        num_perm (int): number of minhash permutations
+        threshold (float): jaccard similarity of the near duplicates
+
+    Returns:
+        Tuple[int, int]: number of bands and number of rows per band
+    """
+    divisors = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    bands = min(divisors,
+                key=lambda bands: abs((1 / bands) ** (bands / num_perm) - threshold))
+    return bands, num_perm // bands
+
+class MinHasher:
+    """
+    Computes the minhash signatures of the word shingles of the texts.
+    The texts are hashed by blocks so the memory of the intermediate
+    shingles x permutations matrix is bounded by the block size, the
+    signatures take 4 * num_perm bytes per text
+
+    Args:
+        num_perm (int, optional): number of permutations. Defaults to 64.
+        shingle_size (int, optional): number of words per shingle. Defaults to 3.
+        block_size (int, optional): number of texts hashed at once. Defaults to 2000.
+        seed (int, optional): seed of the permutations. Defaults to 0.
+    """
+    def __init__(self,
+                num_perm: int = 64,
+                shingle_size: int = 3,
+                block_size: int = 2000,
+                seed: int = 0):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.block_size = block_size
+        rng = np.random.default_rng(seed)
+        # h(x) = (a * x + b) mod p, a and b are below 2 ** 29 so that
+        # a * x + b can't overflow with the 32 bits shingle hashes
+        self.a = rng.integers(1, 1 << 29, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 29, num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> list:
+        words = text.split()
+        if len(words) <= self.shingle_size:
+            return [" ".join(words)]
+        return [" ".join(words[i:i + self.shingle_size])
+                for i in range(len(words) - self.shingle_size + 1)]
+
+    def signatures(self, texts: pd.core.series.Series) -> np.ndarray:
+        """
+        Args:
+            texts (pd.core.series.Series): normalized texts
+
+        Returns:
+            np.ndarray: uint32 signatures, one row per text
+        """
+        values = texts.tolist()
+        signatures = np.empty((len(values), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(values), self.block_size):
+            block = [self.shingles(text) for text in values[start:start + self.block_size]]
+            counts = np.fromiter((len(shingles) for shingles in block), dtype=np.int64,
+                                count=len(block))
+            shingles = np.array([shingle for shingles in block for shingle in shingles],
+                                dtype=object)
+            hashes = pd.util.hash_array(shingles) & np.uint64(0xFFFFFFFF)
+            permuted = (hashes[:, None] * self.a + self.b) % MINHASH_PRIME
+            # every text has at least one shingle so the
+            # starts of the texts are strictly increasing
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            signatures[start:start + len(block)] = np.minimum.reduceat(permuted, starts, axis=0)
+        return signatures
+
+def near_duplicates(texts: pd.core.series.Series,
+                    threshold: float = 0.8,
+                    hasher: MinHasher = None) -> np.ndarray:
+    """
+    flags the texts similar to an earlier text with minhash and lsh, the
+    texts sharing a band with an earlier text are candidates and are
+    kept unless their estimated jaccard similarity reaches the threshold.
+    The texts left empty by the normalization are never flagged
+
+    Args:
+        texts (pd.core.series.Series): the texts
+        threshold (float, optional): jaccard similarity of the word shingles
+                                    above which a text is a duplicate.
+                                    Defaults to 0.8.
+        hasher (MinHasher, optional): Defaults to MinHasher().
+
+    Returns:
+        np.ndarray: True for the duplicates, the first text of each
+                    group of similar texts is kept
+    """
+    hasher = hasher or MinHasher()
+    normalized = normalize_content(texts)
+    # the empty texts all have the same signature
+    is_empty = (normalized == "").to_numpy()
+    signatures = hasher.signatures(normalized)
+    n_bands, rows = get_bands(hasher.num_perm, threshold)
+    is_duplicate = np.zeros(len(signatures), dtype=bool)
+    positions = np.arange(len(signatures))
+    for band in range(n_bands):
+        band_keys = pd.util.hash_pandas_object(
+            pd.DataFrame(signatures[:, band * rows:(band + 1) * rows]), index=False).to_numpy()
+        # first text of the bucket of each text
+        _, first, inverse = np.unique(band_keys, return_index=True, return_inverse=True)
+        first = first[inverse.reshape(-1)]
+        candidates = positions[(first < positions) & ~is_duplicate & ~is_empty & ~is_empty[first]]
+        similarity = (signatures[candidates] == signatures[first[candidates]]).mean(axis=1)
+        is_duplicate[candidates[similarity >= threshold]] = True
+    return is_duplicate
+
+def find_duplicates(texts: pd.core.series.Series,
+                    mode: str = "exact",
+                    threshold: float = 0.8) -> np.ndarray:
+    """
+    flags the exact duplicates of the normalized content and, in the
+    minhash mode, the near duplicates among the other texts
+
+    Args:
+        texts (pd.core.series.Series): the texts
+        mode (str, optional): "exact" or "minhash". Defaults to "exact".
+        threshold (float, optional): similarity of the minhash mode.
+                                    Defaults to 0.8.
+
+    Returns:
+        np.ndarray: True for the duplicates, the first text of each
+                    group of duplicates is kept
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"unknown dedup mode {mode}, expected one of {DEDUP_MODES}")
+    is_duplicate = exact_duplicates(texts)
+    logger.info("exact dedup: %d of %d rows removed", is_duplicate.sum(), len(texts))
+    if mode == "minhash":
+        kept = np.flatnonzero(~is_duplicate)
+        is_near = near_duplicates(texts.iloc[kept], threshold)
+        logger.info("minhash dedup (threshold %.2f): %d of %d rows removed",
+                    threshold, is_near.sum(), len(kept))
+        is_duplicate[kept[is_near]] = True
+    return is_duplicate
+
+def drop_duplicates(df: pd.core.frame.DataFrame,
+                    mode: str = None,
+                    threshold: float = 0.8) -> pd.core.frame.DataFrame:
+    """
+    drops the reviews whose content is a duplicate of an earlier one,
+    the exact duplicates of the normalized content and, in the minhash
+    mode, the near duplicates
+
+    Args:
+        df (pd.core.frame.DataFrame): reviews split by language
+        mode (str, optional): None, "exact" or "minhash". Defaults to None.
+        threshold (float, optional): similarity of the minhash mode.
+                                    Defaults to 0.8.
+
+    Returns:
+        pd.core.frame.DataFrame: reviews without the duplicates
+    """
+    if mode is None:
+        return df
+    return df[~find_duplicates(df["content"], mode, threshold)].reset_index(drop=True)
+
+class DedupSavings(PipelineHook):
+    """
+    Estimates the time the dedup stage saved to the stages after it,
+    the time of these stages per row times the number of removed rows
+
+    Args:
+        downstream_stages (Sequence[str]): names of the stages after the dedup
+        stage_name (str, optional): name of the dedup stage.
+                                    Defaults to "drop_duplicates".
+    """
+    def __init__(self,
+                downstream_stages: Sequence[str],
+                stage_name: str = "drop_duplicates"):
+        self.downstream_stages = set(downstream_stages)
+        self.stage_name = stage_name
+        self.rows_removed = 0
+        self.rows_kept = 0
+        self.dedup_seconds = 0.0
+        self.downstream_seconds = 0.0
+        self._rows_before = 0
+        self._start = None
+
+    def before_stage(self, stage, state):
+        if stage.name == self.stage_name:
+            self._rows_before = len(state["rating_data"])
+        self._start = time.perf_counter()
+
+    def after_stage(self, stage, state):
+        seconds = time.perf_counter() - self._start
+        if stage.name == self.stage_name:
+            rows_kept = len(state["rating_data"])
+            self.rows_removed += self._rows_before - rows_kept
+            self.rows_kept += rows_kept
+            self.dedup_seconds += seconds
+        elif stage.name in self.downstream_stages:
+            self.downstream_seconds += seconds
+
+    def report(self) -> dict:
+        saved = (self.downstream_seconds * self.rows_removed / self.rows_kept
+                if self.rows_kept else 0.0)
+        return {"rows_removed": self.rows_removed,
+                "dedup_seconds": self.dedup_seconds,
+                "downstream_seconds": self.downstream_seconds,
+                "estimated_saved_seconds": saved}
@@ -0,0 +1,212 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from cleaning.storage import read_reviews
+from typing import Dict, Tuple
+
+# Version of the layout of the features directory
+FEATURES_VERSION = 1
+# Arrays of a features directory and their dtypes, they are raw
+# binary files so they can be appended to and memory mapped
+FEATURE_ARRAYS = {
+    "indptr": np.int64,
+    "indices": np.int32,
+    "data": np.float32,
+    "labels": np.int8,
+}
+META_FILE = "meta.json"
+IDF_FILE = "idf.npy"
+
+class HashingVectorizer:
+    """
+    Counts the word n-grams of the cleaned texts into a fixed number of
+    hashed columns, there is no vocabulary so the memory doesn't grow
+    with the corpus and every batch is vectorized independently
+
+    Args:
+        n_features (int, optional): number of columns. Defaults to 2 ** 20.
+        ngram_range (Tuple[int, int], optional): smallest and largest number
+                                                of words of the n-grams.
+                                                Defaults to (1, 2).
+    """
+    def __init__(self,
+                n_features: int = 2 ** 20,
+                ngram_range: Tuple[int, int] = (1, 2)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+
+    def ngrams(self, text: str) -> list:
+        words = text.split()
+        min_n, max_n = self.ngram_range
+        return [" ".join(words[i:i + n])
+                for n in range(min_n, max_n + 1)
+                for i in range(len(words) - n + 1)]
+
+    def transform(self, texts: pd.core.series.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Args:
+            texts (pd.core.series.Series): cleaned texts, the nulls are empty texts
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: indptr, indices and data
+                                    of the csr matrix of the n-gram counts
+        """
+        ngrams = [self.ngrams(text) for text in texts.fillna("").astype(str).tolist()]
+        counts = np.fromiter((len(text_ngrams) for text_ngrams in ngrams), dtype=np.int64,
+                            count=len(ngrams))
+        hashes = pd.util.hash_array(np.array([ngram for text_ngrams in ngrams
+                                            for ngram in text_ngrams], dtype=object))
+        columns = (hashes % np.uint64(self.n_features)).astype(np.int64)
+        rows = np.repeat(np.arange(len(ngrams), dtype=np.int64), counts)
+        # the repeated n-grams of a text are summed, the keys are sorted
+        # by row then by column like the indices of a csr matrix
+        keys, data = np.unique(rows * self.n_features + columns, return_counts=True)
+        indptr = np.zeros(len(ngrams) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // self.n_features, minlength=len(ngrams)), out=indptr[1:])
+        return indptr, (keys % self.n_features).astype(np.int32), data.astype(np.float32)
+
+class FeatureWriter:
+    """
+    Appends batches of hashed features and their labels to a directory
+    of raw arrays, the document frequencies of the columns are counted
+    along so the idf is written without a second pass
+
+    Args:
+        path (str): directory of the features
+        vectorizer (HashingVectorizer, optional): Defaults to HashingVectorizer().
+        compute_idf (bool, optional): also writes the idf of the columns.
+                                    Defaults to True.
+    """
+    def __init__(self,
+                path: str,
+                vectorizer: HashingVectorizer = None,
+                compute_idf: bool = True):
+        self.path = path
+        self.vectorizer = vectorizer or HashingVectorizer()
+        os.makedirs(path, exist_ok=True)
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "wb")
+                        for name in FEATURE_ARRAYS}
+        self._files["indptr"].write(np.zeros(1, dtype=np.int64).tobytes())
+        self.n_rows = 0
+        self.nnz = 0
+        self.document_frequencies = (np.zeros(self.vectorizer.n_features, dtype=np.int64)
+                                    if compute_idf else None)
+
+    def write(self, texts: pd.core.series.Series, labels: pd.core.series.Series):
+        indptr, indices, data = self.vectorizer.transform(texts)
+        self._files["indptr"].write((indptr[1:] + self.nnz).tobytes())
+        self._files["indices"].write(indices.tobytes())
+        self._files["data"].write(data.tobytes())
+        self._files["labels"].write(labels.to_numpy(dtype=np.int8).tobytes())
+        if self.document_frequencies is not None:
+            # the columns of a row are unique so each row counts once per column
+            self.document_frequencies += np.bincount(indices,
+                                                    minlength=self.vectorizer.n_features)
+        self.n_rows += len(texts)
+        self.nnz += len(indices)
+
+    def close(self):
+        if self._files is None:
+            return
+        for array_file in self._files.values():
+            array_file.close()
+        self._files = None
+        if self.document_frequencies is not None:
+            # smoothed idf, as if a document had all the columns
+            idf = np.log((1 + self.n_rows) / (1 + self.document_frequencies)) + 1
+            np.save(os.path.join(self.path, IDF_FILE), idf.astype(np.float32))
+        meta = {"version": FEATURES_VERSION,
+                "n_rows": self.n_rows,
+                "n_features": self.vectorizer.n_features,
+                "nnz": self.nnz,
+                "ngram_range": list(self.vectorizer.ngram_range),
+                "dtypes": {name: np.dtype(dtype).name for name, dtype in FEATURE_ARRAYS.items()}}
+        with open(os.path.join(self.path, META_FILE), "w") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def vectorize_file(path: str,
+                features_dir: str,
+                file_format: str = None,
+                batch_size: int = 10000,
+                vectorizer: HashingVectorizer = None,
+                compute_idf: bool = True) -> int:
+    """
+    streams the text/label final data through the hashing vectorizer, the
+    rows of the features are the rows of the file in the same order
+
+    Args:
+        path (str): path of the final data
+        features_dir (str): directory of the features
+        file_format (str, optional): "csv" or "parquet".
+                                    Defaults to the extension of the path.
+        batch_size (int, optional): number of texts vectorized at once.
+                                    Defaults to 10000.
+        vectorizer (HashingVectorizer, optional): Defaults to HashingVectorizer().
+        compute_idf (bool, optional): also writes the idf. Defaults to True.
+
+    Returns:
+        int: number of rows written
+    """
+    with FeatureWriter(features_dir, vectorizer, compute_idf) as writer:
+        for chunk in read_reviews(path, ["text", "label"], file_format, chunksize=batch_size):
+            writer.write(chunk["text"], chunk["label"])
+    return writer.n_rows
+
+def load_feature_arrays(path: str) -> Dict[str, np.ndarray]:
+    """
+    memory maps the arrays of a features directory
+
+    Args:
+        path (str): directory written by FeatureWriter
+
+    Returns:
+        Dict[str, np.ndarray]: indptr, indices, data, labels, idf if it
+                            was computed, and the meta data under "meta"
+    """
+    with open(os.path.join(path, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+    if meta.get("version") != FEATURES_VERSION:
+        raise ValueError(f"{path} has version {meta.get('version')} features, "
+                        f"version {FEATURES_VERSION} is expected")
+    arrays = {"meta": meta}
+    for name, dtype in FEATURE_ARRAYS.items():
+        array_path = os.path.join(path, f"{name}.bin")
+        # an empty file can't be memory mapped
+        arrays[name] = (np.memmap(array_path, dtype=dtype, mode="r")
+                        if os.path.getsize(array_path) else np.zeros(0, dtype=dtype))
+    idf_path = os.path.join(path, IDF_FILE)
+    if os.path.exists(idf_path):
+        arrays["idf"] = np.load(idf_path, mmap_mode="r")
+    return arrays
+
+def load_features(path: str, apply_idf: bool = False):
+    """
+    loads the features as a scipy csr matrix, scipy is
+    only needed by the jobs loading the matrix
+
+    Args:
+        path (str): directory written by FeatureWriter
+        apply_idf (bool, optional): multiplies the counts by the idf of
+                                    their column. Defaults to False.
+
+    Returns:
+        the csr matrix backed by the memory mapped arrays
+        (a copy of the data with apply_idf) and the labels
+    """
+    import scipy.sparse
+    arrays = load_feature_arrays(path)
+    data = arrays["data"]
+    if apply_idf:
+        data = data * arrays["idf"][arrays["indices"]]
+    matrix = scipy.sparse.csr_matrix((data, arrays["indices"], arrays["indptr"]),
+                                    shape=(arrays["meta"]["n_rows"],
+                                            arrays["meta"]["n_features"]),
+                                    copy=False)
+    return matrix, arrays["labels"]
@@ -0,0 +1,236 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from typing import Dict, Set, Tuple
+from cleaning.storage import write_frame
+
+STATE_FILE = "_state.json"
+# Hashes of the reviews written to each partition, next to the state
+HASHES_FILE = "_hashes.npz"
+
+# strftime format of the partition names
+PARTITION_FORMATS = {
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m",
+}
+
+def partition_names(dates: pd.core.series.Series,
+                    partition_by: str = "day") -> pd.core.series.Series:
+    """
+    returns the partition of each review from its date
+
+    Args:
+        dates (pd.core.series.Series): tz aware dates of the reviews
+        partition_by (str, optional): "day" or "month". Defaults to "day".
+
+    Returns:
+        pd.core.series.Series: name of the partition of each review
+    """
+    return dates.dt.strftime(PARTITION_FORMATS[partition_by])
+
+def review_fingerprints(rating_df: pd.core.frame.DataFrame) -> np.ndarray:
+    """
+    hashes the id, content and ratings of each review, a change
+    of any of them changes the fingerprint of its partition
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): raw reviews
+
+    Returns:
+        np.ndarray: uint64 hash of each review
+    """
+    return pd.util.hash_pandas_object(rating_df[["id", "content", "ratings"]].astype(str),
+                                        index=False).to_numpy()
+
+def partition_fingerprints(partitions: pd.core.series.Series,
+                            fingerprints: np.ndarray) -> Dict[str, Dict[str, int]]:
+    """
+    fingerprint of the reviews of each partition, the number of reviews
+    and the sum of their hashes so it doesn't depend on the rows order
+
+    Args:
+        partitions (pd.core.series.Series): partition of each review
+        fingerprints (np.ndarray): hash of each review
+
+    Returns:
+        Dict[str, Dict[str, int]]: rows and fingerprint of each partition
+    """
+    grouped = pd.Series(fingerprints, index=partitions.to_numpy()).groupby(level=0)
+    # numpy sums of uint64 wrap around instead of overflowing
+    return {partition: {"rows": len(values),
+                        "fingerprint": int(np.add.reduce(values.to_numpy(dtype=np.uint64)))}
+            for partition, values in grouped}
+
+def load_state(output_dir: str) -> dict:
+    """
+    loads the watermark, the partitions fingerprints and the hashes of
+    the reviews written by the previous runs, an empty state if it is
+    the first run
+
+    Args:
+        output_dir (str): directory of the partitioned output
+
+    Returns:
+        dict: the state
+    """
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"watermark": None, "partitions": {}, "hashes": {}}
+    with open(path) as state_file:
+        state = json.load(state_file)
+    hashes_path = os.path.join(output_dir, HASHES_FILE)
+    state["hashes"] = {}
+    if os.path.exists(hashes_path):
+        with np.load(hashes_path) as hashes:
+            state["hashes"] = {partition: hashes[partition] for partition in hashes.files}
+    return state
+
+def save_state(output_dir: str, state: dict):
+    # the state is replaced atomically so an interrupted
+    # run keeps the previous watermark, the hashes are
+    # replaced first and the json file commits the run
+    os.makedirs(output_dir, exist_ok=True)
+    hashes_path = os.path.join(output_dir, HASHES_FILE)
+    with open(hashes_path + ".tmp", "wb") as hashes_file:
+        np.savez(hashes_file, **state.get("hashes", {}))
+    os.replace(hashes_path + ".tmp", hashes_path)
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as state_file:
+        json.dump({key: value for key, value in state.items() if key != "hashes"},
+                state_file, indent=2)
+    os.replace(path + ".tmp", path)
+
+def plan_incremental_run(rating_df: pd.core.frame.DataFrame,
+                        state: dict,
+                        partition_by: str = "day",
+                        date_col_name: str = "date",
+                        date_format: str = "%Y-%m-%dT%H:%M:%S%z",
+                        delete_missing: bool = False) -> Tuple[pd.core.series.Series,
+                                                                Set[str], dict]:
+    """
+    selects the reviews to process. The reviews after the watermark
+    (date then id) are appended to their partition. The reviews up to
+    the watermark of a partition whose fingerprint changed since the
+    last run are late arriving, edited or deleted reviews. The partition
+    is rewritten from all its reviews when the input holds at least as
+    many of them as the previous runs wrote, otherwise the input only
+    holds a delta and its reviews that weren't written yet are appended
+    like the new ones. The partitions absent from the input are kept
+    unless delete_missing
+
+    Args:
+        rating_df (pd.core.frame.DataFrame): raw reviews
+        state (dict): state of the previous run
+        partition_by (str, optional): "day" or "month". Defaults to "day".
+        date_col_name (str, optional): name of the date column. Defaults to "date".
+        date_format (str, optional): format of the dates.
+                                    Defaults to "%Y-%m-%dT%H:%M:%S%z".
+        delete_missing (bool, optional): deletes the partitions of the previous
+                                        runs absent from the input, for inputs
+                                        holding all the reviews. Defaults to False.
+
+    Returns:
+        Tuple[pd.core.series.Series, Set[str], dict]: mask of the reviews to process,
+                                    partitions to rewrite and state after the run
+    """
+    dates = rating_df[date_col_name]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format=date_format)
+    dates = pd.to_datetime(dates, utc=True)
+    partitions = partition_names(dates, partition_by)
+    fingerprints = review_fingerprints(rating_df)
+    watermark = state.get("watermark")
+    if watermark:
+        watermark_date = pd.Timestamp(watermark["date"])
+        is_new = (dates > watermark_date) | ((dates == watermark_date)
+                                            & (rating_df["id"] > watermark["id"]))
+    else:
+        is_new = pd.Series(True, index=rating_df.index)
+    # Partitions of the input whose already processed reviews don't match the last run
+    previous_partitions = state.get("partitions", {})
+    processed_partitions = partition_fingerprints(partitions[~is_new],
+                                                fingerprints[~is_new.to_numpy()])
+    changed = {partition for partition in processed_partitions
+                if previous_partitions.get(partition) != processed_partitions[partition]}
+    # Only the partitions whose reviews are all in the input can be rewritten,
+    # a delta of late reviews is appended so the written reviews are kept
+    rewrite = {partition for partition in changed
+                if delete_missing or processed_partitions[partition]["rows"]
+                >= previous_partitions.get(partition, {"rows": 0})["rows"]}
+    # Partitions of the previous runs without any of their reviews in the input
+    if delete_missing:
+        rewrite |= set(previous_partitions) - set(processed_partitions)
+    previous_hashes = state.get("hashes", {})
+    empty_hashes = np.zeros(0, dtype=np.uint64)
+    is_late = np.zeros(len(rating_df), dtype=bool)
+    for partition in changed - rewrite:
+        # the reviews of the delta already written by a previous run are skipped
+        in_partition = (~is_new & (partitions == partition)).to_numpy()
+        is_late[in_partition] = ~np.isin(fingerprints[in_partition],
+                                        previous_hashes.get(partition, empty_hashes))
+    to_process = is_new | partitions.isin(rewrite) | is_late
+    # The fingerprints of the appended partitions keep the reviews of the
+    # previous runs, the rewritten ones only have the input reviews
+    new_partitions = {partition: fingerprint for partition, fingerprint in previous_partitions.items()
+                    if partition not in rewrite}
+    new_hashes = {partition: hashes for partition, hashes in previous_hashes.items()
+                if partition not in rewrite}
+    written_partitions = partitions[to_process].to_numpy()
+    written_hashes = fingerprints[to_process.to_numpy()]
+    written = partition_fingerprints(partitions[to_process], written_hashes)
+    for partition, fingerprint in written.items():
+        if partition in new_partitions:
+            previous = new_partitions[partition]
+            fingerprint = {
+                "rows": previous["rows"] + fingerprint["rows"],
+                "fingerprint": int(np.add.reduce(np.array([previous["fingerprint"],
+                                                           fingerprint["fingerprint"]],
+                                                          dtype=np.uint64)))}
+        new_partitions[partition] = fingerprint
+        new_hashes[partition] = np.concatenate([new_hashes.get(partition, empty_hashes),
+                                                written_hashes[written_partitions == partition]])
+    new_state = {"partition_by": partition_by,
+                "watermark": state.get("watermark"),
+                "partitions": new_partitions,
+                "hashes": new_hashes}
+    if len(rating_df):
+        last = pd.DataFrame({"date": dates, "id": rating_df["id"]}).sort_values(["date", "id"]).iloc[-1]
+        # an input of older reviews doesn't move the watermark back
+        if not watermark or (last["date"], last["id"]) > (watermark_date, watermark["id"]):
+            new_state["watermark"] = {"date": last["date"].isoformat(),
+                                    "id": last["id"].item() if hasattr(last["id"], "item")
+                                    else last["id"]}
+    return to_process, rewrite, new_state
+
+def write_partitions(output_dir: str,
+                    final_data: pd.core.frame.DataFrame,
+                    partitions: pd.core.series.Series,
+                    rewrite: Set[str],
+                    partition_by: str = "day",
+                    file_format: str = "csv"):
+    """
+    writes the processed reviews in their partitions, the rewritten
+    partitions are replaced and the new reviews of the other partitions
+    are appended as a new part file
+
+    Args:
+        output_dir (str): directory of the partitioned output
+        final_data (pd.core.frame.DataFrame): processed reviews
+        partitions (pd.core.series.Series): partition of each processed review
+        rewrite (Set[str]): partitions to replace
+        partition_by (str, optional): "day" or "month". Defaults to "day".
+        file_format (str, optional): "csv" or "parquet". Defaults to "csv".
+    """
+    for partition in rewrite:
+        partition_dir = os.path.join(output_dir, f"{partition_by}={partition}")
+        if os.path.isdir(partition_dir):
+            shutil.rmtree(partition_dir)
+    for partition, partition_data in final_data.groupby(partitions.to_numpy(), sort=True):
+        partition_dir = os.path.join(output_dir, f"{partition_by}={partition}")
+        os.makedirs(partition_dir, exist_ok=True)
+        n_parts = sum(name.startswith("part-") for name in os.listdir(partition_dir))
+        write_frame(partition_data,
+                    os.path.join(partition_dir, f"part-{n_parts:05d}.{file_format}"),
+                    file_format)
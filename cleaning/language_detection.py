@@ -0,0 +1,141 @@
+import logging
+import re
+import numpy as np
+import pandas as pd
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+# Separator of the texts in the utf-8 buffer
+TEXT_SEPARATOR = "\x00"
+# Lead bytes of the utf-8 encoding of the arabic block U+0600-U+06FF
+ARABIC_LEAD_BYTES = (0xD8, 0xDB)
+# Lead bytes of the latin-1 supplement and latin extended-a letters (é, ç, œ ...)
+LATIN_LEAD_BYTES = (0xC3, 0xC5)
+# The same characters for the single texts
+ARABIC_SCRIPT_PATTERN = re.compile("[\u0600-\u06FF]")
+LATIN_SCRIPT_PATTERN = re.compile("[A-Za-z\u00C0-\u017F]")
+
+def _utf8_buffer(texts: pd.core.series.Series) -> Tuple[np.ndarray, np.ndarray]:
+    # encodes all the texts at once into one buffer where each text
+    # is followed by a separator, returns it with the start of the texts
+    values = texts.fillna("").astype(str).tolist()
+    joined = TEXT_SEPARATOR.join(values) + TEXT_SEPARATOR
+    if joined.count(TEXT_SEPARATOR) != len(values):
+        joined = TEXT_SEPARATOR.join(value.replace(TEXT_SEPARATOR, "")
+                                    for value in values) + TEXT_SEPARATOR
+    buffer = np.frombuffer(joined.encode("utf-8"), dtype=np.uint8)
+    starts = np.concatenate([[0], np.flatnonzero(buffer == 0)[:-1] + 1])
+    return buffer, starts
+
+def script_counts(texts: pd.core.series.Series) -> pd.core.frame.DataFrame:
+    """
+    counts the arabic and latin characters of each text in one vectorized
+    pass over the utf-8 bytes of all the texts, the arabic characters are
+    the ones of the arabic block and the latin ones the ascii letters
+    and the accented latin letters
+
+    Args:
+        texts (pd.core.series.Series): the texts
+
+    Returns:
+        pd.core.frame.DataFrame: arabic and latin columns with the same index
+    """
+    if len(texts) == 0:
+        return pd.DataFrame({"arabic": [], "latin": []}, index=texts.index, dtype=np.int64)
+    buffer, starts = _utf8_buffer(texts)
+    is_arabic = (buffer >= ARABIC_LEAD_BYTES[0]) & (buffer <= ARABIC_LEAD_BYTES[1])
+    lower = buffer | 0x20
+    is_latin = (((lower >= ord("a")) & (lower <= ord("z")))
+                | ((buffer >= LATIN_LEAD_BYTES[0]) & (buffer <= LATIN_LEAD_BYTES[1])))
+    # every text ends with a separator which is neither arabic nor
+    # latin, so the empty texts count the separator alone
+    return pd.DataFrame({"arabic": np.add.reduceat(is_arabic, starts, dtype=np.int64),
+                        "latin": np.add.reduceat(is_latin, starts, dtype=np.int64)},
+                        index=texts.index)
+
+def detect_script(texts: pd.core.series.Series,
+                  fallback: pd.core.series.Series = None,
+                  min_arabic_share: float = 0.5) -> pd.core.series.Series:
+    """
+    labels the texts "ara" when the share of arabic characters among the
+    arabic and latin ones is above min_arabic_share, "eng" otherwise
+
+    Args:
+        texts (pd.core.series.Series): the texts
+        fallback (pd.core.series.Series, optional): labels of the texts without
+                                    any arabic or latin character, None if
+                                    not given. Defaults to None.
+        min_arabic_share (float, optional): Defaults to 0.5.
+
+    Returns:
+        pd.core.series.Series: "ara" or "eng" for each text
+    """
+    counts = script_counts(texts)
+    letters = counts["arabic"] + counts["latin"]
+    detected = pd.Series(np.where(counts["arabic"] > min_arabic_share * letters,
+                                  "ara", "eng"),
+                         index=texts.index, dtype=object)
+    if fallback is None:
+        return detected.where(letters > 0, None)
+    return detected.where(letters > 0, fallback.astype(object))
+
+def detect_text_script(text: str,
+                       fallback: str = None,
+                       min_arabic_share: float = 0.5) -> str:
+    """
+    detect_script for one text, for the online cleaning
+
+    Args:
+        text (str): the text
+        fallback (str, optional): label of the text without any arabic
+                                or latin character. Defaults to None.
+        min_arabic_share (float, optional): Defaults to 0.5.
+
+    Returns:
+        str: "ara" or "eng"
+    """
+    arabic = len(ARABIC_SCRIPT_PATTERN.findall(text))
+    letters = arabic + len(LATIN_SCRIPT_PATTERN.findall(text))
+    if letters == 0:
+        return fallback
+    return "ara" if arabic > min_arabic_share * letters else "eng"
+
+def confusion_matrix(labels: pd.core.series.Series,
+                     detected: pd.core.series.Series) -> pd.core.frame.DataFrame:
+    """
+    Args:
+        labels (pd.core.series.Series): languages of the language column
+        detected (pd.core.series.Series): output of detect_script
+
+    Returns:
+        pd.core.frame.DataFrame: number of rows of each language (rows)
+                                detected as each language (columns)
+    """
+    return pd.crosstab(labels.astype(object).rename("language"),
+                       detected.rename("detected"), dropna=False)
+
+def route_by_script(df: pd.core.frame.DataFrame,
+                    detect: bool = False) -> pd.core.frame.DataFrame:
+    """
+    replaces the language column by the script of the content so each
+    review goes to the text stages of its actual language, the
+    mislabelled reviews are logged with a confusion matrix
+
+    Args:
+        df (pd.core.frame.DataFrame): reviews split by language
+        detect (bool, optional): keeps the language column if False.
+                                Defaults to False.
+
+    Returns:
+        pd.core.frame.DataFrame: reviews with the detected languages
+    """
+    if not detect:
+        return df
+    detected = detect_script(df["content"], fallback=df["language"])
+    logger.info("language column against the detected script:\n%s",
+                confusion_matrix(df["language"], detected).to_string())
+    if isinstance(df["language"].dtype, pd.CategoricalDtype):
+        detected = pd.Categorical(detected, categories=df["language"].cat.categories)
+    df["language"] = detected
+    return df
@@ -0,0 +1,210 @@
+import pandas as pd
+from typing import Any, Callable, Dict, Sequence
+
+# State key of the reviews frame, its dependencies are tracked by columns
+ROWS_KEY = "rating_data"
+
+class Stage:
+    """
+    A step of the cleaning pipeline. The stages share a state dict, a
+    stage calls its function with the state values named by its inputs
+    followed by its constant args and stores the result under its outputs
+
+    Args:
+        name (str): name of the stage in the reports
+        func (Callable): function of the stage
+        inputs (Sequence[str]): state keys passed to the function
+        outputs (Sequence[str], optional): state keys of the returned values,
+                                    a tuple is returned when there are several.
+                                    Defaults to ().
+        args (Sequence[Any], optional): constants passed after the inputs.
+                                    Defaults to ().
+        filters_rows (bool, optional): the stage drops rows, the dropped
+                                    rows are reported. Defaults to False.
+        rows_in (Callable[[pd.core.frame.DataFrame], int], optional): counts the
+                                    rows of the first input the stage works on.
+                                    Defaults to the length of the first input.
+        reads (Sequence[str], optional): columns of the reviews the stage
+                                    reads. Defaults to ().
+        writes (Sequence[str], optional): columns of the reviews the stage
+                                    adds, changes or drops. Defaults to ().
+        changes_rows (bool, optional): the stage drops or adds reviews so it is
+                                    never pruned. Defaults to filters_rows.
+        always_run (bool, optional): never pruned, for the stages working on
+                                    all the columns. Defaults to False.
+    """
+    def __init__(self,
+                name: str,
+                func: Callable,
+                inputs: Sequence[str],
+                outputs: Sequence[str] = (),
+                args: Sequence[Any] = (),
+                filters_rows: bool = False,
+                rows_in: Callable[[pd.core.frame.DataFrame], int] = None,
+                reads: Sequence[str] = (),
+                writes: Sequence[str] = (),
+                changes_rows: bool = None,
+                always_run: bool = False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.args = tuple(args)
+        self.filters_rows = filters_rows
+        self.rows_in = rows_in
+        self.reads = tuple(reads)
+        self.writes = tuple(writes)
+        self.changes_rows = filters_rows if changes_rows is None else changes_rows
+        self.always_run = always_run
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r})"
+
+    def run(self, state: Dict[str, Any]):
+        result = self.func(*[state[key] for key in self.inputs], *self.args)
+        if len(self.outputs) == 1:
+            state[self.outputs[0]] = result
+        elif self.outputs:
+            state.update(zip(self.outputs, result))
+
+    def count_rows_in(self, state: Dict[str, Any]) -> int:
+        # number of rows the stage works on, None if its input isn't a dataframe
+        if not self.inputs or not isinstance(state.get(self.inputs[0]), pd.DataFrame):
+            return None
+        if self.rows_in is not None:
+            return int(self.rows_in(state[self.inputs[0]]))
+        return len(state[self.inputs[0]])
+
+    def count_rows_out(self, state: Dict[str, Any]) -> int:
+        if not self.outputs or not isinstance(state.get(self.outputs[0]), pd.DataFrame):
+            return None
+        return len(state[self.outputs[0]])
+
+class PipelineHook:
+    """
+    Interface of the objects notified around each stage of run_stages,
+    the methods do nothing by default
+    """
+    def before_stage(self, stage: Stage, state: Dict[str, Any]):
+        pass
+
+    def after_stage(self, stage: Stage, state: Dict[str, Any]):
+        pass
+
+class Plan:
+    """
+    Stages of a pipeline kept by plan_stages for the requested outputs
+
+    Args:
+        all_stages (Sequence[Stage]): all the declared stages in order
+        pruned_names (Sequence[str]): names of the stages that are not needed
+        needed_columns (Sequence[str]): columns of the reviews read by the
+                                        kept stages or requested
+    """
+    def __init__(self,
+                all_stages: Sequence[Stage],
+                pruned_names: Sequence[str],
+                needed_columns: Sequence[str]):
+        self.all_stages = list(all_stages)
+        self.pruned_names = set(pruned_names)
+        self.needed_columns = sorted(needed_columns)
+        self.stages = [stage for stage in self.all_stages
+                        if stage.name not in self.pruned_names]
+        self.pruned = [stage for stage in self.all_stages
+                        if stage.name in self.pruned_names]
+
+    def saved_seconds(self, stage_seconds: Dict[str, float]) -> float:
+        # None if the profile doesn't have the time of all the pruned stages,
+        # the profiles of the pruned runs never have it
+        if any(stage.name not in stage_seconds for stage in self.pruned):
+            return None
+        return sum(stage_seconds[stage.name] for stage in self.pruned)
+
+    def describe(self, stage_seconds: Dict[str, float] = None) -> str:
+        """
+        Args:
+            stage_seconds (Dict[str, float], optional): time of each stage in a
+                                        previous run of all the stages, the
+                                        saved work is then estimated in seconds,
+                                        it is unknown if the run pruned stages.
+                                        Defaults to None.
+
+        Returns:
+            str: one line per stage then the estimated saved work
+        """
+        lines = []
+        for stage in self.all_stages:
+            status = "pruned" if stage.name in self.pruned_names else "run"
+            seconds = ""
+            if stage_seconds is not None and stage.name in stage_seconds:
+                seconds = f"{stage_seconds[stage.name]:10.3f} s"
+            lines.append(f"{status:<7}{stage.name:<32}{seconds}".rstrip())
+        lines.append(f"{len(self.pruned)} of {len(self.all_stages)} stages pruned")
+        if stage_seconds:
+            saved = self.saved_seconds(stage_seconds)
+            if saved is None:
+                missing = [stage.name for stage in self.pruned if stage.name not in stage_seconds]
+                lines.append("estimated saved work: unknown, the profile has no time for "
+                            + ", ".join(missing) + ", it needs a run of all the stages")
+            else:
+                total = sum(stage_seconds.get(stage.name, 0.0) for stage in self.all_stages)
+                lines.append(f"estimated saved work: {saved:.3f} s of {total:.3f} s "
+                            f"({100 * saved / total if total else 0:.1f}%)")
+        lines.append("needed columns: " + ", ".join(self.needed_columns))
+        return "\n".join(lines)
+
+def plan_stages(stages: Sequence[Stage],
+                output_columns: Sequence[str],
+                output_keys: Sequence[str] = ()) -> Plan:
+    """
+    keeps only the stages the requested outputs depend on. The stages are
+    walked backwards, a stage is kept when it writes a needed column,
+    outputs a needed state entry, changes the rows or always runs, and
+    the columns and entries it reads are then needed by the earlier stages.
+    The reviews frame is tracked by its columns, the other entries as a whole
+
+    Args:
+        stages (Sequence[Stage]): the declared stages
+        output_columns (Sequence[str]): columns of the reviews that are used
+        output_keys (Sequence[str], optional): state entries that are used.
+                                            Defaults to ().
+
+    Returns:
+        Plan: the kept and the pruned stages
+    """
+    needed_columns = set(output_columns)
+    needed_keys = set(output_keys)
+    pruned_names = []
+    for stage in reversed(stages):
+        outputs = set(stage.outputs) - {ROWS_KEY}
+        if (stage.always_run or stage.changes_rows
+                or needed_columns.intersection(stage.writes)
+                or needed_keys.intersection(outputs)):
+            needed_columns.update(stage.reads)
+            needed_keys.update(set(stage.inputs) - {ROWS_KEY})
+        else:
+            pruned_names.append(stage.name)
+    return Plan(stages, pruned_names, needed_columns)
+
+def run_stages(stages: Sequence[Stage],
+                state: Dict[str, Any],
+                hooks: Sequence[PipelineHook] = ()) -> Dict[str, Any]:
+    """
+    runs the stages in order on the state
+
+    Args:
+        stages (Sequence[Stage]): the declared stages
+        state (Dict[str, Any]): inputs and configuration of the stages
+        hooks (Sequence[PipelineHook], optional): hooks notified around
+                                                each stage. Defaults to ().
+
+    Returns:
+        Dict[str, Any]: the state with the outputs of all the stages
+    """
+    for stage in stages:
+        for hook in hooks:
+            hook.before_stage(stage, state)
+        stage.run(state)
+        for hook in reversed(hooks):
+            hook.after_stage(stage, state)
+    return state
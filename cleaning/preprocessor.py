@@ -0,0 +1,137 @@
+from typing import Iterable, List, Tuple
+from cleaning.language_detection import detect_text_script
+from cleaning.text_processing import (ARABIC_DIGITS_PATTERN,
+                                    ARABIC_NON_LETTERS_PATTERN,
+                                    ARABIC_START_PATTERN,
+                                    ArabicTokenNormalizer,
+                                    ContractionExpander,
+                                    get_ara_stopwords,
+                                    get_contraction_expander,
+                                    get_eng_stopwords,
+                                    get_normalizer,
+                                    get_punctuations,
+                                    split_translated_text,
+                                    to_stop_word_index)
+
+class Preprocessor:
+    """
+    Cleans single reviews or small batches of plain strings for the
+    online scoring, without any dataframe. The stop words, contractions,
+    punctuations and patterns are loaded once and the cleaning is made of
+    the same steps as the batch pipeline so the texts are identical to
+    the ones of run_pipeline
+
+    Args:
+        punctuations (str, optional): punctuations removed from the arabic
+                                    texts. Defaults to get_punctuations().
+        arab_stop_words (Iterable[str], optional): arabic stop words.
+                                                Defaults to get_ara_stopwords().
+        eng_stop_words (Iterable[str], optional): english stop words.
+                                                Defaults to get_eng_stopwords().
+        contraction_expander (ContractionExpander, optional): contractions expander.
+                                                Defaults to get_contraction_expander().
+        detect_language (bool, optional): routes the texts by their script like
+                                        run_pipeline with detect_language.
+                                        Defaults to False.
+        arabic_normalizer (ArabicTokenNormalizer, optional): normalizer of the
+                                        arabic tokens, with the light stemming
+                                        if it is on. Defaults to a normalizer of
+                                        punctuations and arab_stop_words.
+    """
+    def __init__(self,
+                punctuations: str = None,
+                arab_stop_words: Iterable[str] = None,
+                eng_stop_words: Iterable[str] = None,
+                contraction_expander: ContractionExpander = None,
+                detect_language: bool = False,
+                arabic_normalizer: ArabicTokenNormalizer = None):
+        if punctuations is None:
+            punctuations = get_punctuations()
+        if arab_stop_words is None:
+            arab_stop_words = get_ara_stopwords()
+        if eng_stop_words is None:
+            eng_stop_words = get_eng_stopwords()
+        if contraction_expander is None:
+            contraction_expander = get_contraction_expander()
+        if arabic_normalizer is None:
+            arabic_normalizer = ArabicTokenNormalizer(punctuations, arab_stop_words)
+        self.normalizer = get_normalizer(punctuations)
+        self.arabic_normalizer = arabic_normalizer
+        self.eng_stop_words = to_stop_word_index(eng_stop_words)
+        self.contraction_expander = contraction_expander
+        self.detect_language = detect_language
+
+    @classmethod
+    def from_resources(cls, resources: dict, detect_language: bool = False) -> "Preprocessor":
+        # resources as returned by load_resources in main.py
+        return cls(resources["punctuations"], resources["arab_stop_words"],
+                    resources["eng_stop_words"], resources["contraction_expander"],
+                    detect_language, resources["arabic_normalizer"])
+
+    def clean_english(self, text: str) -> str:
+        text = self.normalizer.clean_text(text)
+        text = self.contraction_expander.expand(text)
+        return self.eng_stop_words.remove_from(text)
+
+    def clean_arabic(self, text: str) -> str:
+        # returns None for the texts the batch pipeline drops
+        text = self.normalizer.clean_text(text)
+        if self.detect_language:
+            # same cleaning as the batch pipeline for the reviews routed by their script
+            return self.arabic_normalizer.preprocess_letters(text) or None
+        text = self.arabic_normalizer.preprocess(text)
+        text = ARABIC_NON_LETTERS_PATTERN.sub('', text)
+        text = ARABIC_DIGITS_PATTERN.sub('', text)
+        if not ARABIC_START_PATTERN.search(text):
+            return None
+        return text
+
+    def clean(self, text: str, language: str) -> List[Tuple[str, str]]:
+        """
+        cleans one review. A review translated by Google gives
+        an arabic and an english text like in the batch pipeline,
+        the reviews dropped by the pipeline give no text
+
+        Args:
+            text (str): raw content of the review
+            language (str): language of the review ("ara" or "eng")
+
+        Returns:
+            List[Tuple[str, str]]: language and cleaned text of
+                                each row the pipeline outputs
+        """
+        if not isinstance(text, str):
+            return []
+        translated = split_translated_text(text)
+        if translated is not None:
+            arabic_text, english_text = translated
+            texts = [("ara", arabic_text), ("eng", english_text)]
+        else:
+            texts = [(language, text)]
+        rows = []
+        for text_language, text in texts:
+            if self.detect_language:
+                text_language = detect_text_script(text, text_language)
+            if text_language == "eng":
+                rows.append(("eng", self.clean_english(text)))
+            elif text_language == "ara":
+                arabic_text = self.clean_arabic(text)
+                if arabic_text is not None:
+                    rows.append(("ara", arabic_text))
+        return rows
+
+    def clean_batch(self,
+                    texts: Iterable[str],
+                    languages: Iterable[str]) -> List[List[Tuple[str, str]]]:
+        """
+        cleans a micro batch of reviews
+
+        Args:
+            texts (Iterable[str]): raw contents of the reviews
+            languages (Iterable[str]): languages of the reviews
+
+        Returns:
+            List[List[Tuple[str, str]]]: output of clean for each review
+        """
+        clean = self.clean
+        return [clean(text, language) for text, language in zip(texts, languages)]
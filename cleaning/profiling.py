@@ -0,0 +1,208 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List
+from cleaning.pipeline import PipelineHook, Stage
+
+# Directory of the repository, the sampling profiler only
+# reports the functions defined under it
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def current_rss_bytes() -> int:
+    """
+    returns the resident memory of the process, from /proc on linux
+    and the peak resident memory on the other systems
+
+    Returns:
+        int: resident memory in bytes
+    """
+    try:
+        with open("/proc/self/statm") as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux and bytes on macos
+        return peak if sys.platform == "darwin" else peak * 1024
+
+class StageProfiler(PipelineHook):
+    """
+    Hook recording the wall time, cpu time, rows in and out, rows dropped
+    and resident memory delta of each stage. A stage run several times
+    (chunked mode) has its metrics summed and its largest memory delta kept.
+    The cpu time is the one of the main process, the text stages run with
+    several workers spend theirs in the worker processes
+    """
+    def __init__(self):
+        self.metrics = {}
+        self._starts = []
+
+    def before_stage(self, stage: Stage, state: Dict[str, Any]):
+        self._starts.append((time.perf_counter(), time.process_time(),
+                            current_rss_bytes(), stage.count_rows_in(state)))
+
+    def after_stage(self, stage: Stage, state: Dict[str, Any]):
+        wall_start, cpu_start, rss_start, rows_in = self._starts.pop()
+        rows_out = stage.count_rows_out(state)
+        metrics = self.metrics.setdefault(stage.name, {"calls": 0,
+                                                    "wall_seconds": 0.0,
+                                                    "cpu_seconds": 0.0,
+                                                    "rows_in": 0,
+                                                    "rows_out": 0,
+                                                    "rows_dropped": 0,
+                                                    "memory_delta_bytes": None})
+        metrics["calls"] += 1
+        metrics["wall_seconds"] += time.perf_counter() - wall_start
+        metrics["cpu_seconds"] += time.process_time() - cpu_start
+        metrics["rows_in"] += rows_in or 0
+        metrics["rows_out"] += rows_out or 0
+        if stage.filters_rows and rows_in is not None and rows_out is not None:
+            metrics["rows_dropped"] += rows_in - rows_out
+        memory_delta = current_rss_bytes() - rss_start
+        if metrics["memory_delta_bytes"] is None or memory_delta > metrics["memory_delta_bytes"]:
+            metrics["memory_delta_bytes"] = memory_delta
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        # metrics of the stages in their running order
+        return {name: dict(metrics) for name, metrics in self.metrics.items()}
+
+    def to_prometheus(self, prefix: str = "cleaning_stage") -> str:
+        """
+        formats the metrics in the prometheus text exposition format
+
+        Args:
+            prefix (str, optional): prefix of the metric names.
+                                    Defaults to "cleaning_stage".
+
+        Returns:
+            str: the metrics
+        """
+        metric_types = [
+            ("calls", "calls_total", "counter", "Runs of the stage"),
+            ("wall_seconds", "wall_seconds_total", "counter", "Wall time of the stage"),
+            ("cpu_seconds", "cpu_seconds_total", "counter", "CPU time of the stage in the main process"),
+            ("rows_in", "rows_in_total", "counter", "Rows the stage worked on"),
+            ("rows_out", "rows_out_total", "counter", "Rows output by the stage"),
+            ("rows_dropped", "rows_dropped_total", "counter", "Rows dropped by the stage"),
+            ("memory_delta_bytes", "memory_delta_bytes", "gauge",
+            "Largest resident memory delta of a run of the stage"),
+        ]
+        lines = []
+        for key, name, metric_type, help_text in metric_types:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for stage_name, metrics in self.metrics.items():
+                label = stage_name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{prefix}_{name}{{stage="{label}"}} {metrics[key]}')
+        return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """
+    Opt-in statistical profiler attributing the time of the main thread
+    to the functions of the repository (clean_text, preprocess,
+    expand_contractions ...). A background thread samples the stack every
+    interval seconds, a sample counts as self time for the innermost
+    function of the repository and as total time for every function of
+    the repository on the stack. The worker processes aren't sampled
+
+    Args:
+        interval (float, optional): seconds between two samples. Defaults to 0.005.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.self_samples = Counter()
+        self.total_samples = Counter()
+        self.n_samples = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._target_id = None
+        self._elapsed = 0.0
+
+    def start(self):
+        self._target_id = threading.get_ident()
+        self._stop.clear()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._elapsed += time.perf_counter() - self._started_at
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_id)
+            functions = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(REPO_DIR):
+                    module = os.path.splitext(os.path.relpath(code.co_filename, REPO_DIR))[0]
+                    name = getattr(code, "co_qualname", code.co_name)
+                    functions.append(f"{module.replace(os.sep, '.')}:{name}")
+                frame = frame.f_back
+            self.n_samples += 1
+            if functions:
+                self.self_samples[functions[0]] += 1
+                self.total_samples.update(set(functions))
+
+    def report(self, top: int = 30) -> List[Dict[str, Any]]:
+        """
+        returns the functions with the most self time, the times
+        are estimated from the share of samples of each function
+
+        Args:
+            top (int, optional): number of functions. Defaults to 30.
+
+        Returns:
+            List[Dict[str, Any]]: function, samples, self and total seconds
+        """
+        seconds_per_sample = self._elapsed / self.n_samples if self.n_samples else 0.0
+        return [{"function": function,
+                "samples": samples,
+                "self_seconds": samples * seconds_per_sample,
+                "total_seconds": self.total_samples[function] * seconds_per_sample}
+                for function, samples in self.self_samples.most_common(top)]
+
+def write_report(path: str,
+                profiler: StageProfiler,
+                sampler: SamplingProfiler = None):
+    """
+    writes the stages metrics, and the sampled functions if any, as json
+
+    Args:
+        path (str): path of the report
+        profiler (StageProfiler): the stages profiler
+        sampler (SamplingProfiler, optional): the sampling profiler. Defaults to None.
+    """
+    report = {"stages": profiler.report()}
+    if sampler is not None:
+        report["functions"] = sampler.report()
+    with open(path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+def read_stage_seconds(path: str) -> Dict[str, float]:
+    """
+    reads the wall time of each stage from a report of write_report
+
+    Args:
+        path (str): path of the report
+
+    Returns:
+        Dict[str, float]: wall seconds of each stage
+    """
+    with open(path) as report_file:
+        report = json.load(report_file)
+    return {name: metrics["wall_seconds"] for name, metrics in report["stages"].items()}
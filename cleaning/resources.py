@@ -0,0 +1,164 @@
+import argparse
+import functools
+import gzip
+import json
+import os
+from typing import Dict, List, Sequence
+
+# Version of the bundle format
+BUNDLE_VERSION = 1
+# Stop words of the pipeline, the runs never go to the network so the
+# bundle has to be built once where the nltk stopwords corpus can be
+# downloaded, with python -m cleaning.resources build, then copied to
+# this path or to the path of CLEANING_RESOURCES_BUNDLE. Without a
+# bundle the stop words are read from a locally installed nltk corpus
+DEFAULT_BUNDLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "data", "stopwords.json.gz")
+# Environment variable overriding the path of the bundle
+BUNDLE_PATH_VARIABLE = "CLEANING_RESOURCES_BUNDLE"
+LANGUAGES = ["english", "arabic"]
+MISSING_STOPWORDS_MESSAGE = ("no stop words bundle at {path} and no local nltk stopwords "
+                            "corpus, build the bundle where the corpus can be downloaded "
+                            "with python -m cleaning.resources build, then copy it to "
+                            f"{DEFAULT_BUNDLE_PATH} or set {BUNDLE_PATH_VARIABLE} to its path")
+
+def get_bundle_path() -> str:
+    return os.environ.get(BUNDLE_PATH_VARIABLE, DEFAULT_BUNDLE_PATH)
+
+@functools.lru_cache(maxsize=4)
+def load_bundle(path: str) -> Dict[str, List[str]]:
+    """
+    loads the stop words of a bundle, it is read once per process
+
+    Args:
+        path (str): path of the bundle
+
+    Returns:
+        Dict[str, List[str]]: stop words of each language, None if
+                            there is no bundle at this path
+    """
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as bundle_file:
+        bundle = json.load(bundle_file)
+    if bundle.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"{path} is a version {bundle.get('version')} bundle, "
+                        f"version {BUNDLE_VERSION} is expected")
+    return bundle["stopwords"]
+
+def nltk_stopwords(language: str, download: bool = False) -> List[str]:
+    """
+    returns the stop words of the nltk corpus, nltk is only
+    imported when there is no bundle
+
+    Args:
+        language (str): "english" or "arabic"
+        download (bool, optional): downloads the corpus if it isn't installed,
+                                only when building the bundle. Defaults to False.
+
+    Returns:
+        List[str]: the stop words
+    """
+    missing_message = MISSING_STOPWORDS_MESSAGE.format(path=get_bundle_path())
+    try:
+        import nltk
+        from nltk.corpus import stopwords
+    except ImportError:
+        raise LookupError(missing_message)
+    try:
+        return stopwords.words(language)
+    except LookupError:
+        if not download or not nltk.download("stopwords", quiet=True):
+            raise LookupError(missing_message)
+        return stopwords.words(language)
+
+def load_stopwords(language: str) -> List[str]:
+    """
+    returns the stop words of a language from the bundle, from the
+    installed nltk corpus if there is no bundle, a LookupError
+    pointing to the build of the bundle is raised without both
+
+    Args:
+        language (str): "english" or "arabic"
+
+    Returns:
+        List[str]: the stop words
+    """
+    bundle = load_bundle(get_bundle_path())
+    if bundle is not None:
+        return bundle[language]
+    return nltk_stopwords(language)
+
+def build_bundle(path: str = DEFAULT_BUNDLE_PATH,
+                languages: Sequence[str] = LANGUAGES):
+    """
+    writes the nltk stop words of the languages to a bundle
+
+    Args:
+        path (str, optional): path of the bundle. Defaults to DEFAULT_BUNDLE_PATH.
+        languages (Sequence[str], optional): languages of the stop words.
+                                            Defaults to LANGUAGES.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    bundle = {"version": BUNDLE_VERSION,
+            "stopwords": {language: nltk_stopwords(language, download=True)
+                        for language in languages}}
+    # mtime=0 so the same stop words always give the same file
+    with open(path, "wb") as raw_file, \
+        gzip.GzipFile(fileobj=raw_file, mode="wb", mtime=0) as bundle_file:
+        bundle_file.write(json.dumps(bundle, ensure_ascii=False).encode("utf-8"))
+    load_bundle.cache_clear()
+
+def build_token_frequencies(input_path: str,
+                            output_path: str,
+                            top: int = 100000) -> int:
+    """
+    writes the most frequent raw tokens of the arabic reviews, the
+    arabic token normalizer cache is warmed from this list
+
+    Args:
+        input_path (str): path of the reviews
+        output_path (str): path of the frequency list
+        top (int, optional): number of tokens written. Defaults to 100000.
+
+    Returns:
+        int: number of tokens written
+    """
+    # the text processing is only imported by this command
+    from cleaning.storage import read_reviews
+    from cleaning.text_processing import (count_tokens, save_token_frequencies,
+                                        separate_text_by_language)
+    reviews = separate_text_by_language(read_reviews(input_path, ["content", "language"]))
+    counts = count_tokens(reviews.loc[reviews["language"] == "ara", "content"].dropna())
+    save_token_frequencies(output_path, counts, top)
+    return min(top, len(counts))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="manages the stop words bundle "
+                                                "and the arabic token frequency list, "
+                                                "build downloads the nltk stopwords corpus "
+                                                "if needed and writes the bundle the "
+                                                "offline runs read")
+    parser.add_argument("command", choices=["build", "info", "token-frequencies"])
+    parser.add_argument("--path", default=get_bundle_path())
+    parser.add_argument("--input", default=None,
+                        help="reviews the token frequencies are counted on")
+    parser.add_argument("--output", default="arabic_token_frequencies.tsv",
+                        help="path of the token frequency list")
+    parser.add_argument("--top", type=int, default=100000,
+                        help="number of tokens of the frequency list")
+    args = parser.parse_args()
+    if args.command == "token-frequencies":
+        if args.input is None:
+            parser.error("token-frequencies needs --input")
+        n_tokens = build_token_frequencies(args.input, args.output, args.top)
+        print(f"{n_tokens} tokens written to {args.output}")
+        raise SystemExit
+    if args.command == "build":
+        build_bundle(args.path)
+    bundle = load_bundle(args.path)
+    if bundle is None:
+        print(f"no bundle at {args.path}")
+    else:
+        print(f"{args.path}: " + ", ".join(f"{len(words)} {language} stop words"
+                                            for language, words in bundle.items()))
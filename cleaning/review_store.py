@@ -0,0 +1,141 @@
+import functools
+import mmap
+import os
+import shutil
+import numpy as np
+from typing import Iterable, List, Sequence
+
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+NULLS_FILE = "nulls.npy"
+# Number of texts written to the buffer at once
+WRITE_BATCH_SIZE = 10000
+
+class ReviewStore:
+    """
+    Read only store of texts laid out as one contiguous utf-8 buffer
+    plus the offsets of the texts, both memory mapped from a directory.
+    The processes opening the same store share its pages so the workers
+    read their slices without the texts being pickled to them
+
+    Args:
+        path (str): directory of the store, written by ReviewStore.write
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self.nulls = np.load(os.path.join(path, NULLS_FILE), mmap_mode="r")
+        self._file = open(os.path.join(path, TEXTS_FILE), "rb")
+        # an empty file can't be memory mapped
+        self._buffer = b""
+        if self.offsets[-1] > 0:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._buffer)
+
+    @staticmethod
+    def write(path: str, texts: Iterable[str]) -> "ReviewStore":
+        """
+        writes texts to a new store, the nulls (None, NaN) are kept as nulls
+
+        Args:
+            path (str): directory of the store
+            texts (Iterable[str]): the texts
+
+        Returns:
+            ReviewStore: the opened store
+        """
+        os.makedirs(path, exist_ok=True)
+        lengths, nulls = [], []
+        with open(os.path.join(path, TEXTS_FILE), "wb") as texts_file:
+            batch = []
+            for text in texts:
+                is_null = not isinstance(text, str)
+                encoded = b"" if is_null else text.encode("utf-8")
+                batch.append(encoded)
+                lengths.append(len(encoded))
+                nulls.append(is_null)
+                # the texts are written by batches rather than one by one
+                if len(batch) == WRITE_BATCH_SIZE:
+                    texts_file.write(b"".join(batch))
+                    batch = []
+            texts_file.write(b"".join(batch))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        np.save(os.path.join(path, OFFSETS_FILE), offsets)
+        np.save(os.path.join(path, NULLS_FILE), np.asarray(nulls, dtype=bool))
+        return ReviewStore(path)
+
+    @staticmethod
+    def concat(paths: Sequence[str], path: str) -> "ReviewStore":
+        """
+        concatenates stores into a new one, the buffers are copied
+        as bytes and the offsets shifted without decoding the texts
+
+        Args:
+            paths (Sequence[str]): directories of the stores in order
+            path (str): directory of the new store
+
+        Returns:
+            ReviewStore: the opened store
+        """
+        os.makedirs(path, exist_ok=True)
+        offsets, nulls = [np.zeros(1, dtype=np.int64)], []
+        start = 0
+        with open(os.path.join(path, TEXTS_FILE), "wb") as texts_file:
+            for part_path in paths:
+                part_offsets = np.load(os.path.join(part_path, OFFSETS_FILE))
+                offsets.append(part_offsets[1:] + start)
+                nulls.append(np.load(os.path.join(part_path, NULLS_FILE)))
+                with open(os.path.join(part_path, TEXTS_FILE), "rb") as part_file:
+                    shutil.copyfileobj(part_file, texts_file)
+                start += int(part_offsets[-1])
+        np.save(os.path.join(path, OFFSETS_FILE), np.concatenate(offsets))
+        np.save(os.path.join(path, NULLS_FILE), np.concatenate(nulls) if nulls
+                else np.zeros(0, dtype=bool))
+        return ReviewStore(path)
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def __getitem__(self, index: int) -> str:
+        if self.nulls[index]:
+            return None
+        # decoded straight from the mapped pages
+        return str(self._view[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def get_slice(self, start: int, stop: int) -> List[str]:
+        """
+        returns the texts between two positions
+
+        Args:
+            start (int): position of the first text
+            stop (int): position after the last text
+
+        Returns:
+            List[str]: the texts, None for the nulls
+        """
+        offsets = self.offsets[start:stop + 1].tolist()
+        nulls = self.nulls[start:stop].tolist()
+        view = self._view
+        return [None if is_null else str(view[begin:end], "utf-8")
+                for begin, end, is_null in zip(offsets, offsets[1:], nulls)]
+
+    def to_list(self) -> List[str]:
+        return self.get_slice(0, len(self))
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+@functools.lru_cache(maxsize=8)
+def open_store(path: str) -> ReviewStore:
+    # the stores are opened once per worker process
+    return ReviewStore(path)
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Tuple
+from cleaning.preprocessor import Preprocessor
+from cleaning.text_processing import ArabicTokenNormalizer
+
+logger = logging.getLogger(__name__)
+
+# Preprocessor of the current pool worker, it is set once
+# when the worker starts by _init_worker
+_worker_preprocessor = None
+
+def _init_worker(preprocessor: Preprocessor):
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor
+
+class Overloaded(Exception):
+    """The queue of the pending reviews is full"""
+
+class CleaningError(Exception):
+    """The cleaning of a review failed"""
+
+def _clean_batch(texts: List[str], languages: List[str]) -> list:
+    # each review is cleaned on its own so a malformed review only
+    # fails its request and not the other reviews of its batch
+    clean = _worker_preprocessor.clean
+    results = []
+    for text, language in zip(texts, languages):
+        try:
+            results.append(clean(text, language))
+        except Exception as error:
+            results.append(CleaningError(f"{type(error).__name__}: {error}"))
+    return results
+
+class MicroBatcher:
+    """
+    Groups the reviews submitted concurrently into micro batches. A batch
+    is sent to the worker pool when it has max_batch_size reviews or when
+    the oldest review waited batch_window seconds, so the event loop only
+    waits for the pool and never cleans texts itself. The pending reviews
+    are bounded by max_queue_size, submitting to a full queue raises Overloaded
+
+    Args:
+        executor (Executor): pool whose workers were initialized with _init_worker
+        max_batch_size (int, optional): reviews per batch. Defaults to 64.
+        batch_window (float, optional): seconds a review waits for a batch
+                                        to fill. Defaults to 0.002.
+        max_queue_size (int, optional): pending reviews. Defaults to 10000.
+        max_inflight_batches (int, optional): batches processed at the same
+                                        time by the pool. Defaults to 4.
+    """
+    def __init__(self,
+                executor: Executor,
+                max_batch_size: int = 64,
+                batch_window: float = 0.002,
+                max_queue_size: int = 10000,
+                max_inflight_batches: int = 4):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.inflight = asyncio.Semaphore(max_inflight_batches)
+        self.n_batches = 0
+        self.n_reviews = 0
+        self._task = None
+        self._batch_tasks = set()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, text: str, language: str) -> List[Tuple[str, str]]:
+        """
+        cleans one review within the next batch
+
+        Args:
+            text (str): raw content of the review
+            language (str): language of the review
+
+        Returns:
+            List[Tuple[str, str]]: output of Preprocessor.clean
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((text, language, future))
+        except asyncio.QueueFull:
+            raise Overloaded(f"more than {self.queue.maxsize} pending reviews")
+        return await future
+
+    async def _next_batch(self) -> list:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # the queue fills up while the pool is busy, which
+            # makes the next batches bigger
+            await self.inflight.acquire()
+            batch = await self._next_batch()
+            task = asyncio.get_running_loop().create_task(self._process(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _process(self, batch: list):
+        texts = [text for text, _, _ in batch]
+        languages = [language for _, language, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _clean_batch, texts, languages)
+        except Exception as error:
+            logger.exception("batch of %d reviews failed", len(batch))
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            self.inflight.release()
+        self.n_batches += 1
+        self.n_reviews += len(batch)
+        for (_, _, future), rows in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(rows, CleaningError):
+                logger.warning("review failed: %s", rows)
+                future.set_exception(rows)
+            else:
+                future.set_result(rows)
+
+async def handle_request(batcher: MicroBatcher, line: bytes) -> dict:
+    """
+    answers one line of the protocol. A request is a json object with
+    the text, the language and an optional id that is returned in the
+    response with the cleaned rows or an error
+
+    Args:
+        batcher (MicroBatcher): the micro batcher
+        line (bytes): the json request
+
+    Returns:
+        dict: the response
+    """
+    try:
+        request = json.loads(line)
+        text = request["text"]
+        language = request.get("language", "eng")
+    except (ValueError, KeyError, TypeError, AttributeError) as error:
+        return {"error": f"invalid request: {error}"}
+    response = {"id": request.get("id")}
+    try:
+        rows = await batcher.submit(text, language)
+    except Overloaded as error:
+        response["error"] = f"overloaded: {error}"
+        return response
+    except Exception as error:
+        response["error"] = str(error)
+        return response
+    response["rows"] = [{"language": row_language, "text": row_text}
+                        for row_language, row_text in rows]
+    return response
+
+async def handle_connection(batcher: MicroBatcher,
+                            reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter,
+                            max_pending: int = 256):
+    # The requests of a connection are answered as soon as they are
+    # cleaned, so possibly out of order. When a connection has max_pending
+    # requests in progress it isn't read anymore until one is answered
+    pending = asyncio.Semaphore(max_pending)
+    write_lock = asyncio.Lock()
+    tasks = set()
+
+    async def answer(line: bytes):
+        try:
+            response = await handle_request(batcher, line)
+            async with write_lock:
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            pending.release()
+
+    try:
+        while True:
+            await pending.acquire()
+            line = await reader.readline()
+            if not line:
+                pending.release()
+                break
+            if not line.strip():
+                pending.release()
+                continue
+            task = asyncio.get_running_loop().create_task(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(host: str = "127.0.0.1",
+                port: int = 8765,
+                n_workers: int = 1,
+                max_batch_size: int = 64,
+                batch_window: float = 0.002,
+                max_queue_size: int = 10000,
+                max_pending: int = 256,
+                detect_language: bool = False,
+                stem_arabic: bool = False):
+    """
+    runs the preprocessing server, it speaks a line protocol of
+    json requests and responses over tcp
+
+    Args:
+        host (str, optional): listening address. Defaults to "127.0.0.1".
+        port (int, optional): listening port. Defaults to 8765.
+        n_workers (int, optional): worker processes. Defaults to 1.
+        max_batch_size (int, optional): reviews per batch. Defaults to 64.
+        batch_window (float, optional): seconds a review waits for a batch
+                                        to fill. Defaults to 0.002.
+        max_queue_size (int, optional): pending reviews. Defaults to 10000.
+        max_pending (int, optional): requests in progress per connection.
+                                    Defaults to 256.
+        detect_language (bool, optional): routes the reviews by their script.
+                                        Defaults to False.
+        stem_arabic (bool, optional): also applies the arabic light stemmer.
+                                    Defaults to False.
+    """
+    preprocessor = Preprocessor(detect_language=detect_language,
+                                arabic_normalizer=ArabicTokenNormalizer(stem=stem_arabic))
+    with ProcessPoolExecutor(max_workers=n_workers,
+                            initializer=_init_worker,
+                            initargs=(preprocessor,)) as executor:
+        batcher = MicroBatcher(executor, max_batch_size, batch_window,
+                                max_queue_size, max_inflight_batches=2 * n_workers)
+        batcher.start()
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_connection(batcher, reader, writer, max_pending),
+            host, port)
+        logger.info("listening on %s:%d with %d workers", host, port, n_workers)
+        # SIGINT and SIGTERM stop the server gracefully
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            await batcher.stop()
+            logger.info("cleaned %d reviews in %d batches",
+                        batcher.n_reviews, batcher.n_batches)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serves the review preprocessing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--batch-window-ms", type=float, default=2.0,
+                        help="time a review waits for its batch to fill")
+    parser.add_argument("--max-queue-size", type=int, default=10000,
+                        help="pending reviews before the requests are rejected")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="requests in progress per connection")
+    parser.add_argument("--detect-language", action="store_true",
+                        help="route the reviews by the script of their content "
+                            "like the pipeline with --detect-language")
+    parser.add_argument("--stem-arabic", action="store_true",
+                        help="also strip the arabic prefixes and suffixes like the "
+                            "pipeline with --stem-arabic")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(serve(args.host, args.port, args.workers, args.max_batch_size,
+                    args.batch_window_ms / 1000, args.max_queue_size, args.max_pending,
+                    args.detect_language, args.stem_arabic))
@@ -0,0 +1,199 @@
+import os
+import shutil
+import pandas as pd
+from typing import Iterator, List, Sequence
+
+# Columns of the raw reviews used by the pipeline
+INPUT_COLUMNS = ["id", "content", "date", "language", "title", "tags", "ratings"]
+# Columns stored as nested lists/structs in the columnar files
+NESTED_COLUMNS = ["tags", "ratings"]
+
+FILE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+def get_file_format(path: str, file_format: str = None) -> str:
+    """
+    returns the format of a file, the explicit format if given
+    otherwise the one of its extension, csv by default
+
+    Args:
+        path (str): path of the file
+        file_format (str, optional): "csv" or "parquet". Defaults to None.
+
+    Returns:
+        str: the file format
+    """
+    if file_format is not None:
+        return file_format
+    return FILE_FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+def _arrow_to_pandas(table) -> pd.core.frame.DataFrame:
+    # The nested columns are converted to python lists and dicts
+    # like the ones fix_type_column returns for the csv literals
+    nested_columns = [name for name in NESTED_COLUMNS if name in table.column_names]
+    df = table.drop(nested_columns).to_pandas()
+    for name in nested_columns:
+        df[name] = pd.Series(table.column(name).to_pylist(), index=df.index, dtype=object)
+    return df[table.column_names]
+
+def read_reviews(path: str,
+                columns: Sequence[str] = INPUT_COLUMNS,
+                file_format: str = None,
+                chunksize: int = None):
+    """
+    reads the raw reviews, only the given columns are read. In parquet
+    files the tags and ratings can be native lists/structs which
+    are then returned already parsed
+
+    Args:
+        path (str): path of the reviews
+        columns (Sequence[str], optional): columns to read.
+                                        Defaults to INPUT_COLUMNS.
+        file_format (str, optional): "csv" or "parquet".
+                                    Defaults to the extension of the path.
+        chunksize (int, optional): if given an iterator of dataframes
+                                    of this many reviews is returned.
+                                    Defaults to None.
+
+    Returns:
+        the reviews dataframe or an iterator of dataframes
+    """
+    columns = list(columns)
+    if get_file_format(path, file_format) == "csv":
+        return pd.read_csv(path, usecols=columns, chunksize=chunksize)
+    import pyarrow.parquet as pq
+    if chunksize is None:
+        return _arrow_to_pandas(pq.read_table(path, columns=columns))
+    return _iter_parquet(path, columns, chunksize)
+
+def _iter_parquet(path: str,
+                columns: List[str],
+                chunksize: int) -> Iterator[pd.core.frame.DataFrame]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    start = 0
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        df = _arrow_to_pandas(pa.Table.from_batches([batch]))
+        # keeps a running index like the csv chunks
+        df.index = pd.RangeIndex(start, start + len(df))
+        start += len(df)
+        yield df
+
+def write_frame(df: pd.core.frame.DataFrame,
+                path: str,
+                file_format: str = None):
+    """
+    writes a dataframe, in parquet the categorical
+    columns are stored dictionary encoded
+
+    Args:
+        df (pd.core.frame.DataFrame): dataframe to be written
+        path (str): output path
+        file_format (str, optional): "csv" or "parquet".
+                                    Defaults to the extension of the path.
+    """
+    if get_file_format(path, file_format) == "csv":
+        df.to_csv(path, index=False)
+        return
+    df.to_parquet(path, index=False)
+
+def _widen_dictionaries(schema):
+    # The indices of the categorical columns are as small as the categories
+    # of the first frame allow, the later frames can have more categories
+    import pyarrow as pa
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(),
+                                                                field.type.value_type)))
+    return schema
+
+class FrameWriter:
+    """
+    Appends dataframes with the same columns to a csv or
+    parquet file, the file is created on the first write.
+    The categorical columns can have different categories
+
+    Args:
+        path (str): output path
+        file_format (str, optional): "csv" or "parquet".
+                                    Defaults to the extension of the path.
+    """
+    def __init__(self, path: str, file_format: str = None):
+        self.path = path
+        self.file_format = get_file_format(path, file_format)
+        self._parquet_writer = None
+        self._header_written = False
+
+    def write(self, df: pd.core.frame.DataFrame):
+        if self.file_format == "csv":
+            df.to_csv(self.path, mode="a" if self._header_written else "w",
+                    header=not self._header_written, index=False)
+            self._header_written = True
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path,
+                                                    _widen_dictionaries(table.schema))
+        self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def concat_files(paths: Sequence[str],
+                output_path: str,
+                empty_df: pd.core.frame.DataFrame,
+                file_format: str = None):
+    """
+    concatenates files written by FrameWriter without parsing them
+    again, the csv files are copied with a single header and the
+    parquet files are copied by batches
+
+    Args:
+        paths (Sequence[str]): files to concatenate, missing files are skipped
+        output_path (str): output path
+        empty_df (pd.core.frame.DataFrame): empty dataframe with the output
+                                            columns, written if all the files
+                                            are missing
+        file_format (str, optional): "csv" or "parquet".
+                                    Defaults to the extension of the output path.
+    """
+    file_format = get_file_format(output_path, file_format)
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        write_frame(empty_df, output_path, file_format)
+        return
+    if file_format == "csv":
+        with open(output_path, "w", encoding="utf-8", newline="") as output_file:
+            for i, path in enumerate(paths):
+                with open(path, encoding="utf-8", newline="") as input_file:
+                    header = input_file.readline()
+                    if i == 0:
+                        output_file.write(header)
+                    shutil.copyfileobj(input_file, output_file)
+        return
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for path in paths:
+            parquet_file = pq.ParquetFile(path)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, parquet_file.schema_arrow)
+            for batch in parquet_file.iter_batches():
+                writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
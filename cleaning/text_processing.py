@@ -1,9 +1,49 @@
 import pandas as pd
+import os
 import re
+import shutil
 import string
-import nltk
-from nltk.corpus import stopwords
-from typing import List
+import functools
+import itertools
+import logging
+import tempfile
+from collections import Counter
+from cleaning.resources import load_stopwords
+from cleaning.review_store import ReviewStore, open_store
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Markers of the reviews translated by Google, each one is
+# a (prefix, separator) pair with the form
+# prefix english text separator arabic text
+TRANSLATION_MARKERS = [
+    ("More(Translated by Google)", " (Original) "),
+    ("moretranslated by google", " original "),
+]
+
+def split_translated_text(text: str) -> Tuple[str, str]:
+    """
+    splits a single review translated by Google like
+    separate_text_by_language does for a whole column
+
+    Args:
+        text (str): content of the review
+
+    Returns:
+        Tuple[str, str]: arabic and english texts, None if
+                        the review isn't translated
+    """
+    for prefix, separator in TRANSLATION_MARKERS:
+        if not text.startswith(prefix):
+            continue
+        parts = text.split(separator)
+        english_parts = parts[0].split(prefix + " ")
+        if len(parts) < 2 or len(english_parts) < 2:
+            raise IndexError("translated review without the expected "
+                             f"'{prefix}' / '{separator.strip()}' markers")
+        return parts[1], english_parts[1]
+    return None
 
 def get_data_per_language(df: pd.core.frame.DataFrame,
                         language: str) -> pd.core.frame.DataFrame:
@@ -31,54 +71,87 @@ def separate_text_by_language(df: pd.core.frame.DataFrame)-> pd.core.frame.DataF
     Returns:
         pd.core.frame.DataFrame: transformed data
     """
-    for i in range(len(df)):
+    df = df.reset_index(drop = True)
+    is_translated = pd.Series(False, index=df.index)
+    english_txt = pd.Series(None, index=df.index, dtype=object)
+    for prefix, separator in TRANSLATION_MARKERS:
         # the translated reviews start with the line More(Translated by Google)
-        if df.iloc[[i]]['content'].values[0].startswith("More(Translated by Google)"):
-            # We get the review's text
-            txt = df.iloc[[i]]['content'].values[0]
-            # the review that is translated takes the following form
-            # More(Translated by Google) english text (Original) arabic text
-            # We split the text by the key word '(Original)' in the middle
-            arabic_txt = txt.split(" (Original) ")[1] # We get the arabic text 
-            # We extract the english text and we remove the beginning keywords 
-            # since they offer no extra informations
-            english_txt = txt.split(" (Original) ")[0].split('More(Translated by Google) ')[1] 
-            # We update the row with the arabic text
-            df.at[i, 'content'] = arabic_txt
-            df.at[i, 'language'] = 'ara'
-            # We create a new row with the english text only
-            row_dict = df.iloc[i].to_dict()
-            row_dict["content"] = english_txt
-            row_dict["language"] = "eng"
-            # We append this new row to the dataframe
-            df = df._append(row_dict, ignore_index = True)
-        elif df.iloc[[i]]['content'].values[0].startswith("moretranslated by google"):
-            # the translated reviews can also start with the line moretranslated by google
-            # We apply the same transformations
-            txt = df.iloc[[i]]['content'].values[0]
-            arabic_txt = txt.split(" original ")[1]
-            english_txt = txt.split(" original ")[0].split('moretranslated by google ')[1]
-            df.at[i, 'content'] = arabic_txt
-            df.at[i, 'language'] = 'ara'
-            row_dict = df.iloc[i].to_dict()
-            row_dict["content"] = english_txt
-            row_dict["language"] = "eng"
-            df = df._append(row_dict, ignore_index = True)
+        # or with the line moretranslated by google, the first marker wins
+        matches = df['content'].str.startswith(prefix, na=False) & ~is_translated
+        if not matches.any():
+            continue
+        # the review that is translated takes the following form
+        # More(Translated by Google) english text (Original) arabic text
+        # We split the text by the key word '(Original)' in the middle
+        parts = df.loc[matches, 'content'].str.split(separator, regex=False)
+        arabic_part = parts.str[1] # We get the arabic text
+        # We extract the english text and we remove the beginning keywords
+        # since they offer no extra informations
+        english_part = parts.str[0].str.split(prefix + " ", regex=False).str[1]
+        if arabic_part.isna().any() or english_part.isna().any():
+            raise IndexError("translated review without the expected "
+                             f"'{prefix}' / '{separator.strip()}' markers")
+        # We update the rows with the arabic text
+        df.loc[matches, 'content'] = arabic_part
+        df.loc[matches, 'language'] = 'ara'
+        english_txt[matches] = english_part
+        is_translated |= matches
+    if not is_translated.any():
+        return df
+    # We create the new rows with the english text only and append
+    # them all at once in the original order of the reviews
+    english_df = df.loc[is_translated].copy()
+    english_df['content'] = english_txt[is_translated]
+    english_df['language'] = 'eng'
     # We reset the index for smoother manipulations
-    df = df.reset_index(drop = True)
+    df = pd.concat([df, english_df], ignore_index = True)
     return df
 
+# Patterns of the text cleaning, they are compiled once
+# at import time instead of once per review
+EMOJI_PATTERN = re.compile(pattern = "["
+    u"\U0001F600-\U0001F64F"  # emoticons
+    u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+    u"\U0001F680-\U0001F6FF"  # transport & map symbols
+    u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    u"\U00002700-\U000027BF"  # Dingbats
+    u"\U00002702-\U000027B0"
+    u"\U000024C2-\U0001F251"
+    "]+", flags = re.UNICODE)
+SQUARE_BRACKETS_PATTERN = re.compile(r'\[.*?\]')
+HTML_TAGS_PATTERN = re.compile(r'<.*?>+')
+DIGIT_WORDS_PATTERN = re.compile(r'\w*\d\w*')
+REPEATED_LETTERS_PATTERN = re.compile(r'(\w)\1{2,}')
+# Words containing digits are removed and letters repeated 3 or more
+# times are reduced in the same pass, removing a whole word never makes
+# two runs of letters adjacent so the result is the same as two passes
+DIGIT_WORDS_OR_REPEATED_LETTERS_PATTERN = re.compile(r'\w*\d\w*|(\w)\1{2,}')
+# Punctuations and return to lines are both removed after the brackets
+# and the html tags so a single translation table removes them
+ENGLISH_DELETE_TABLE = str.maketrans('', '', string.punctuation + '\n')
+
+# Characters removed from the arabic reviews and arabic letters that
+# the cleaned reviews have to start with, or only contain once stripped
+# when the reviews are routed by their script
+ARABIC_NON_LETTERS_PATTERN = re.compile('[^\u0621-\u064A\u0660-\u0669 ]')
+ARABIC_DIGITS_PATTERN = re.compile('/[\u0660-\u0669]/')
+ARABIC_START_PATTERN = re.compile('^[\u0621-\u064A\u0660-\u0669]')
+ARABIC_LETTER_PATTERN = re.compile('[\u0621-\u064A]')
+
+# Normalization of the arabic letter variants
+ARABIC_LETTER_MAPPING = {
+    "إ": "ا",
+    "أ": "ا",
+    "آ": "ا",
+    "ى": "ي",
+    "ؤ": "ء",
+    "ئ": "ء",
+    "ة": "ه",
+    "گ": "ك",
+}
+
 def deEmojify(text: str):
-    regrex_pattern = re.compile(pattern = "["
-        u"\U0001F600-\U0001F64F"  # emoticons
-        u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-        u"\U0001F680-\U0001F6FF"  # transport & map symbols
-        u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-        u"\U00002700-\U000027BF"  # Dingbats
-        u"\U00002702-\U000027B0"
-        u"\U000024C2-\U0001F251"
-        "]+", flags = re.UNICODE)
-    return regrex_pattern.sub(r'',text)
+    return EMOJI_PATTERN.sub(r'',text)
 
 def text_preprocessing(text: str) -> str:
     """
@@ -92,38 +165,321 @@ def text_preprocessing(text: str) -> str:
         str: _description_
     """
     text = text.lower() # We transform the text to lowercase
-    text = re.sub('\[.*?\]', '', text)
-    text = re.sub('<.*?>+', '', text)
-    text = re.sub('[%s]' % re.escape(string.punctuation), '', text) # Remove Punctuations
-    text = re.sub('\n', '', text) # We remove the return to line
-    text = re.sub('\w*\d\w*', '', text) # Remove digits and words containing digits
+    text = SQUARE_BRACKETS_PATTERN.sub('', text)
+    text = HTML_TAGS_PATTERN.sub('', text)
+    text = text.translate(ENGLISH_DELETE_TABLE) # Remove Punctuations and return to lines
+    text = DIGIT_WORDS_PATTERN.sub('', text) # Remove digits and words containing digits
     return text
 
 def reduce_repeated_letters(text):
-    # Define the pattern to match any letter repeated 3 or more times
-    pattern = re.compile(r'(\w)\1{2,}')
+    # Replace any letter repeated 3 or more times with just one letter
+    return REPEATED_LETTERS_PATTERN.sub(r'\1', text)
+
+def _keep_repeated_letter(match) -> str:
+    # words with digits have no group and are removed
+    return match.group(1) or ''
+
+class TextNormalizer:
+    """
+    Character level normalizer of the reviews built once from the
+    punctuations and the arabic letter mapping.
+    clean_text gives the same output as deEmojify, text_preprocessing
+    and reduce_repeated_letters applied in a row and normalize_arabic
+    the same output as the character level part of preprocess
 
-    # Use the sub() function to replace occurrences of the pattern with just one letter
-    result = pattern.sub(r'\1', text)
+    Args:
+        punctuations (str, optional): punctuations removed from the
+                                    arabic text. Defaults to get_punctuations().
+        letter_mapping (Dict[str, str], optional): arabic letter variants with
+                                                their normalized letter.
+                                                Defaults to ARABIC_LETTER_MAPPING.
+    """
+    def __init__(self,
+                punctuations: str = None,
+                letter_mapping: Dict[str, str] = None):
+        if punctuations is None:
+            punctuations = get_punctuations()
+        if letter_mapping is None:
+            letter_mapping = ARABIC_LETTER_MAPPING
+        self.punctuations = punctuations
+        self.letter_mapping = dict(letter_mapping)
+        # The punctuations are removed before the letters are mapped
+        # so a punctuation is never mapped and a mapped letter is never removed
+        self.arabic_table = str.maketrans('', '', punctuations)
+        for letter, normalized_letter in self.letter_mapping.items():
+            if letter not in punctuations:
+                self.arabic_table[ord(letter)] = normalized_letter
+
+    def clean_text(self, text: str) -> str:
+        text = EMOJI_PATTERN.sub('', text)
+        text = text.lower()
+        text = SQUARE_BRACKETS_PATTERN.sub('', text)
+        text = HTML_TAGS_PATTERN.sub('', text)
+        text = text.translate(ENGLISH_DELETE_TABLE)
+        return DIGIT_WORDS_OR_REPEATED_LETTERS_PATTERN.sub(_keep_repeated_letter, text)
+
+    def normalize_arabic(self, text: str) -> str:
+        return text.translate(self.arabic_table)
+
+@functools.lru_cache(maxsize=8)
+def get_normalizer(punctuations: str = None) -> TextNormalizer:
+    """
+    returns the normalizer of a punctuations string, it is
+    built on the first call and reused afterwards
 
-    return result
+    Args:
+        punctuations (str, optional): punctuations removed from the
+                                    arabic text. Defaults to get_punctuations().
 
-def preprocess_all_text(df: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
-    df["content"] = df["content"].apply(lambda x: deEmojify(x))
-    df["content"] = df["content"].apply(lambda x: text_preprocessing(x))
-    df["content"] = df["content"].apply(lambda x: reduce_repeated_letters(x))
+    Returns:
+        TextNormalizer: the shared normalizer
+    """
+    return TextNormalizer(punctuations)
+
+# Resources of the current pool worker, they are set once
+# when the worker starts by _init_worker
+_worker_resources = {}
+
+def _init_worker(resources: dict):
+    _worker_resources.update(resources)
+
+def _clean_all_text_batch(texts: List[str]) -> List[str]:
+    normalizer = get_normalizer()
+    return [normalizer.clean_text(text) for text in texts]
+
+def _clean_english_batch(texts: List[str]) -> List[str]:
+    contractions_re = _worker_resources["contractions_re"]
+    eng_stop_words = _worker_resources["eng_stop_words"]
+    return [remove_eng_stop_words(expand_contractions(text, contractions_re),
+                                eng_stop_words)
+            for text in texts]
+
+def _clean_arabic_batch(texts: List[str]) -> List[str]:
+    arabic_normalizer = _worker_resources["arabic_normalizer"]
+    return [arabic_normalizer.preprocess(text) for text in texts]
+
+def _clean_arabic_letters_batch(texts: List[str]) -> List[str]:
+    arabic_normalizer = _worker_resources["arabic_normalizer"]
+    return [arabic_normalizer.preprocess_letters(text) for text in texts]
+
+def _clean_store_partition(batch_func: Callable[[List[str]], List[str]],
+                            input_path: str,
+                            start: int,
+                            stop: int,
+                            output_path: str) -> str:
+    # the worker reads its texts from the mapped input store and
+    # writes the cleaned ones to its own output store
+    texts = open_store(input_path).get_slice(start, stop)
+    ReviewStore.write(output_path, batch_func(texts)).close()
+    return output_path
+
+def parallel_apply(texts: pd.core.series.Series,
+                    batch_func: Callable[[List[str]], List[str]],
+                    resources: dict,
+                    n_workers: int,
+                    partition_size: int = 10000,
+                    store_dir: str = None) -> pd.core.series.Series:
+    """
+    applies a batch cleaning function over a text column with
+    a pool of processes, the column is split into partitions that
+    are processed in parallel and gathered back in their original order.
+    With a store directory the texts are written once to a memory mapped
+    ReviewStore the workers read their partitions from, only the
+    positions of the partitions are sent to them
+
+    Args:
+        texts (pd.core.series.Series): column to be cleaned
+        batch_func (Callable[[List[str]], List[str]]): module level function
+                                                    cleaning a list of texts
+        resources (dict): stop words, punctuations and compiled patterns
+                        sent once to each worker when it starts
+        n_workers (int): number of worker processes
+        partition_size (int, optional): number of texts per task.
+                                        Defaults to 10000.
+        store_dir (str, optional): directory of the review stores, /dev/shm
+                                keeps them in shared memory. Defaults to None.
+
+    Returns:
+        pd.core.series.Series: cleaned column with the same index
+    """
+    if store_dir is not None:
+        return _parallel_apply_store(texts, batch_func, resources, n_workers,
+                                    partition_size, store_dir)
+    values = texts.tolist()
+    partitions = [values[i:i + partition_size]
+                for i in range(0, len(values), partition_size)]
+    # multiprocessing is only imported by the parallel runs
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=n_workers,
+                            initializer=_init_worker,
+                            initargs=(resources,)) as executor:
+        # map keeps the order of the partitions so the result
+        # is the same as the serial one
+        results = executor.map(batch_func, partitions)
+        cleaned = [text for partition in results for text in partition]
+    return pd.Series(cleaned, index=texts.index, dtype=texts.dtype)
+
+def _parallel_apply_store(texts: pd.core.series.Series,
+                        batch_func: Callable[[List[str]], List[str]],
+                        resources: dict,
+                        n_workers: int,
+                        partition_size: int,
+                        store_dir: str) -> pd.core.series.Series:
+    from concurrent.futures import ProcessPoolExecutor
+    os.makedirs(store_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="review-store-", dir=store_dir)
+    try:
+        input_path = os.path.join(work_dir, "input")
+        ReviewStore.write(input_path, texts).close()
+        starts = list(range(0, len(texts), partition_size))
+        output_paths = [os.path.join(work_dir, f"part-{i:05d}") for i in range(len(starts))]
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                initializer=_init_worker,
+                                initargs=(resources,)) as executor:
+            list(executor.map(_clean_store_partition,
+                            [batch_func] * len(starts),
+                            [input_path] * len(starts),
+                            starts,
+                            [start + partition_size for start in starts],
+                            output_paths))
+        with ReviewStore.concat(output_paths, os.path.join(work_dir, "output")) as output:
+            cleaned = output.to_list()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return pd.Series(cleaned, index=texts.index, dtype=texts.dtype)
+
+def preprocess_all_text(df: pd.core.frame.DataFrame,
+                        n_workers: int = 1,
+                        partition_size: int = 10000,
+                        store_dir: str = None) -> pd.core.frame.DataFrame:
+    if n_workers > 1:
+        df["content"] = parallel_apply(df["content"], _clean_all_text_batch, {},
+                                        n_workers, partition_size, store_dir)
+        return df
+    normalizer = get_normalizer()
+    df["content"] = df["content"].apply(normalizer.clean_text)
     return df
 
-def get_eng_stopwords():
-    nltk.download('stopwords')
-    eng_stop_words = stopwords.words('english')
+class StopWordIndex(frozenset):
+    """
+    Set of the stop words of a language, checking if a token is
+    a stop word costs a hash lookup instead of a scan of the list
+
+    Args:
+        words (Iterable[str]): base stop words
+        extra_words (Iterable[str], optional): words added to the stop words.
+                                                Defaults to None.
+        excluded_words (Iterable[str], optional): words that are kept in the text
+                                                even if they are stop words.
+                                                Defaults to None.
+    """
+    def __new__(cls,
+                words: Iterable[str] = (),
+                extra_words: Iterable[str] = None,
+                excluded_words: Iterable[str] = None):
+        words = set(words)
+        words.update(extra_words or ())
+        words.difference_update(excluded_words or ())
+        return super().__new__(cls, words)
+
+    def remove_from(self, text: str) -> str:
+        # tokenizes, filters and joins the text in a single pass
+        return ' '.join([word for word in text.split() if word not in self])
+
+def to_stop_word_index(stop_words: Iterable[str]) -> StopWordIndex:
+    """
+    returns the stop words as a StopWordIndex, an index is returned
+    as is and any other collection is indexed
+
+    Args:
+        stop_words (Iterable[str]): list or index of stop words
+
+    Returns:
+        StopWordIndex: the stop words index
+    """
+    if isinstance(stop_words, StopWordIndex):
+        return stop_words
+    return StopWordIndex(stop_words)
+
+def get_eng_stopwords(extra_words: Iterable[str] = None,
+                    excluded_words: Iterable[str] = None) -> StopWordIndex:
+    eng_stop_words = StopWordIndex(load_stopwords('english'),
+                                    extra_words, excluded_words)
     return eng_stop_words
 
+def build_trie_pattern(words: Iterable[str]) -> str:
+    """
+    builds a regular expression matching the words from a trie of
+    their characters so the shared prefixes are only tested once.
+    At each node the longer words are tried first so the pattern
+    returns the longest word starting at a position
+
+    Args:
+        words (Iterable[str]): words to match
+
+    Returns:
+        str: the regular expression
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {} # marks the end of a word
+
+    def node_pattern(node: dict) -> str:
+        branches = [re.escape(char) + node_pattern(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:%s)' % '|'.join(branches)
+        if '' in node:
+            # a word ends here, the greedy ? tries the longer words first
+            pattern = '(?:%s)?' % pattern
+        return pattern
+
+    return node_pattern(trie)
+
+class ContractionExpander:
+    """
+    Expands the english contractions of a text in a single left to right
+    pass, the contractions are matched by a trie pattern built once from
+    the contractions dict and the longest contraction wins, so "can't've"
+    becomes "cannot have" and not "cannot've". The matching is case
+    sensitive like the keys of the dict (e.g. "I'm")
+
+    Args:
+        contractions_dict (Dict[str, str], optional): contractions with their
+                                                    expansions.
+                                                    Defaults to get_contractions_dict().
+    """
+    def __init__(self, contractions_dict: Dict[str, str] = None):
+        if contractions_dict is None:
+            contractions_dict = get_contractions_dict()
+        self.contractions_dict = dict(contractions_dict)
+        self.pattern = re.compile(build_trie_pattern(self.contractions_dict))
+        # Characters found in every contraction (the apostrophe), a text
+        # without any of them has nothing to expand
+        keys = [set(key) for key in self.contractions_dict]
+        self.required_chars = set.intersection(*keys) if keys else set()
+
+    def _replace(self, match) -> str:
+        return self.contractions_dict[match.group(0)]
+
+    def expand(self, text: str) -> str:
+        if self.required_chars and not any(char in text for char in self.required_chars):
+            return text
+        return self.pattern.sub(self._replace, text)
+
 def get_contractions(contractions_dict):
     # Regular expression for finding contractions
     contractions_re=re.compile('(%s)' % '|'.join(contractions_dict.keys()))
     return contractions_re
 
+def get_contraction_expander(contractions_dict: Dict[str, str] = None) -> ContractionExpander:
+    # Expander of the contractions, the dict and its pattern are built once
+    return ContractionExpander(contractions_dict)
+
 def get_contractions_dict():
     # Dictionary of English Contractions
     contractions_dict = { "ain't": "are not","'s":" is","aren't": "are not",
@@ -165,22 +521,39 @@ def get_contractions_dict():
                         "you've": "you have"}
     return contractions_dict
 
+@functools.lru_cache(maxsize=1)
+def _default_contractions_dict() -> Dict[str, str]:
+    return get_contractions_dict()
+
 def replace(match):
-    contractions_dict = get_contractions_dict()
+    contractions_dict = _default_contractions_dict()
     return contractions_dict[match.group(0)]
 
-# Function for expanding contractions
+# Function for expanding contractions, with the regex of get_contractions
+# or the expander of get_contraction_expander
 def expand_contractions(text: str, contractions_re):
+    if isinstance(contractions_re, ContractionExpander):
+        return contractions_re.expand(text)
+    # a plain compiled regex of the contractions
     return contractions_re.sub(replace, text)
 
 def remove_eng_stop_words(text, eng_stop_words):
-    text = ' '.join(word for word in text.split() if word not in eng_stop_words)
-    return text
+    return to_stop_word_index(eng_stop_words).remove_from(text)
 
 def preprocess_english_text(df: pd.core.frame.DataFrame,
-                            eng_stop_words: List[str],
-                            contractions_re):
+                            eng_stop_words: Iterable[str],
+                            contractions_re,
+                            n_workers: int = 1,
+                            partition_size: int = 10000,
+                            store_dir: str = None):
     english_df = get_data_per_language(df, language="eng")
+    eng_stop_words = to_stop_word_index(eng_stop_words)
+    if n_workers > 1:
+        english_df['content'] = parallel_apply(english_df['content'], _clean_english_batch,
+                                                {"eng_stop_words": eng_stop_words,
+                                                "contractions_re": contractions_re},
+                                                n_workers, partition_size, store_dir)
+        return english_df.reset_index(drop = True)
     english_df['content'] = english_df['content'].apply(lambda x: expand_contractions(x, contractions_re))
     english_df['content'] = english_df['content'].apply(lambda x: remove_eng_stop_words(x, eng_stop_words))
     english_df = english_df.reset_index(drop = True)
@@ -190,13 +563,15 @@ def get_punctuations():
     punctuations = '''`÷×؛<>_()*&^%][ـ،/:"؟.,'{}~¦+|!”…“–ـ''' + string.punctuation
     return punctuations
 
-def get_ara_stopwords():
-    arab_stop_words = stopwords.words('arabic')
+def get_ara_stopwords(extra_words: Iterable[str] = None,
+                    excluded_words: Iterable[str] = None) -> StopWordIndex:
+    arab_stop_words = StopWordIndex(load_stopwords('arabic'),
+                                    extra_words, excluded_words)
     return arab_stop_words
 
 def preprocess(text: str,
                 punctuations: str,
-                arab_stop_words: List[str]):
+                arab_stop_words: Iterable[str]):
     """
     text is an arabic string input
 
@@ -206,41 +581,211 @@ def preprocess(text: str,
         text (str): the input text
         punctuations (str): a string containing all
                             the standard punctuations
-        arab_stop_words (List[str]): list of all the
-                                    arabic stop words
+        arab_stop_words (Iterable[str]): index or list of all
+                                        the arabic stop words
 
     Returns:
         _type_: _description_
     """
-    translator = str.maketrans('', '', punctuations)
-    text = text.translate(translator)
+    # Removes the punctuations and normalizes the letters in one pass
+    text = get_normalizer(punctuations).normalize_arabic(text)
 
-    text = re.sub("[إأآا]", "ا", text)
-    text = re.sub("ى", "ي", text)
-    text = re.sub("ؤ", "ء", text)
-    text = re.sub("ئ", "ء", text)
-    text = re.sub("ة", "ه", text)
-    text = re.sub("گ", "ك", text)
+    return to_stop_word_index(arab_stop_words).remove_from(text)
 
-    text = ' '.join(word for word in text.split() if word not in arab_stop_words)
+# Prefixes and suffixes of the light10 stemmer in their normalized form,
+# the ta marbuta and the alef maksura are already mapped to ha and ya
+ARABIC_CONJUNCTION_PREFIX = "و"
+ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+ARABIC_SUFFIXES = ("ها", "ان", "ات", "ون", "ين", "يه", "ه", "ي")
 
-    return text
+def light_stem(token: str) -> str:
+    """
+    strips the conjunction, the definite articles and the common suffixes
+    of a normalized arabic token like the light10 stemmer, at least two
+    letters are always kept
+
+    Args:
+        token (str): normalized arabic token
 
-def arabic_cleaning(data):
-    data['content'] = data['content'].str.replace('[^\u0621-\u064A\u0660-\u0669 ]', '', regex=True)
-    # We remove the arabic digits
-    data['content'] = data['content'].str.replace('/[\u0660-\u0669]/', '', regex=True)
+    Returns:
+        str: the stem
+    """
+    if len(token) > 3 and token.startswith(ARABIC_CONJUNCTION_PREFIX):
+        token = token[1:]
+    for prefix in ARABIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            token = token[len(prefix):]
+            break
+    for suffix in ARABIC_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            token = token[:-len(suffix)]
+    return token
+
+class ArabicTokenNormalizer:
+    """
+    Normalizes the arabic reviews token by token, each distinct token
+    is normalized, checked against the stop words and optionally stemmed
+    once then looked up in a bounded lru cache. Without stemming preprocess
+    gives the same output as the preprocess function
+
+    Args:
+        punctuations (str, optional): Defaults to get_punctuations().
+        arab_stop_words (Iterable[str], optional): Defaults to get_ara_stopwords().
+        stem (bool, optional): also applies light_stem. Defaults to False.
+        max_size (int, optional): number of tokens kept in the cache.
+                                Defaults to 100000.
+    """
+    def __init__(self,
+                punctuations: str = None,
+                arab_stop_words: Iterable[str] = None,
+                stem: bool = False,
+                max_size: int = 100000):
+        if arab_stop_words is None:
+            arab_stop_words = get_ara_stopwords()
+        self.punctuations = punctuations
+        self.normalizer = get_normalizer(punctuations)
+        self.arab_stop_words = to_stop_word_index(arab_stop_words)
+        self.stem = stem
+        self.max_size = max_size
+        self.warm_tokens = []
+        self._build_cache()
+
+    def _build_cache(self):
+        self.normalize_token = functools.lru_cache(maxsize=self.max_size)(self._normalize_token)
+        self.letter_token = functools.lru_cache(maxsize=self.max_size)(self._letter_token)
+
+    def _normalize_token(self, token: str) -> str:
+        # the dropped tokens are cached as empty strings
+        token = self.normalizer.normalize_arabic(token)
+        if not token or token in self.arab_stop_words:
+            return ""
+        return light_stem(token) if self.stem else token
+
+    def preprocess(self, text: str) -> str:
+        # the punctuations and the letter mapping never add a space so
+        # normalizing the tokens one by one gives the same tokens
+        return " ".join([token for token in map(self.normalize_token, text.split()) if token])
+
+    def _letter_token(self, token: str) -> Optional[Tuple[str, bool]]:
+        # the arabic letters and digits of the normalized token and whether
+        # it has a letter, None for the dropped tokens
+        token = self.normalize_token(token)
+        if not token:
+            return None
+        token = ARABIC_NON_LETTERS_PATTERN.sub('', token)
+        return token, ARABIC_LETTER_PATTERN.search(token) is not None
+
+    def preprocess_letters(self, text: str) -> str:
+        """
+        preprocess followed by the cleaning of arabic_cleaning for the
+        reviews routed by their script. The non letters are removed from
+        the cached tokens instead of the whole text, the tokens they empty
+        keep their spaces so the text is the same
+
+        Args:
+            text (str): cleaned review
+
+        Returns:
+            str: the arabic text, empty when it has no arabic letter left
+        """
+        tokens = [token for token in map(self.letter_token, text.split()) if token is not None]
+        if not any(has_letter for _, has_letter in tokens):
+            return ""
+        return " ".join([token for token, _ in tokens]).strip()
+
+    def warm(self, tokens: Iterable[str]):
+        """
+        fills the cache with the most frequent tokens, the pool
+        workers warm their own cache with the same tokens
+
+        Args:
+            tokens (Iterable[str]): tokens by decreasing frequency
+        """
+        self.warm_tokens = list(itertools.islice(tokens, self.max_size))
+        for token in self.warm_tokens:
+            self.normalize_token(token)
+
+    def cache_stats(self, letters: bool = False) -> dict:
+        # the letters cache serves preprocess_letters
+        info = (self.letter_token if letters else self.normalize_token).cache_info()
+        lookups = info.hits + info.misses
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize,
+                "max_size": info.maxsize,
+                "hit_rate": info.hits / lookups if lookups else 0.0}
+
+    def __getstate__(self):
+        # the lru cache can't be pickled, it is rebuilt by the pool workers
+        state = self.__dict__.copy()
+        del state["normalize_token"]
+        del state["letter_token"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_cache()
+        for token in self.warm_tokens:
+            self.normalize_token(token)
+
+def count_tokens(texts: Iterable[str]) -> Counter:
+    counts = Counter()
+    for text in texts:
+        counts.update(text.split())
+    return counts
+
+def save_token_frequencies(path: str, counts: Counter, top: int = None):
+    """
+    writes the tokens by decreasing frequency, one
+    token and its count separated by a tab per line
+
+    Args:
+        path (str): path of the frequency list
+        counts (Counter): output of count_tokens
+        top (int, optional): number of tokens written. Defaults to all.
+    """
+    with open(path, "w", encoding="utf-8") as frequencies_file:
+        for token, count in counts.most_common(top):
+            frequencies_file.write(f"{token}\t{count}\n")
+
+def load_token_frequencies(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as frequencies_file:
+        return [line.split("\t")[0] for line in frequencies_file if line.strip()]
+
+def arabic_cleaning(data, script_routed: bool = False):
+    if script_routed:
+        # The reviews were routed by their script and cleaned by
+        # preprocess_letters, the ones left without any arabic
+        # letter are empty and dropped
+        return data[data['content'] != ""]
+    # The slashes of the arabic digits pattern are removed with the
+    # other non letters so removing the digits afterwards changes nothing
+    data['content'] = data['content'].str.replace(ARABIC_NON_LETTERS_PATTERN, '', regex=True)
     # Keeps only the reviews with arabic letters
-    data = data[data['content'].str.contains('^[\u0621-\u064A\u0660-\u0669]')]
+    data = data[data['content'].str.contains(ARABIC_START_PATTERN)]
     return data
 
 def preprocess_arabic_text(df,
                         punctuations,
-                        arab_stop_words):
+                        arab_stop_words,
+                        n_workers: int = 1,
+                        partition_size: int = 10000,
+                        store_dir: str = None,
+                        script_routed: bool = False,
+                        arabic_normalizer: ArabicTokenNormalizer = None):
     arabic_df = get_data_per_language(df, language="ara")
-    arabic_df["content"] = arabic_df["content"].apply(lambda x: preprocess(x,
-                                                                            punctuations,
-                                                                            arab_stop_words))
-    arabic_df = arabic_cleaning(arabic_df)
+    if arabic_normalizer is None:
+        arabic_normalizer = ArabicTokenNormalizer(punctuations, arab_stop_words)
+    if n_workers > 1:
+        batch_func = _clean_arabic_letters_batch if script_routed else _clean_arabic_batch
+        arabic_df["content"] = parallel_apply(arabic_df["content"], batch_func,
+                                            {"arabic_normalizer": arabic_normalizer},
+                                            n_workers, partition_size, store_dir)
+    else:
+        preprocess = (arabic_normalizer.preprocess_letters if script_routed
+                    else arabic_normalizer.preprocess)
+        arabic_df["content"] = arabic_df["content"].apply(preprocess)
+        stats = arabic_normalizer.cache_stats(letters=script_routed)
+        logger.info("arabic token cache: %d hits, %d misses, %.1f%% hit rate, %d tokens",
+                    stats["hits"], stats["misses"], 100 * stats["hit_rate"], stats["size"])
+    arabic_df = arabic_cleaning(arabic_df, script_routed)
     arabic_df = arabic_df.reset_index(drop=True)
     return arabic_df
\ No newline at end of file
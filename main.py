@@ -1,23 +1,49 @@
-import pandas as pd
+import argparse
+import contextlib
 import json
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Sequence
+from cleaning.cache import (StageCache,
+                            KEY_COLUMNS,
+                            entries_to_processed,
+                            processed_to_entries,
+                            review_groups,
+                            review_hashes)
+from cleaning.pipeline import PipelineHook, Plan, Stage, plan_stages, run_stages
+from cleaning.dedup import DEDUP_MODES, DedupSavings, drop_duplicates, find_duplicates
+from cleaning.language_detection import detect_script, route_by_script
+from cleaning.features import HashingVectorizer, vectorize_file
+from cleaning.profiling import SamplingProfiler, StageProfiler, read_stage_seconds, write_report
+from cleaning.storage import (FrameWriter,
+                                concat_files,
+                                get_file_format,
+                                read_reviews,
+                                write_frame)
+from cleaning.incremental import (load_state,
+                                    partition_names,
+                                    plan_incremental_run,
+                                    save_state,
+                                    write_partitions)
 from cleaning.data_cleaning import (fix_datetime_column,
                                     fix_type_column,
                                     remove_empty_rows,
                                     fix_incorrect_cities,
-                                    get_city,
+                                    explode_ratings_and_tags,
+                                    get_city_from_tags,
                                     get_incorrect_cities,
-                                    get_location_type,
-                                    get_tag_and_sentiment,
-                                    map_tags,
-                                    split_ratings,
-                                    reformat_city_column,
-                                    reformat_sentiment_col,
                                     filter_columns,
-                                    compute_sentiment_col,
-                                    sentiment_encoder,
+                                    compute_label_col,
                                     filter_data,
-                                    col_rename)
-from cleaning.text_processing import (get_contractions, 
+                                    col_rename,
+                                    compact_cities,
+                                    compact_reviews,
+                                    compact_tags)
+from cleaning.text_processing import (get_contraction_expander,
                                         separate_text_by_language,
                                         preprocess_all_text,
                                         preprocess_arabic_text,
@@ -25,7 +51,9 @@ from cleaning.text_processing import (get_contractions,
                                         get_ara_stopwords,
                                         get_punctuations,
                                         get_eng_stopwords,
-                                        get_contractions_dict)
+                                        get_contractions_dict,
+                                        ArabicTokenNormalizer,
+                                        load_token_frequencies)
 
 location_name_to_city = {
     # Mapper of some common locations with their cities
@@ -45,6 +73,8 @@ location_name_to_city = {
     "Boudl Gaber Hotel": "Riyadh"
 }
 
+logger = logging.getLogger(__name__)
+
 # Label encoding dict
 label_enc = {
     "negative": 2,
@@ -52,87 +82,847 @@ label_enc = {
     "positive": 0
 }
 
-if __name__ == "__main__":
-    # Reading the data
-    rating_data = pd.read_csv("dataset.csv_(DS_A-L2).csv")
-    json_file = open("mappings.json_(DS_A-L2).json")
-    mapping_data = json.load(json_file)
-    
+def load_resources(stem_arabic: bool = False,
+                token_frequencies_path: str = None) -> dict:
+    """
+    loads the linguistic resources used by the text processing
+    stages, they are loaded only once per run
+
+    Args:
+        stem_arabic (bool, optional): the arabic normalizer also applies
+                                    the light stemmer. Defaults to False.
+        token_frequencies_path (str, optional): frequency list the cache of
+                                    the arabic normalizer is warmed from.
+                                    Defaults to None.
+
+    Returns:
+        dict: punctuations, stop words, the contractions expander
+            and the arabic token normalizer
+    """
+    contractions_dict = get_contractions_dict()
+    punctuations = get_punctuations()
+    arab_stop_words = get_ara_stopwords()
+    arabic_normalizer = ArabicTokenNormalizer(punctuations, arab_stop_words, stem_arabic)
+    if token_frequencies_path:
+        arabic_normalizer.warm(load_token_frequencies(token_frequencies_path))
+    return {"punctuations": punctuations,
+            "arab_stop_words": arab_stop_words,
+            "eng_stop_words": get_eng_stopwords(),
+            "contraction_expander": get_contraction_expander(contractions_dict),
+            "arabic_normalizer": arabic_normalizer}
+
+def write_intermediates(intermediate_writers: Dict[str, FrameWriter],
+                        rating_data: pd.core.frame.DataFrame,
+                        tags_data: pd.core.frame.DataFrame):
+    """
+    writes the labeled reviews and their tags, the cities and location
+    types are dictionary encoded in the columnar files
+
+    Args:
+        intermediate_writers (Dict[str, FrameWriter]): writers of the
+                                    "reviews" and "tags" frames, nothing
+                                    is written if None
+        rating_data (pd.core.frame.DataFrame): labeled reviews
+        tags_data (pd.core.frame.DataFrame): tags in long format
+    """
+    if not intermediate_writers:
+        return
+    if "reviews" in intermediate_writers:
+        reviews = rating_data.drop("content", axis=1)
+        if not isinstance(reviews["city"].dtype, pd.CategoricalDtype):
+            # the unresolved cities are still lists of cities
+            reviews = compact_cities(reviews)
+        intermediate_writers["reviews"].write(reviews)
+    if "tags" in intermediate_writers:
+        tags = tags_data.drop("review", axis=1)
+        tags.insert(0, "id", rating_data["id"].reindex(tags_data["review"]).to_numpy())
+        intermediate_writers["tags"].write(tags)
+
+def open_intermediate_writers(intermediate_dir: str,
+                            file_format: str) -> Dict[str, FrameWriter]:
+    os.makedirs(intermediate_dir, exist_ok=True)
+    return {name: FrameWriter(os.path.join(intermediate_dir, f"{name}.{file_format}"),
+                            file_format)
+            for name in ["reviews", "tags"]}
+
+def drop_raw_rating(rating_data: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+    # the compact stages already dropped it
+    return rating_data.drop("raw_rating", axis=1, errors="ignore")
+
+def split_languages(rating_data: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+    n_reviews = len(rating_data)
+    correct_language_rating_data = separate_text_by_language(rating_data)
+    # The english halves of the translated reviews are appended after
+    # the original rows, we flag them so the chunked mode can keep them
+    # at the end of the output like a whole-file run does
+    correct_language_rating_data["translated"] = correct_language_rating_data.index >= n_reviews
+    return correct_language_rating_data
+
+def concat_languages(arabic_processed_data: pd.core.frame.DataFrame,
+                    english_processed_data: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+    return pd.concat([arabic_processed_data,
+                    english_processed_data]).reset_index(drop=True)
+
+def count_language(language: str):
+    # counts the rows of a language, the input of the text stages
+    return lambda df: (df["language"] == language).sum()
+
+# Stages of run_pipeline, each one reads and writes the named
+# entries of the pipeline state and declares the columns of the
+# reviews it reads and writes so plan_stages can prune it
+PIPELINE_STAGES = [
     # Data Cleaning
     # Reformatting columns
-    rating_data = fix_datetime_column(rating_data, 
-                                    "date")
-    rating_data = fix_type_column(rating_data, 
-                                "tags")
-    filtered_rating_data = remove_empty_rows(rating_data, 
-                                            "ratings")
-    filtered_rating_data = fix_type_column(filtered_rating_data, 
-                                            "ratings")
-    
-    # Splitting Mixed columns
-    transformed_rating_data = split_ratings(filtered_rating_data, 
-                                            "ratings")
-    transformed_rating_data = get_tag_and_sentiment(transformed_rating_data, 
-                                                    "tags")
-    
-    # Mapping tag ids to their values
-    mapped_rating_data = map_tags(transformed_rating_data,
-                                mapping_data,
-                                "tags")
-    
-    # Getting Locations
-    detailed_rating_data = get_city(mapped_rating_data, 
-                                    "transformed_tags")
-    detailed_rating_data = get_location_type(detailed_rating_data, 
-                                            "transformed_tags")
-    
-    # Reformating Cities Column
-    reformated_df = reformat_city_column(detailed_rating_data, 'city')
+    Stage("fix_datetime_column", fix_datetime_column,
+        ["rating_data"], ["rating_data"], args=["date"],
+        reads=["date"], writes=["date"]),
+    Stage("fix_type_column[tags]", fix_type_column,
+        ["rating_data"], ["rating_data"], args=["tags"],
+        reads=["tags"], writes=["tags"]),
+    Stage("remove_empty_rows", remove_empty_rows,
+        ["rating_data"], ["rating_data"], args=["ratings"], filters_rows=True,
+        reads=["ratings"]),
+    Stage("fix_type_column[ratings]", fix_type_column,
+        ["rating_data"], ["rating_data"], args=["ratings"],
+        reads=["ratings"], writes=["ratings"]),
+    # Splitting Mixed columns and mapping tag ids to their
+    # values, the tags are kept in a long format dataframe
+    Stage("explode_ratings_and_tags", explode_ratings_and_tags,
+        ["rating_data", "mapping_data"], ["rating_data", "tags_data"],
+        args=["ratings", "tags"], reads=["ratings", "tags"],
+        writes=["ratings", "tags", "normalized_rating", "raw_rating"]),
+    # Getting the Cities Column
+    Stage("get_city_from_tags", get_city_from_tags,
+        ["rating_data", "tags_data"], ["rating_data"], args=["city"], writes=["city"]),
     # Fixing Wrong Cities
-    incorrect_cities = get_incorrect_cities(reformated_df)
-    fixed_cities_rating_data = fix_incorrect_cities(reformated_df, 
-                                                    incorrect_cities, 
-                                                    location_name_to_city)
-    
-    # Formatting and filtering the columns
-    formatted_rating_data = reformat_sentiment_col(fixed_cities_rating_data)
-    filter_rating_data = filter_columns(formatted_rating_data)
-    
-    # computing sentiments
-    correct_sentiment_data = compute_sentiment_col(filter_rating_data)
-    main_rating_data = correct_sentiment_data.drop("raw_rating", axis=1)
-    
+    Stage("get_incorrect_cities", get_incorrect_cities,
+        ["rating_data"], ["incorrect_cities"], reads=["city"]),
+    Stage("fix_incorrect_cities", fix_incorrect_cities,
+        ["rating_data", "incorrect_cities", "location_name_to_city"], ["rating_data"],
+        reads=["city", "title"], writes=["city"]),
+    # Filtering the columns, the location
+    # types stay in the tags dataframe
+    Stage("filter_columns", filter_columns,
+        ["rating_data", "columns"], ["rating_data"], always_run=True),
+    # Create a class column straight from the ratings
+    Stage("compute_label_col", compute_label_col,
+        ["rating_data", "label_enc"], ["rating_data"],
+        reads=["normalized_rating"], writes=["class"]),
+    Stage("drop_raw_rating", drop_raw_rating,
+        ["rating_data"], ["rating_data"], writes=["raw_rating"]),
+    # Only run with the intermediate writers, run_pipeline doesn't plan them
+    Stage("write_intermediates", write_intermediates,
+        ["intermediate_writers", "rating_data", "tags_data"]),
     # Text Processing
     # Fixing Languages
-    correct_language_rating_data = separate_text_by_language(main_rating_data)
-    
+    Stage("separate_text_by_language", split_languages,
+        ["rating_data"], ["rating_data"], reads=["content", "language"],
+        writes=["content", "language", "translated"], changes_rows=True),
+    # Drop the duplicated reviews before the costly text stages
+    Stage("drop_duplicates", drop_duplicates,
+        ["rating_data", "dedup", "dedup_threshold"], ["rating_data"], filters_rows=True,
+        reads=["content"]),
+    # Route the reviews by the script of their content
+    Stage("detect_language", route_by_script,
+        ["rating_data", "detect_language"], ["rating_data"],
+        reads=["content", "language"], writes=["language"]),
     # Process all text
-    text_processed_data = preprocess_all_text(correct_language_rating_data)
-    
-    # Process arabic text
-    punctuations = get_punctuations()
-    arab_stop_words = get_ara_stopwords()
-    arabic_processed_data = preprocess_arabic_text(text_processed_data,
-                                                    punctuations,
-                                                    arab_stop_words)
-    
+    Stage("preprocess_all_text", preprocess_all_text,
+        ["rating_data", "n_workers", "partition_size", "store_dir"], ["rating_data"],
+        reads=["content"], writes=["content"]),
+    # Process arabic text, the reviews without arabic letters are dropped
+    Stage("preprocess_arabic_text", preprocess_arabic_text,
+        ["rating_data", "punctuations", "arab_stop_words", "n_workers", "partition_size",
+        "store_dir", "detect_language", "arabic_normalizer"],
+        ["arabic_processed_data"], filters_rows=True, rows_in=count_language("ara"),
+        reads=["content", "language"], writes=["content"]),
     # Process english text
-    eng_stop_words = get_eng_stopwords()
-    contractions_dict = get_contractions_dict()
-    contractions_re = get_contractions(contractions_dict)
-    english_processed_data = preprocess_english_text(text_processed_data,
-                                                    eng_stop_words,
-                                                    contractions_re)
-    
+    Stage("preprocess_english_text", preprocess_english_text,
+        ["rating_data", "eng_stop_words", "contraction_expander", "n_workers", "partition_size",
+        "store_dir"],
+        ["english_processed_data"], rows_in=count_language("eng"),
+        reads=["content", "language"], writes=["content"]),
     # Concat all data
-    full_processed_data = pd.concat([arabic_processed_data, 
-                                    english_processed_data]).reset_index(drop=True)
-    
-    # Create a class column
-    full_processed_data = sentiment_encoder(full_processed_data, label_enc)
+    Stage("concat_languages", concat_languages,
+        ["arabic_processed_data", "english_processed_data"], ["processed_data"]),
+]
+
+PIPELINE_STAGES_BY_NAME = {stage.name: stage for stage in PIPELINE_STAGES}
+
+# Columns of the processed reviews used by each mode, the
+# stages the other columns depend on are pruned
+FINAL_COLUMNS = ["content", "class"]
+CHUNKED_COLUMNS = ["language", "translated", *FINAL_COLUMNS]
+CACHED_COLUMNS = ["id", "content_hash", *CHUNKED_COLUMNS]
+INCREMENTAL_COLUMNS = ["date", *FINAL_COLUMNS]
+
+# Stages replacing some of the stages of PIPELINE_STAGES in the memory
+# compact mode. The literals are parsed while they are exploded so the
+# parsed dicts are never all in memory, the dead columns are dropped as
+# soon as possible and the columns are stored as categoricals and small integers
+COMPACT_STAGES = {
+    "fix_type_column[tags]": [],
+    "fix_type_column[ratings]": [],
+    "explode_ratings_and_tags": [
+        Stage("explode_ratings_and_tags", explode_ratings_and_tags,
+            ["rating_data", "mapping_data"], ["rating_data", "tags_data"],
+            args=["ratings", "tags", True], reads=["ratings", "tags"],
+            writes=["ratings", "tags", "normalized_rating", "raw_rating"]),
+        Stage("compact_reviews", compact_reviews, ["rating_data"], ["rating_data"],
+            always_run=True),
+        Stage("compact_tags", compact_tags, ["tags_data"], ["tags_data"]),
+    ],
+    "fix_incorrect_cities": [
+        PIPELINE_STAGES_BY_NAME["fix_incorrect_cities"],
+        Stage("compact_cities", compact_cities, ["rating_data"], ["rating_data"],
+            reads=["city"], writes=["city"]),
+    ],
+}
+
+def get_pipeline_stages(compact: bool = False) -> List[Stage]:
+    """
+    returns the stages of run_pipeline
+
+    Args:
+        compact (bool, optional): adds the memory compact stages. Defaults to False.
+
+    Returns:
+        List[Stage]: the stages in order
+    """
+    if not compact:
+        return list(PIPELINE_STAGES)
+    stages = []
+    for stage in PIPELINE_STAGES:
+        stages.extend(COMPACT_STAGES.get(stage.name, [stage]))
+    return stages
+
+def plan_pipeline(output_columns: Sequence[str] = None,
+                compact: bool = False) -> Plan:
+    """
+    plans the stages of run_pipeline for the columns the caller uses
+
+    Args:
+        output_columns (Sequence[str], optional): columns of the processed
+                                    reviews that are used, all the stages
+                                    are kept if None. Defaults to None.
+        compact (bool, optional): plans the memory compact stages. Defaults to False.
+
+    Returns:
+        Plan: the kept and pruned stages
+    """
+    stages = get_pipeline_stages(compact)
+    if output_columns is None:
+        return Plan(stages, [], [])
+    return plan_stages(stages, output_columns, ["processed_data"])
+
+def copy_on_write():
+    # pandas copy on write, the frames selected from another frame share
+    # its data until they are modified instead of being copied defensively
+    try:
+        return pd.option_context("mode.copy_on_write", True)
+    except (KeyError, pd.errors.OptionError):
+        return contextlib.nullcontext()
+
+def run_pipeline(rating_data: pd.core.frame.DataFrame,
+                mapping_data: dict,
+                resources: dict,
+                n_workers: int = 1,
+                partition_size: int = 10000,
+                keep_columns: List[str] = (),
+                intermediate_writers: Dict[str, FrameWriter] = None,
+                hooks: Sequence[PipelineHook] = (),
+                compact: bool = False,
+                store_dir: str = None,
+                dedup: str = None,
+                dedup_threshold: float = 0.8,
+                detect_language: bool = False,
+                output_columns: Sequence[str] = None,
+                prune: bool = True) -> pd.core.frame.DataFrame:
+    """
+    runs the cleaning stages of PIPELINE_STAGES on a reviews dataframe
+
+    Args:
+        rating_data (pd.core.frame.DataFrame): raw reviews
+        mapping_data (dict): tags mapping json
+        resources (dict): output of load_resources
+        n_workers (int, optional): number of processes of the text
+                                    processing stages. Defaults to 1.
+        partition_size (int, optional): number of texts per worker task.
+                                        Defaults to 10000.
+        keep_columns (List[str], optional): extra input columns kept
+                                            until the end. Defaults to ().
+        intermediate_writers (Dict[str, FrameWriter], optional): writers of the
+                                    "reviews" and "tags" intermediate frames.
+                                    Defaults to None.
+        hooks (Sequence[PipelineHook], optional): hooks notified around each
+                                                stage. Defaults to ().
+        compact (bool, optional): runs the memory compact stages with pandas
+                                copy on write, the output texts and labels
+                                are the same. Defaults to False.
+        store_dir (str, optional): the parallel text stages send the texts to
+                                their workers through memory mapped review
+                                stores in this directory. Defaults to None.
+        dedup (str, optional): drops the exact duplicates of the reviews content
+                            with "exact", also the near duplicates with
+                            "minhash". Defaults to None.
+        dedup_threshold (float, optional): similarity of the near duplicates.
+                                        Defaults to 0.8.
+        detect_language (bool, optional): routes the reviews by the script of
+                                        their content instead of the language
+                                        column. Defaults to False.
+        output_columns (Sequence[str], optional): columns of the processed reviews
+                                    the caller uses, only the stages they depend
+                                    on are run. All the stages run if None or
+                                    with intermediate writers. Defaults to None.
+        prune (bool, optional): all the stages run if False even with output
+                            columns, to profile the stages the plan prunes.
+                            Defaults to True.
+
+    Returns:
+        pd.core.frame.DataFrame: processed reviews, the arabic rows first
+                                then the english ones
+    """
+    state = {"rating_data": rating_data,
+            "mapping_data": mapping_data,
+            "location_name_to_city": location_name_to_city,
+            "label_enc": label_enc,
+            "columns": ["id", "content", "date", "language", "title",
+                        "normalized_rating", *([] if compact else ["raw_rating"]),
+                        "city", *keep_columns],
+            "intermediate_writers": intermediate_writers,
+            "n_workers": n_workers,
+            "partition_size": partition_size,
+            "store_dir": store_dir,
+            "dedup": dedup,
+            "dedup_threshold": dedup_threshold,
+            "detect_language": detect_language,
+            **resources}
+    if output_columns is not None and intermediate_writers is None and prune:
+        plan = plan_pipeline([*output_columns, *keep_columns], compact)
+        state["columns"] = [column for column in state["columns"]
+                            if column in plan.needed_columns]
+    else:
+        plan = plan_pipeline(compact=compact)
+    if not compact:
+        return run_stages(plan.stages, state, hooks)["processed_data"]
+    with copy_on_write():
+        return run_stages(plan.stages, state, hooks)["processed_data"]
+
+def get_cache_config(resources: dict, detect_language: bool = False) -> dict:
+    """
+    configuration of the cleaning stages the cached outputs depend on
+
+    Args:
+        resources (dict): output of load_resources
+        detect_language (bool, optional): routes the reviews by their script
+                                        in run_pipeline. Defaults to False.
+
+    Returns:
+        dict: the configuration
+    """
+    config = {"punctuations": resources["punctuations"],
+            "arab_stop_words": resources["arab_stop_words"],
+            "eng_stop_words": resources["eng_stop_words"],
+            "contractions": resources["contraction_expander"].contractions_dict,
+            "location_name_to_city": location_name_to_city,
+            "label_enc": label_enc}
+    # only added when stemming so the caches written without it stay valid
+    if resources["arabic_normalizer"].stem:
+        config["arabic_light_stem"] = True
+    if detect_language:
+        config["detect_language"] = True
+    return config
+
+def find_cached_duplicates(rating_data: pd.core.frame.DataFrame,
+                            dedup: str,
+                            dedup_threshold: float = 0.8,
+                            detect_language: bool = False) -> pd.core.frame.DataFrame:
+    """
+    finds the output rows a whole-file run drops as duplicates. Whether a
+    row is a duplicate depends on the other reviews of the input so the
+    dedup runs on the whole input instead of being cached per review
+
+    Args:
+        rating_data (pd.core.frame.DataFrame): raw reviews
+        dedup (str): dedup mode of run_pipeline
+        dedup_threshold (float, optional): similarity of the near duplicates.
+                                        Defaults to 0.8.
+        detect_language (bool, optional): routes the reviews by their script
+                                        in run_pipeline. Defaults to False.
+
+    Returns:
+        pd.core.frame.DataFrame: review_position and group of the duplicates
+    """
+    # The rows reaching the dedup stage of run_pipeline
+    reviews = rating_data[["content", "language", "ratings"]].assign(
+        review_position=np.arange(len(rating_data)))
+    rows = split_languages(remove_empty_rows(reviews, "ratings"))
+    rows = rows[find_duplicates(rows["content"], dedup, dedup_threshold)]
+    language = rows["language"]
+    if detect_language:
+        language = detect_script(rows["content"], fallback=language)
+    return pd.DataFrame({"review_position": rows["review_position"].to_numpy(),
+                        "group": review_groups(language, rows["translated"])})
+
+def run_cached(rating_data: pd.core.frame.DataFrame,
+                mapping_data: dict,
+                resources: dict,
+                cache: StageCache,
+                n_workers: int = 1,
+                partition_size: int = 10000,
+                hooks: Sequence[PipelineHook] = (),
+                compact: bool = False,
+                store_dir: str = None,
+                dedup: str = None,
+                dedup_threshold: float = 0.8,
+                detect_language: bool = False,
+                prune: bool = True) -> pd.core.frame.DataFrame:
+    """
+    runs the pipeline only on the reviews that are not in the cache,
+    the reviews are identified by their id and the hash of their content
+    and ratings, and merges their outputs with the cached ones. The
+    duplicates are dropped from the merged outputs of all the reviews
+
+    Args:
+        rating_data (pd.core.frame.DataFrame): raw reviews
+        mapping_data (dict): tags mapping json
+        resources (dict): output of load_resources
+        cache (StageCache): cache of the processed reviews
+        n_workers (int, optional): number of processes of the text
+                                    processing stages. Defaults to 1.
+        partition_size (int, optional): number of texts per worker task.
+                                        Defaults to 10000.
+        hooks (Sequence[PipelineHook], optional): hooks notified around each
+                                                stage. Defaults to ().
+        compact (bool, optional): runs the memory compact mode of
+                                run_pipeline. Defaults to False.
+        store_dir (str, optional): directory of the review stores
+                                of run_pipeline. Defaults to None.
+        dedup (str, optional): dedup mode of run_pipeline, the duplicates
+                            are dropped within each run and aren't
+                            cached. Defaults to None.
+        dedup_threshold (float, optional): similarity of the near duplicates.
+                                        Defaults to 0.8.
+        detect_language (bool, optional): routes the reviews by their script
+                                        in run_pipeline. Defaults to False.
+        prune (bool, optional): prunes the stages run_pipeline doesn't need
+                            for this mode. Defaults to True.
+
+    Returns:
+        pd.core.frame.DataFrame: processed reviews in the order of run_pipeline
+                                with the language, translated, content and
+                                class columns
+    """
+    rating_data["content_hash"] = review_hashes(rating_data)
+    keys = rating_data[KEY_COLUMNS]
+    cached_entries = cache.lookup(keys)
+    is_new = ~pd.MultiIndex.from_frame(keys).isin(pd.MultiIndex.from_frame(cached_entries[KEY_COLUMNS]))
+    new_data = rating_data[is_new].drop_duplicates(KEY_COLUMNS).reset_index(drop=True)
+    logger.info("%d reviews found in the cache, %d reviews to process",
+                len(rating_data) - is_new.sum(), len(new_data))
+    entries = cached_entries
+    if len(new_data):
+        new_keys = new_data[KEY_COLUMNS].copy()
+        processed_data = run_pipeline(new_data, mapping_data, resources,
+                                        n_workers, partition_size,
+                                        keep_columns=["content_hash"], hooks=hooks,
+                                        compact=compact, store_dir=store_dir,
+                                        detect_language=detect_language,
+                                        output_columns=CACHED_COLUMNS, prune=prune)
+        new_entries = processed_to_entries(processed_data, new_keys)
+        cache.store(new_entries)
+        entries = pd.concat([cached_entries, new_entries], ignore_index=True)
+    duplicates = None
+    if dedup is not None:
+        duplicates = find_cached_duplicates(rating_data, dedup, dedup_threshold,
+                                            detect_language)
+    return entries_to_processed(keys, entries, duplicates)
+
+def run_incremental(input_path: str,
+                    mapping_data: dict,
+                    resources: dict,
+                    output_dir: str,
+                    partition_by: str = "day",
+                    n_workers: int = 1,
+                    partition_size: int = 10000,
+                    file_format: str = "csv",
+                    hooks: Sequence[PipelineHook] = (),
+                    compact: bool = False,
+                    store_dir: str = None,
+                    dedup: str = None,
+                    dedup_threshold: float = 0.8,
+                    detect_language: bool = False,
+                    delete_missing: bool = False,
+                    prune: bool = True) -> int:
+    """
+    processes only the reviews after the date watermark of the previous
+    run and the partitions with late or edited reviews, the output is a
+    dataset partitioned by day or month
+
+    Args:
+        input_path (str): path of the reviews csv
+        mapping_data (dict): tags mapping json
+        resources (dict): output of load_resources
+        output_dir (str): directory of the partitioned output
+        partition_by (str, optional): "day" or "month". Defaults to "day".
+        n_workers (int, optional): number of processes of the text
+                                    processing stages. Defaults to 1.
+        partition_size (int, optional): number of texts per worker task.
+                                        Defaults to 10000.
+        file_format (str, optional): format of the partition files, "csv"
+                                    or "parquet". Defaults to "csv".
+        hooks (Sequence[PipelineHook], optional): hooks notified around each
+                                                stage. Defaults to ().
+        compact (bool, optional): runs the memory compact mode of
+                                run_pipeline. Defaults to False.
+        store_dir (str, optional): directory of the review stores
+                                of run_pipeline. Defaults to None.
+        dedup (str, optional): dedup mode of run_pipeline, the duplicates
+                            are dropped within each run. Defaults to None.
+        dedup_threshold (float, optional): similarity of the near duplicates.
+                                        Defaults to 0.8.
+        detect_language (bool, optional): routes the reviews by their script
+                                        in run_pipeline. Defaults to False.
+        delete_missing (bool, optional): deletes the partitions without any
+                                        review in the input, the input must
+                                        then hold all the reviews. Defaults to False.
+        prune (bool, optional): prunes the stages run_pipeline doesn't need
+                            for this mode. Defaults to True.
+
+    Returns:
+        int: number of rows written
+    """
+    rating_data = read_reviews(input_path)
+    state = load_state(output_dir)
+    to_process, rewrite, new_state = plan_incremental_run(rating_data, state, partition_by,
+                                                        delete_missing=delete_missing)
+    logger.info("%d reviews to process, %d partitions to rewrite",
+                to_process.sum(), len(rewrite))
+    new_data = rating_data[to_process].reset_index(drop=True)
+    final_data = pd.DataFrame(columns=["text", "label"])
+    partitions = pd.Series([], dtype=object)
+    if len(new_data):
+        full_processed_data = run_pipeline(new_data, mapping_data, resources,
+                                            n_workers, partition_size, hooks=hooks,
+                                            compact=compact, store_dir=store_dir,
+                                            dedup=dedup, dedup_threshold=dedup_threshold,
+                                            detect_language=detect_language,
+                                            output_columns=INCREMENTAL_COLUMNS, prune=prune)
+        partitions = partition_names(full_processed_data["date"], partition_by)
+        final_data = to_final_data(full_processed_data)
+    write_partitions(output_dir, final_data, partitions, rewrite,
+                    partition_by, file_format)
+    save_state(output_dir, new_state)
+    return len(final_data)
+
+def to_final_data(full_processed_data: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+    """
+    keeps only the text and label columns of the processed data
+
+    Args:
+        full_processed_data (pd.core.frame.DataFrame): output of run_pipeline
+
+    Returns:
+        pd.core.frame.DataFrame: final text/label data
+    """
     # Isolate only the wanted columns
     final_data = filter_data(full_processed_data)
     # Rename columns to conventional names
     final_data = col_rename(final_data)
-    
-    
\ No newline at end of file
+    return final_data
+
+def run_chunked(input_path: str,
+                mapping_data: dict,
+                resources: dict,
+                output_path: str,
+                chunksize: int,
+                n_workers: int = 1,
+                partition_size: int = 10000,
+                cache: StageCache = None,
+                file_format: str = None,
+                intermediate_writers: Dict[str, FrameWriter] = None,
+                hooks: Sequence[PipelineHook] = (),
+                compact: bool = False,
+                store_dir: str = None,
+                dedup: str = None,
+                dedup_threshold: float = 0.8,
+                detect_language: bool = False,
+                prune: bool = True) -> int:
+    """
+    runs the pipeline over fixed size chunks of the input and
+    appends the final data to disk as it goes so the memory stays
+    bounded by the chunk size.
+    A whole-file run outputs all the arabic rows, then the english
+    rows, then the english halves of the translated reviews, so each
+    group is spooled to its own file and they are joined at the end
+
+    Args:
+        input_path (str): path of the reviews
+        mapping_data (dict): tags mapping json
+        resources (dict): output of load_resources
+        output_path (str): path of the final data
+        chunksize (int): number of reviews per chunk
+        n_workers (int, optional): number of processes of the text
+                                    processing stages. Defaults to 1.
+        partition_size (int, optional): number of texts per worker task.
+                                        Defaults to 10000.
+        cache (StageCache, optional): if given only the reviews missing from
+                                    the cache are processed. Defaults to None.
+        file_format (str, optional): "csv" or "parquet".
+                                    Defaults to the extension of the output path.
+        intermediate_writers (Dict[str, FrameWriter], optional): writers of the
+                                    "reviews" and "tags" intermediate frames.
+                                    Defaults to None.
+        hooks (Sequence[PipelineHook], optional): hooks notified around each
+                                                stage. Defaults to ().
+        compact (bool, optional): runs the memory compact mode of
+                                run_pipeline. Defaults to False.
+        store_dir (str, optional): directory of the review stores
+                                of run_pipeline. Defaults to None.
+        dedup (str, optional): dedup mode of run_pipeline, the duplicates
+                            are dropped within each run. Defaults to None.
+        dedup_threshold (float, optional): similarity of the near duplicates.
+                                        Defaults to 0.8.
+        detect_language (bool, optional): routes the reviews by their script
+                                        in run_pipeline. Defaults to False.
+        prune (bool, optional): prunes the stages run_pipeline doesn't need
+                            for this mode. Defaults to True.
+
+    Returns:
+        int: number of rows written
+    """
+    file_format = get_file_format(output_path, file_format)
+    spool_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_path)))
+    spool_paths = [os.path.join(spool_dir, f"group-{i}.{file_format}") for i in range(3)]
+    spool_writers = [FrameWriter(spool_path, file_format) for spool_path in spool_paths]
+    n_rows = 0
+    try:
+        for chunk in read_reviews(input_path, chunksize=chunksize):
+            if cache is not None:
+                full_processed_data = run_cached(chunk, mapping_data, resources, cache,
+                                                n_workers, partition_size, hooks, compact,
+                                                store_dir, dedup, dedup_threshold,
+                                                detect_language, prune)
+            else:
+                full_processed_data = run_pipeline(chunk, mapping_data, resources,
+                                                    n_workers, partition_size,
+                                                    intermediate_writers=intermediate_writers,
+                                                    hooks=hooks, compact=compact,
+                                                    store_dir=store_dir, dedup=dedup,
+                                                    dedup_threshold=dedup_threshold,
+                                                    detect_language=detect_language,
+                                                    output_columns=CHUNKED_COLUMNS,
+                                                    prune=prune)
+            is_arabic = full_processed_data["language"] == "ara"
+            is_translated = full_processed_data["translated"].astype(bool)
+            groups = [is_arabic,
+                    ~is_arabic & ~is_translated,
+                    ~is_arabic & is_translated]
+            for spool_writer, group in zip(spool_writers, groups):
+                if group.any():
+                    spool_writer.write(to_final_data(full_processed_data[group]))
+            n_rows += len(full_processed_data)
+        for spool_writer in spool_writers:
+            spool_writer.close()
+        # Joining the spooled groups
+        concat_files(spool_paths, output_path,
+                    to_final_data(pd.DataFrame(columns=["content", "class"])),
+                    file_format)
+    finally:
+        for spool_writer in spool_writers:
+            spool_writer.close()
+        shutil.rmtree(spool_dir)
+    return n_rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cleans the reviews dataset")
+    parser.add_argument("--input", default="dataset.csv_(DS_A-L2).csv",
+                        help="path of the reviews csv or parquet file")
+    parser.add_argument("--mappings", default="mappings.json_(DS_A-L2).json",
+                        help="path of the tags mapping json")
+    parser.add_argument("--output", default="processed_data.csv",
+                        help="path of the final text/label csv or parquet file")
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default=None,
+                        help="format of the outputs, defaults to the extension of --output")
+    parser.add_argument("--intermediate-dir", default=None,
+                        help="also write the labeled reviews and their tags in this directory")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="process the input by chunks of this many reviews")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes of the text processing stages")
+    parser.add_argument("--partition-size", type=int, default=10000,
+                        help="number of texts sent to a worker per task")
+    parser.add_argument("--store-dir", default=None,
+                        help="send the texts to the workers through memory mapped "
+                            "review stores in this directory, /dev/shm keeps them "
+                            "in shared memory")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default=None,
+                        help="drop the duplicated reviews before the text stages, exact "
+                            "duplicates of the normalized content or also the near "
+                            "duplicates with minhash, within each chunk")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                        help="jaccard similarity of the near duplicates")
+    parser.add_argument("--detect-language", action="store_true",
+                        help="route the reviews by the script of their content instead "
+                            "of the language column and log the mislabelled ones")
+    parser.add_argument("--features-dir", default=None,
+                        help="also write the hashed n-gram counts of the output texts "
+                            "as a memory mappable csr matrix with the labels and the "
+                            "idf in this directory")
+    parser.add_argument("--n-features", type=int, default=2 ** 20,
+                        help="number of hashed columns of the features")
+    parser.add_argument("--max-ngram", type=int, default=2,
+                        help="largest number of words of the n-gram features")
+    parser.add_argument("--stem-arabic", action="store_true",
+                        help="also strip the arabic prefixes and suffixes with a light stemmer")
+    parser.add_argument("--arabic-token-frequencies", default=None,
+                        help="warm the cache of the arabic token normalizer with this "
+                            "frequency list, built by python -m cleaning.resources "
+                            "token-frequencies")
+    parser.add_argument("--cache-dir", default=None,
+                        help="cache the processed reviews in this directory and "
+                            "only process the new or changed ones")
+    parser.add_argument("--cache-max-bytes", type=int, default=2 * 1024 ** 3,
+                        help="size limit of the cache")
+    parser.add_argument("--incremental-dir", default=None,
+                        help="only process the reviews newer than the last run and "
+                            "write them to a dataset partitioned by date in this directory")
+    parser.add_argument("--partition-by", choices=["day", "month"], default="day",
+                        help="partitioning of the incremental output")
+    parser.add_argument("--delete-missing-partitions", action="store_true",
+                        help="delete the incremental partitions without any review in "
+                            "the input, only for inputs holding all the reviews")
+    parser.add_argument("--compact", action="store_true",
+                        help="store the intermediate frames with categoricals and small "
+                            "integers and drop the dead columns early to reduce the memory")
+    parser.add_argument("--explain", action="store_true",
+                        help="print the stages run and pruned for the outputs of this "
+                            "mode and exit")
+    parser.add_argument("--explain-costs", default=None,
+                        help="json report of --profile-report from a previous run with "
+                            "--all-stages, --explain then estimates the saved time")
+    parser.add_argument("--all-stages", action="store_true",
+                        help="run all the stages, also the ones this mode doesn't need, "
+                            "to profile them for --explain-costs")
+    parser.add_argument("--profile-report", default=None,
+                        help="write the metrics of each stage to this json file")
+    parser.add_argument("--prometheus-report", default=None,
+                        help="write the metrics of each stage to this file "
+                            "in the prometheus text format")
+    parser.add_argument("--sample-profile", action="store_true",
+                        help="also sample the stack to attribute the time to the "
+                            "text helpers, added to the json report")
+    args = parser.parse_args()
+    if args.features_dir and args.incremental_dir:
+        parser.error("--features-dir is computed from --output, "
+                    "it can't be used with --incremental-dir")
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    if args.explain:
+        if args.intermediate_dir:
+            output_columns = None
+        elif args.incremental_dir:
+            output_columns = INCREMENTAL_COLUMNS
+        elif args.cache_dir:
+            output_columns = CACHED_COLUMNS
+        elif args.chunksize:
+            output_columns = CHUNKED_COLUMNS
+        else:
+            output_columns = FINAL_COLUMNS
+        stage_seconds = read_stage_seconds(args.explain_costs) if args.explain_costs else None
+        print(plan_pipeline(output_columns, args.compact).describe(stage_seconds))
+        raise SystemExit
+
+    # Reading the data
+    with open(args.mappings) as json_file:
+        mapping_data = json.load(json_file)
+    try:
+        resources = load_resources(args.stem_arabic, args.arabic_token_frequencies)
+    except LookupError as error:
+        # the stop words bundle isn't built
+        parser.exit(2, f"{parser.prog}: error: {error}\n")
+    file_format = get_file_format(args.output, args.output_format)
+    intermediate_writers = None
+    if args.intermediate_dir:
+        intermediate_writers = open_intermediate_writers(args.intermediate_dir, file_format)
+    hooks = []
+    profiler = None
+    sampler = None
+    if args.profile_report or args.prometheus_report:
+        profiler = StageProfiler()
+        hooks.append(profiler)
+    if args.sample_profile:
+        sampler = SamplingProfiler()
+        sampler.start()
+    dedup_savings = None
+    # with a cache the dedup runs after the lookup, out of the stages
+    if args.dedup and not args.cache_dir:
+        stage_names = [stage.name for stage in PIPELINE_STAGES]
+        dedup_savings = DedupSavings(stage_names[stage_names.index("drop_duplicates") + 1:])
+        hooks.append(dedup_savings)
+    cache = None
+    if args.cache_dir:
+        cache = StageCache(args.cache_dir, get_cache_config(resources, args.detect_language),
+                            args.cache_max_bytes)
+
+    if args.incremental_dir:
+        run_incremental(args.input, mapping_data, resources,
+                        args.incremental_dir, args.partition_by,
+                        args.workers, args.partition_size, file_format, hooks,
+                        args.compact, args.store_dir, args.dedup, args.dedup_threshold,
+                        args.detect_language, args.delete_missing_partitions,
+                        prune=not args.all_stages)
+    elif args.chunksize:
+        run_chunked(args.input, mapping_data, resources,
+                    args.output, args.chunksize,
+                    args.workers, args.partition_size, cache,
+                    file_format, intermediate_writers, hooks, args.compact,
+                    args.store_dir, args.dedup, args.dedup_threshold, args.detect_language,
+                    prune=not args.all_stages)
+    else:
+        rating_data = read_reviews(args.input)
+        if cache is not None:
+            full_processed_data = run_cached(rating_data, mapping_data, resources, cache,
+                                            args.workers, args.partition_size, hooks,
+                                            args.compact, args.store_dir, args.dedup,
+                                            args.dedup_threshold, args.detect_language,
+                                            prune=not args.all_stages)
+        else:
+            full_processed_data = run_pipeline(rating_data, mapping_data, resources,
+                                                args.workers, args.partition_size,
+                                                intermediate_writers=intermediate_writers,
+                                                hooks=hooks, compact=args.compact,
+                                                store_dir=args.store_dir, dedup=args.dedup,
+                                                dedup_threshold=args.dedup_threshold,
+                                                detect_language=args.detect_language,
+                                                output_columns=FINAL_COLUMNS,
+                                                prune=not args.all_stages)
+        final_data = to_final_data(full_processed_data)
+        write_frame(final_data, args.output, file_format)
+    for intermediate_writer in (intermediate_writers or {}).values():
+        intermediate_writer.close()
+
+    # Vectorizing the final data
+    if args.features_dir:
+        n_rows = vectorize_file(args.output, args.features_dir, file_format,
+                                vectorizer=HashingVectorizer(args.n_features,
+                                                            (1, args.max_ngram)))
+        logger.info("%d rows vectorized to %s", n_rows, args.features_dir)
+
+    # Exporting the metrics
+    if dedup_savings is not None:
+        savings = dedup_savings.report()
+        logger.info("dedup removed %d rows in %.2f s, estimated %.2f s saved on the "
+                    "%.2f s of the text stages", savings["rows_removed"],
+                    savings["dedup_seconds"], savings["estimated_saved_seconds"],
+                    savings["downstream_seconds"])
+    if sampler is not None:
+        sampler.stop()
+        for function in sampler.report(top=10):
+            logger.info("%s: %.2f s self, %.2f s total", function["function"],
+                        function["self_seconds"], function["total_seconds"])
+    if args.profile_report:
+        write_report(args.profile_report, profiler, sampler)
+    if args.prometheus_report:
+        with open(args.prometheus_report, "w") as prometheus_file:
+            prometheus_file.write(profiler.to_prometheus())
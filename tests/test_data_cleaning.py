@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from cleaning.data_cleaning import (compact_cities, compute_label_col, compute_sentiment_col,
+                                    sentiment_encoder)
+from main import label_enc
+
+RATINGS = [0, 20, 39, 39.5, 40, 40.5, 50, 59.5, 60, 60.5, 61, 80, 100, np.nan]
+
+def expected_classes(ratings: list) -> np.ndarray:
+    df = compute_sentiment_col(pd.DataFrame({"normalized_rating": ratings}))
+    return sentiment_encoder(df, label_enc)["class"].to_numpy()
+
+@pytest.mark.parametrize("rating", RATINGS)
+def test_compute_label_col_matches_sentiment_encoder(rating):
+    df = compute_label_col(pd.DataFrame({"normalized_rating": [rating]}), label_enc)
+    assert df["class"].tolist() == expected_classes([rating]).tolist()
+
+def test_compute_label_col_boundaries():
+    df = compute_label_col(pd.DataFrame({"normalized_rating": [40, 60, np.nan]}), label_enc)
+    assert df["class"].tolist() == [label_enc["neutral"]] * 3
+
+def test_compute_label_col_column():
+    df = compute_label_col(pd.DataFrame({"normalized_rating": RATINGS}), label_enc,
+                        sentiment_col_name="sentiment")
+    assert df["class"].dtype == np.int8
+    np.testing.assert_array_equal(df["class"].to_numpy(), expected_classes(RATINGS))
+    sentiments = compute_sentiment_col(pd.DataFrame({"normalized_rating": RATINGS}))
+    assert df["sentiment"].astype(str).tolist() == sentiments["sentiment"].tolist()
+
+def test_compact_cities_keeps_unresolved_cities():
+    cities = ["Riyadh", ["Jeddah", "Dammam"], None, "Riyadh", ["Jeddah", "Dammam"]]
+    df = compact_cities(pd.DataFrame({"city": pd.Series(cities, dtype=object)}))
+    assert isinstance(df["city"].dtype, pd.CategoricalDtype)
+    assert df["city"].astype(object).where(df["city"].notna(), None).tolist() == [
+        "Riyadh", "Jeddah|Dammam", None, "Riyadh", "Jeddah|Dammam"]
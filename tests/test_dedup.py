@@ -0,0 +1,12 @@
+import pandas as pd
+import pytest
+from cleaning.dedup import find_duplicates
+
+TEXTS = pd.Series(["Great place!", "!!!", "great   place", "😀😀", "", "   ", None,
+                "a long review about the museum and the park",
+                "A long review about the museum and the park!!", "?"])
+
+@pytest.mark.parametrize("mode", ["exact", "minhash"])
+def test_empty_normalized_texts_are_not_duplicates(mode):
+    is_duplicate = find_duplicates(TEXTS, mode)
+    assert TEXTS[is_duplicate].index.tolist() == [2, 8]
@@ -0,0 +1,48 @@
+import os
+import pandas as pd
+from cleaning.incremental import load_state, plan_incremental_run, save_state, write_partitions
+
+def reviews(ids: list, dates: list) -> pd.core.frame.DataFrame:
+    return pd.DataFrame({"id": ids,
+                        "content": [f"review {review_id}" for review_id in ids],
+                        "ratings": [50] * len(ids),
+                        "date": dates})
+
+def run(output_dir: str, rating_df: pd.core.frame.DataFrame) -> set:
+    to_process, rewrite, new_state = plan_incremental_run(rating_df, load_state(output_dir))
+    processed = rating_df[to_process]
+    partitions = pd.to_datetime(processed["date"], utc=True).dt.strftime("%Y-%m-%d")
+    write_partitions(output_dir, processed[["id", "content"]], partitions, rewrite)
+    save_state(output_dir, new_state)
+    return rewrite
+
+def written_ids(output_dir: str, partition: str) -> list:
+    partition_dir = os.path.join(output_dir, f"day={partition}")
+    return sorted(pd.concat([pd.read_csv(os.path.join(partition_dir, name))
+                            for name in sorted(os.listdir(partition_dir))])["id"].tolist())
+
+def test_delta_with_late_review_is_appended(tmp_path):
+    output_dir = str(tmp_path)
+    run(output_dir, reviews([1, 2, 3], ["2024-01-01T10:00:00+0000",
+                                        "2024-01-01T11:00:00+0000",
+                                        "2024-01-02T10:00:00+0000"]))
+    # the delta holds a new review and a late one of an already written day
+    delta = reviews([4, 5], ["2024-01-02T11:00:00+0000", "2024-01-01T12:00:00+0000"])
+    assert run(output_dir, delta) == set()
+    assert written_ids(output_dir, "2024-01-01") == [1, 2, 5]
+    assert written_ids(output_dir, "2024-01-02") == [3, 4]
+    assert sorted(os.listdir(os.path.join(output_dir, "day=2024-01-01"))) == ["part-00000.csv",
+                                                                            "part-00001.csv"]
+    assert load_state(output_dir)["partitions"]["2024-01-01"]["rows"] == 3
+    # running the same delta again doesn't write its reviews twice
+    run(output_dir, delta)
+    assert written_ids(output_dir, "2024-01-01") == [1, 2, 5]
+    assert written_ids(output_dir, "2024-01-02") == [3, 4]
+
+def test_full_input_with_edited_review_rewrites(tmp_path):
+    output_dir = str(tmp_path)
+    run(output_dir, reviews([1, 2], ["2024-01-01T10:00:00+0000", "2024-01-01T11:00:00+0000"]))
+    edited = reviews([1, 2], ["2024-01-01T10:00:00+0000", "2024-01-01T11:00:00+0000"])
+    edited.loc[1, "content"] = "edited review"
+    assert run(output_dir, edited) == {"2024-01-01"}
+    assert written_ids(output_dir, "2024-01-01") == [1, 2]
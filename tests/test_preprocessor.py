@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from cleaning.preprocessor import Preprocessor
+from cleaning.text_processing import (ArabicTokenNormalizer, get_contraction_expander,
+                                    get_punctuations, to_stop_word_index)
+from main import run_pipeline
+
+CONTENTS = [
+    ("More(Translated by Google) Great place I'm happy, can't wait!! (Original) مكان رائع جدا في الرياض", "eng"),
+    ("moretranslated by google nice view original منظر جميل", "ara"),
+    ("١٢٣", "ara"),
+    ("١٢ مكان", "ara"),
+    ("the food is gooood 😀 and the staff wasn't rude", "eng"),
+    ("المكان رائع والخدمة ممتازة، أنصح بزيارته", "ara"),
+    ("great place in the city", "ara"),
+    ("مطعم ممتاز", "eng"),
+    ("!!! 😀", "eng"),
+    ("في جدا", "ara"),
+]
+
+MAPPING_DATA = {"tags_mapping": {"t0": ["Hotel", "Jeddah"]}}
+
+def resources(stem_arabic: bool) -> dict:
+    punctuations = get_punctuations()
+    arab_stop_words = ["في", "جدا"]
+    return {"punctuations": punctuations,
+            "arab_stop_words": arab_stop_words,
+            "eng_stop_words": to_stop_word_index(["the", "and", "is", "in"]),
+            "contraction_expander": get_contraction_expander(),
+            "arabic_normalizer": ArabicTokenNormalizer(punctuations, arab_stop_words,
+                                                    stem_arabic)}
+
+def reviews() -> pd.core.frame.DataFrame:
+    return pd.DataFrame({"id": range(len(CONTENTS)),
+                        "content": [content for content, _ in CONTENTS],
+                        "date": "2023-05-17T10:00:00+03:00",
+                        "language": [language for _, language in CONTENTS],
+                        "title": "title",
+                        "tags": "[{'value': 't0', 'sentiment': 'positive'}]",
+                        "ratings": "{'normalized': 100, 'raw': 5}"})
+
+@pytest.mark.parametrize("detect_language", [False, True])
+@pytest.mark.parametrize("stem_arabic", [False, True])
+def test_clean_matches_run_pipeline(detect_language, stem_arabic):
+    pipeline_resources = resources(stem_arabic)
+    processed = run_pipeline(reviews(), MAPPING_DATA, pipeline_resources,
+                            detect_language=detect_language,
+                            output_columns=["id", "language", "content"])
+    expected = sorted(zip(processed["id"], processed["language"].astype(str),
+                        processed["content"]))
+    preprocessor = Preprocessor.from_resources(pipeline_resources, detect_language)
+    rows = preprocessor.clean_batch([content for content, _ in CONTENTS],
+                                    [language for _, language in CONTENTS])
+    cleaned = sorted((review_id, language, text) for review_id, review_rows in enumerate(rows)
+                    for language, text in review_rows)
+    assert cleaned == expected
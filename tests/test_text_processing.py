@@ -0,0 +1,228 @@
+import re
+import string
+import pandas as pd
+import pytest
+from cleaning.text_processing import (ArabicTokenNormalizer, TextNormalizer,
+                                    _clean_all_text_batch, _clean_arabic_batch,
+                                    _clean_arabic_letters_batch, _clean_english_batch,
+                                    expand_contractions, get_contraction_expander,
+                                    get_contractions, get_contractions_dict, get_punctuations,
+                                    parallel_apply, preprocess_all_text,
+                                    preprocess_arabic_text, preprocess_english_text,
+                                    separate_text_by_language, split_translated_text,
+                                    to_stop_word_index)
+
+def separate_text_by_language_loop(df: pd.core.frame.DataFrame) -> pd.core.frame.DataFrame:
+    # row by row implementation the vectorized splitter replaced
+    for i in range(len(df)):
+        if df.iloc[[i]]['content'].values[0].startswith("More(Translated by Google)"):
+            txt = df.iloc[[i]]['content'].values[0]
+            arabic_txt = txt.split(" (Original) ")[1]
+            english_txt = txt.split(" (Original) ")[0].split('More(Translated by Google) ')[1]
+            df.at[i, 'content'] = arabic_txt
+            df.at[i, 'language'] = 'ara'
+            row_dict = df.iloc[i].to_dict()
+            row_dict["content"] = english_txt
+            row_dict["language"] = "eng"
+            df = df._append(row_dict, ignore_index = True)
+        elif df.iloc[[i]]['content'].values[0].startswith("moretranslated by google"):
+            txt = df.iloc[[i]]['content'].values[0]
+            arabic_txt = txt.split(" original ")[1]
+            english_txt = txt.split(" original ")[0].split('moretranslated by google ')[1]
+            df.at[i, 'content'] = arabic_txt
+            df.at[i, 'language'] = 'ara'
+            row_dict = df.iloc[i].to_dict()
+            row_dict["content"] = english_txt
+            row_dict["language"] = "eng"
+            df = df._append(row_dict, ignore_index = True)
+    df = df.reset_index(drop = True)
+    return df
+
+TRANSLATED_CONTENTS = [
+    "More(Translated by Google) nice place (Original) مكان جميل",
+    "moretranslated by google nice place original مكان جميل",
+    # only the text between the first two separators is kept
+    "More(Translated by Google) good (Original) جيد (Original) جدا",
+    # the separator of the other marker isn't used
+    "More(Translated by Google) the original food (Original) اكل",
+    "moretranslated by google More(Translated by Google) x original y",
+    "More(Translated by Google)  spaces  (Original)  مسافات ",
+    "not translated More(Translated by Google) text (Original) نص",
+    "مكان جميل",
+]
+
+MALFORMED_CONTENTS = [
+    "More(Translated by Google) no separator",
+    "More(Translated by Google)(Original) no space after the prefix",
+    "moretranslated by google english (Original) wrong separator",
+    # an empty english text leaves no space after the prefix
+    "More(Translated by Google) (Original) نص",
+]
+
+def reviews(contents: list) -> pd.core.frame.DataFrame:
+    return pd.DataFrame({"id": range(len(contents)),
+                        "content": contents,
+                        "language": ["eng"] * len(contents)})
+
+@pytest.mark.parametrize("content", TRANSLATED_CONTENTS)
+def test_separate_text_by_language_matches_loop(content):
+    df = reviews(["first review", content, "More(Translated by Google) a (Original) ب"])
+    expected = separate_text_by_language_loop(df.copy())
+    pd.testing.assert_frame_equal(separate_text_by_language(df), expected)
+
+def test_separate_text_by_language_order():
+    df = reviews(TRANSLATED_CONTENTS)
+    expected = separate_text_by_language_loop(df.copy())
+    pd.testing.assert_frame_equal(separate_text_by_language(df), expected)
+
+@pytest.mark.parametrize("content", MALFORMED_CONTENTS)
+def test_malformed_markers_raise_index_error(content):
+    df = reviews(["first review", content])
+    with pytest.raises(IndexError):
+        separate_text_by_language_loop(df.copy())
+    with pytest.raises(IndexError):
+        separate_text_by_language(df)
+    with pytest.raises(IndexError):
+        split_translated_text(content)
+
+@pytest.mark.parametrize("content", TRANSLATED_CONTENTS)
+def test_split_translated_text_matches_loop(content):
+    expected = separate_text_by_language_loop(reviews([content]))["content"].tolist()
+    split = split_translated_text(content)
+    assert (expected if len(expected) == 2 else None) == (list(split) if split else None)
+
+def clean_text_chain(text: str) -> str:
+    # deEmojify, text_preprocessing and reduce_repeated_letters
+    # with the re.sub chain the TextNormalizer replaced
+    text = re.compile(pattern = "["
+        u"\U0001F600-\U0001F64F"
+        u"\U0001F300-\U0001F5FF"
+        u"\U0001F680-\U0001F6FF"
+        u"\U0001F1E0-\U0001F1FF"
+        u"\U00002700-\U000027BF"
+        u"\U00002702-\U000027B0"
+        u"\U000024C2-\U0001F251"
+        "]+", flags = re.UNICODE).sub(r'', text)
+    text = text.lower()
+    text = re.sub(r'\[.*?\]', '', text)
+    text = re.sub(r'<.*?>+', '', text)
+    text = re.sub('[%s]' % re.escape(string.punctuation), '', text)
+    text = re.sub('\n', '', text)
+    text = re.sub(r'\w*\d\w*', '', text)
+    return re.compile(r'(\w)\1{2,}').sub(r'\1', text)
+
+def normalize_arabic_chain(text: str, punctuations: str) -> str:
+    # character level part of preprocess before the TextNormalizer
+    text = text.translate(str.maketrans('', '', punctuations))
+    text = re.sub("[إأآا]", "ا", text)
+    text = re.sub("ى", "ي", text)
+    text = re.sub("ؤ", "ء", text)
+    text = re.sub("ئ", "ء", text)
+    text = re.sub("ة", "ه", text)
+    return re.sub("گ", "ك", text)
+
+CLEANED_TEXTS = [
+    "Great PLACE!!! 😀😀 [edited] <b>nice</b>",
+    "sooooo goood, 10/10 would go again\nyes",
+    "a2b c3 abc123 4 aaa111bbb",
+    "heeey [a [b] c] <<tag>> >x<",
+    "loooool 👍🏽 ❤️ ⭐⭐⭐⭐⭐ ©",
+    "ééé éte ___ a__b 2nd",
+    "مكااااان رائع جدا!!! ١٢٣ ok",
+    "",
+]
+
+ARABIC_TEXTS = [
+    "إلى أين؟ آسف، المكان رائع.",
+    "مستشفى مؤسسة مئة مدرسة گرافيك",
+    "«نص» — (جميل) ـ ١٢/٣ … “اقتباس”",
+    "",
+]
+
+@pytest.mark.parametrize("text", CLEANED_TEXTS)
+def test_clean_text_matches_regex_chain(text):
+    assert TextNormalizer().clean_text(text) == clean_text_chain(text)
+
+@pytest.mark.parametrize("text", ARABIC_TEXTS + CLEANED_TEXTS)
+def test_normalize_arabic_matches_regex_chain(text):
+    punctuations = get_punctuations()
+    assert (TextNormalizer(punctuations).normalize_arabic(text)
+            == normalize_arabic_chain(text, punctuations))
+
+CONTRACTED_TEXTS = [
+    "I'm sure you'll love it, we've been there and they're friendly.",
+    "It wasn't crowded but it's small, you'd better come at 8 o'clock.",
+    "i'm lowercase, I'M upper and Can't capitalized stay as they are",
+    "let's go, ma'am 'cause y'all won't",
+    "nothing to expand here",
+    "'s''s it's's",
+    "",
+]
+
+# contractions prefixed by another contraction, the regex alternation
+# stops at the first key of the dict and the expander at the longest
+LONGEST_CONTRACTIONS = {
+    "can't've": "cannot have",
+    "couldn't've": "could not have",
+    "he'll've": "he will have",
+    "how'd'y": "how do you",
+    "y'all'd've": "you all would have",
+    "won't've": "will not have",
+}
+
+@pytest.mark.parametrize("text", CONTRACTED_TEXTS)
+def test_contraction_expander_matches_regex(text):
+    contractions_dict = get_contractions_dict()
+    expected = expand_contractions(text, get_contractions(contractions_dict))
+    assert get_contraction_expander(contractions_dict).expand(text) == expected
+    assert expand_contractions(text, get_contraction_expander(contractions_dict)) == expected
+
+@pytest.mark.parametrize("contraction", sorted(LONGEST_CONTRACTIONS))
+def test_contraction_expander_longest_match(contraction):
+    expander = get_contraction_expander()
+    text = f"so {contraction} then {contraction}"
+    expansion = LONGEST_CONTRACTIONS[contraction]
+    assert expander.expand(text) == f"so {expansion} then {expansion}"
+    # the regex expands a shorter contraction and leaves the rest
+    assert expand_contractions(text, get_contractions(get_contractions_dict())) != expander.expand(text)
+
+PARALLEL_TEXTS = pd.Series(CLEANED_TEXTS + CONTRACTED_TEXTS + ARABIC_TEXTS,
+                        index=range(100, 100 + len(CLEANED_TEXTS + CONTRACTED_TEXTS
+                                                    + ARABIC_TEXTS)))
+
+PARALLEL_RESOURCES = {
+    "eng_stop_words": to_stop_word_index(["the", "and", "it", "is"]),
+    "contractions_re": get_contraction_expander(),
+    "arabic_normalizer": ArabicTokenNormalizer(arab_stop_words=["إلى", "جدا"]),
+}
+
+@pytest.mark.parametrize("batch_func", [_clean_all_text_batch, _clean_english_batch,
+                                        _clean_arabic_batch, _clean_arabic_letters_batch])
+@pytest.mark.parametrize("use_store", [False, True])
+def test_parallel_apply_matches_serial(batch_func, use_store, tmp_path, monkeypatch):
+    # the serial run uses the same resources as the pool workers
+    from cleaning import text_processing
+    monkeypatch.setattr(text_processing, "_worker_resources", dict(PARALLEL_RESOURCES))
+    expected = pd.Series(batch_func(PARALLEL_TEXTS.tolist()), index=PARALLEL_TEXTS.index)
+    cleaned = parallel_apply(PARALLEL_TEXTS, batch_func, PARALLEL_RESOURCES, n_workers=2,
+                            partition_size=4, store_dir=str(tmp_path) if use_store else None)
+    pd.testing.assert_series_equal(cleaned, expected)
+
+@pytest.mark.parametrize("script_routed", [False, True])
+def test_preprocess_stages_with_workers_match_serial(script_routed):
+    df = pd.DataFrame({"content": PARALLEL_TEXTS.tolist(),
+                    "language": ["eng", "ara"] * (len(PARALLEL_TEXTS) // 2)
+                                + ["eng"] * (len(PARALLEL_TEXTS) % 2)})
+    punctuations = get_punctuations()
+    arab_stop_words = ["إلى", "جدا"]
+    outputs = []
+    for n_workers in [1, 2]:
+        cleaned = preprocess_all_text(df.copy(), n_workers, partition_size=4)
+        outputs.append((
+            cleaned,
+            preprocess_english_text(cleaned.copy(), ["the", "and"], get_contraction_expander(),
+                                    n_workers, partition_size=4),
+            preprocess_arabic_text(cleaned.copy(), punctuations, arab_stop_words, n_workers,
+                                partition_size=4, script_routed=script_routed)))
+    for serial, parallel in zip(*outputs):
+        pd.testing.assert_frame_equal(parallel, serial)